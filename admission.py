@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+# Admission control for the /api/ask routes.
+#
+# Slow LLM calls hold a worker thread for seconds; under a spike they can take
+# every worker and starve cheap endpoints (/api/tracks, static files). Before
+# an ask does any work it must pass:
+#   1. a per-token rate limit (token bucket: `rate` per second, `burst` deep;
+#      a rate <= 0, e.g. ASK_RATE_PER_MIN=0, turns the limit off);
+#   2. a per-process concurrency limit. Requests over the limit wait in a
+#      bounded queue for at most `queue_timeout` seconds.
+# Anything that cannot be admitted fails fast with Rejected, which carries an
+# HTTP status (429 for rate limits, 503 for saturation) and a Retry-After hint.
+
+# Upper bound for Retry-After (seconds)
+MAX_RETRY_AFTER = 3600
+
+
+class Rejected(RuntimeError):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        if not math.isfinite(self.retry_after):
+            return str(MAX_RETRY_AFTER)
+        return str(min(MAX_RETRY_AFTER, max(1, math.ceil(self.retry_after))))
+
+
+class TokenBucket:
+    """Per-key token buckets; idle keys are forgotten LRU beyond `max_keys`. rate <= 0 = unlimited."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Take one token: 0.0 when allowed, else seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = self._clock()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, key: str) -> None:
+        with self._lock:
+            if key in self._buckets:
+                tokens, last = self._buckets[key]
+                self._buckets[key] = (min(self.burst, tokens + 1.0), last)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        max_queue: int = 64,
+        queue_timeout: float = 5.0,
+        rate: float = 1.0,
+        burst: float = 20.0,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        # Smoothed time a request holds its slot, for Retry-After estimates
+        self._avg_hold = 1.0
+        self._stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrent=int(os.getenv("ASK_MAX_CONCURRENT", "32")),
+            max_queue=int(os.getenv("ASK_QUEUE_SIZE", "64")),
+            queue_timeout=float(os.getenv("ASK_QUEUE_TIMEOUT", "5")),
+            rate=float(os.getenv("ASK_RATE_PER_MIN", "60")) / 60.0,
+            burst=float(os.getenv("ASK_RATE_BURST", "20")),
+            enabled=os.getenv("ASK_ADMISSION", "on").lower() not in {"off", "0", "false"},
+        )
+
+    def _busy_retry_after(self) -> float:
+        # Roughly when a slot frees up for someone joining now
+        return self._avg_hold * (self._waiting + 1) / self.max_concurrent
+
+    def acquire(self, key: str) -> float:
+        """
+        Admit one request for `key` (raises Rejected). Returns the seconds spent
+        queued, which callers should take off the request's own deadline.
+        Every successful acquire() must be paired with release(held).
+        """
+        wait = self.bucket.take(key)
+        if wait > 0:
+            with self._cond:
+                self._stats["rate_limited"] += 1
+            raise Rejected(429, "rate limit exceeded", wait)
+
+        start = self._clock()
+        with self._cond:
+            if self._active < self.max_concurrent and self._waiting == 0:
+                self._active += 1
+                self._stats["admitted"] += 1
+                return 0.0
+            if self._waiting >= self.max_queue:
+                self._stats["queue_full"] += 1
+                retry_after = self._busy_retry_after()
+                self.bucket.refund(key)
+                raise Rejected(503, "server busy", retry_after)
+            self._waiting += 1
+            self._stats["queued"] += 1
+            deadline = start + self.queue_timeout
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self._stats["queue_timeout"] += 1
+                        self.bucket.refund(key)
+                        raise Rejected(503, "server busy", self._busy_retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            self._stats["admitted"] += 1
+        return self._clock() - start
+
+    def release(self, held: float) -> None:
+        """Free the slot; `held` is how long the request kept it (seconds)."""
+        with self._cond:
+            self._active = max(0, self._active - 1)
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * max(0.0, held)
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(active=self._active, waiting=self._waiting, avg_hold_s=round(self._avg_hold, 3))
+        out.update(max_concurrent=self.max_concurrent, max_queue=self.max_queue, enabled=self.enabled)
+        return out
+
+    def reset(self) -> None:
+        """Clear counters and buckets (in-flight requests keep their slots)."""
+        self.bucket.clear()
+        with self._cond:
+            self._avg_hold = 1.0
+            for k in self._stats:
+                self._stats[k] = 0
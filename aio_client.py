@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Dict, Optional
+
+import aiohttp
+
+# Shared aiohttp sessions for the async ask pipeline (async_server.py).
+#
+# The asyncio counterpart of http_client: one pooled ClientSession per event
+# loop, so hundreds of in-flight upstream calls share a bounded set of
+# keep-alive connections instead of opening one each.
+
+POOL_LIMIT = int(os.getenv("AIO_POOL_LIMIT", "200"))
+POOL_LIMIT_PER_HOST = int(os.getenv("AIO_POOL_LIMIT_PER_HOST", "100"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+MIN_TIMEOUT = 0.05
+
+_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+_closers: Dict[asyncio.AbstractEventLoop, "asyncio.Task[None]"] = {}
+
+
+async def _close_at_shutdown(loop: asyncio.AbstractEventLoop, sess: aiohttp.ClientSession) -> None:
+    # Parked until the loop shuts down: asyncio.run() and web.run_app() cancel
+    # leftover tasks before closing the loop, so the session is closed on its
+    # own loop even when nobody calls close().
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if _sessions.get(loop) is sess:
+            del _sessions[loop]
+        if _closers.get(loop) is asyncio.current_task():
+            del _closers[loop]
+        await sess.close()
+
+
+def _prune_closed_loops() -> None:
+    # Loops closed without cancelling their tasks (no asyncio.run) never ran
+    # the closer; forget their sessions so they are not kept for the process life.
+    for loop in [lp for lp in _sessions if lp.is_closed()]:
+        _sessions.pop(loop)
+        _closers.pop(loop, None)
+
+
+def session() -> aiohttp.ClientSession:
+    """Pooled session bound to the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    _prune_closed_loops()
+    sess = _sessions.get(loop)
+    if sess is None or sess.closed:
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST, ttl_dns_cache=300)
+        sess = _sessions[loop] = aiohttp.ClientSession(connector=connector)
+        closer = _closers.pop(loop, None)
+        if closer is not None:
+            closer.cancel()
+        _closers[loop] = loop.create_task(_close_at_shutdown(loop, sess))
+    return sess
+
+
+def timeout(seconds: Optional[float]) -> aiohttp.ClientTimeout:
+    """Total budget for a call; connecting never gets more than CONNECT_TIMEOUT."""
+    if seconds is None:
+        return aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT)
+    seconds = max(MIN_TIMEOUT, seconds)  # an expired deadline must not mean "no timeout"
+    return aiohttp.ClientTimeout(total=seconds, sock_connect=min(CONNECT_TIMEOUT, seconds))
+
+
+async def close() -> None:
+    """Close the running loop's session (call from the app's cleanup hook)."""
+    loop = asyncio.get_running_loop()
+    sess = _sessions.pop(loop, None)
+    closer = _closers.pop(loop, None)
+    if closer is not None:
+        closer.cancel()
+    if sess is not None and not sess.closed:
+        await sess.close()
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Exact-match answer cache for /api/ask.
+#
+# Keys are a hash of the normalized (optimized) prompt plus the identity of the
+# backend chain that produced the answer, so changing models or providers never
+# serves stale answers. Two tiers: an in-process LRU (OrderedDict) and an
+# optional sqlite file shared across workers/restarts. Concurrent identical
+# misses are collapsed into one upstream call (single-flight).
+
+Answer = Tuple[str, str]  # (text, backend name)
+
+
+def cache_key(prompt: str, backend_id: str) -> str:
+    normalized = " ".join(str(prompt).split()).casefold()
+    return hashlib.sha256(f"{backend_id}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self, deadline: Optional[float] = None) -> None:
+        self.done = threading.Event()
+        self.value: Optional[Answer] = None
+        self.deadline = deadline  # leader's time.monotonic() deadline, if any
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+
+    def wait_for(self, wait: Optional[float]) -> Optional[float]:
+        """Cap a follower's `wait` at the leader's remaining deadline."""
+        if self.deadline is not None:
+            remaining = max(0.0, self.deadline - time.monotonic())
+            wait = remaining if wait is None else min(wait, remaining)
+        return wait
+
+    async def wait_async(self, wait: Optional[float]) -> None:
+        """Like done.wait() but parks a future on the caller's loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        fut: "asyncio.Future[None]" = loop.create_future()
+        with self._lock:
+            if self.done.is_set():
+                return
+            self._waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, wait)
+        except asyncio.TimeoutError:
+            pass
+
+    def finish(self) -> None:
+        with self._lock:
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+            except RuntimeError:
+                pass  # the follower's loop already closed
+
+
+def _wake(fut: "asyncio.Future[None]") -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        disk_path: Optional[str] = None,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "shared": 0, "stores": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        return cls(
+            max_entries=int(os.getenv("ASK_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("ASK_CACHE_TTL", "3600")),
+            disk_path=os.getenv("ASK_CACHE_DB") or None,
+            enabled=os.getenv("ASK_CACHE", "on").lower() not in {"off", "0", "false"},
+        )
+
+    # -------------------------
+    # Disk tier (optional)
+    # -------------------------
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.disk_path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=1.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, backend TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM answers WHERE expires < ?", (self._clock(),))
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, str, float]]:
+        try:
+            with self._db_lock:
+                db = self._conn()
+                if db is None:
+                    return None
+                row = db.execute("SELECT text, backend, expires FROM answers WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"answer cache disk read failed: {e}")
+            return None
+        if row is None or row[2] <= self._clock():
+            return None
+        return row[0], row[1], row[2]
+
+    def _disk_set(self, key: str, text: str, backend: str, expires: float) -> None:
+        try:
+            with self._db_lock:
+                db = self._conn()
+                if db is None:
+                    return
+                db.execute(
+                    "INSERT OR REPLACE INTO answers (key, text, backend, expires) VALUES (?, ?, ?, ?)",
+                    (key, text, backend, expires),
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"answer cache disk write failed: {e}")
+
+    # -------------------------
+    # Public API
+    # -------------------------
+
+    def _remember(self, key: str, text: str, backend: str, expires: float) -> None:
+        with self._lock:
+            self._memory[key] = (text, backend, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Answer]:
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0], entry[1]
+                del self._memory[key]
+        entry = self._disk_get(key)
+        if entry is None:
+            return None
+        self._remember(key, *entry)
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+        return entry[0], entry[1]
+
+    def set(self, key: str, text: str, backend: str, ttl: Optional[float] = None) -> None:
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+        self._remember(key, text, backend, expires)
+        self._disk_set(key, text, backend, expires)
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Optional[Answer]],
+        wait: Optional[float] = None,
+        cacheable: Optional[Callable[[Answer], bool]] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Optional[Answer], str]:
+        """
+        Return (answer, status) where status is "HIT", "MISS" or "SHARED".
+        Only one caller per key runs compute(); the others wait up to `wait`
+        seconds for its result, and never past the leader's `deadline`
+        (time.monotonic()). None answers (every backend failed) are not
+        cached, nor are answers rejected by `cacheable`.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "HIT"
+
+        flight, leader = self._join(key, deadline)
+        if not leader:
+            flight.done.wait(flight.wait_for(wait))
+            if self._shared(flight):
+                return flight.value, "SHARED"
+            # Leader failed or timed out: answer this request on its own
+            return compute(), "MISS"
+
+        try:
+            return self._land(key, flight, compute(), cacheable), "MISS"
+        finally:
+            self._leave(key, flight)
+
+    async def get_or_compute_async(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Optional[Answer]]],
+        wait: Optional[float] = None,
+        cacheable: Optional[Callable[[Answer], bool]] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Optional[Answer], str]:
+        """
+        get_or_compute() for coroutine callers. Flights are shared with the sync
+        path, so a thread and a coroutine asking the same question still make
+        one upstream call; followers wait on their loop, not in a thread.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "HIT"
+
+        flight, leader = self._join(key, deadline)
+        if not leader:
+            await flight.wait_async(flight.wait_for(wait))
+            if self._shared(flight):
+                return flight.value, "SHARED"
+            return await compute(), "MISS"
+
+        try:
+            return self._land(key, flight, await compute(), cacheable), "MISS"
+        finally:
+            self._leave(key, flight)
+
+    def _join(self, key: str, deadline: Optional[float]) -> Tuple[_Flight, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight(deadline)
+            self._stats["misses"] += 1
+            return flight, True
+
+    def _shared(self, flight: _Flight) -> bool:
+        shared = flight.value is not None
+        with self._lock:
+            self._stats["shared" if shared else "misses"] += 1
+        return shared
+
+    def _land(
+        self,
+        key: str,
+        flight: _Flight,
+        value: Optional[Answer],
+        cacheable: Optional[Callable[[Answer], bool]],
+    ) -> Optional[Answer]:
+        if value is not None and (cacheable is None or cacheable(value)):
+            self.set(key, value[0], value[1])
+        flight.value = value
+        return value
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.finish()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["entries"] = len(self._memory)
+        lookups = out["hits"] + out["misses"] + out["shared"]
+        out["hit_rate"] = round((out["hits"] + out["shared"]) / lookups, 3) if lookups else None
+        out["enabled"] = self.enabled
+        out["disk"] = bool(self.disk_path)
+        return out
+
+    def clear(self, disk: bool = True) -> None:
+        with self._lock:
+            self._memory.clear()
+            for k in self._stats:
+                self._stats[k] = 0
+        if not disk:
+            return
+        try:
+            with self._db_lock:
+                db = self._conn()
+                if db is not None:
+                    db.execute("DELETE FROM answers")
+                    db.commit()
+        except sqlite3.Error as e:
+            print(f"answer cache disk clear failed: {e}")
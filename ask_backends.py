@@ -0,0 +1,562 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from batching import QueueFull
+from resilience import CircuitBreaker
+
+# Hedged execution of the /api/ask backend chain.
+#
+# Backends are tried in order, but instead of waiting for each one to time out
+# the executor starts the next backend as a hedge once the current one has run
+# longer than its observed p95 latency. The first good answer wins; losers are
+# cancelled if they haven't started, otherwise their results are discarded.
+# Every backend receives the time left until the request deadline as its timeout.
+#
+# Each backend also has a HealthRegistry entry: a rolling success/latency window,
+# a circuit breaker (open backends are skipped outright) and a bulkhead that caps
+# its concurrent calls. Once enough samples exist the chain is reordered so the
+# fastest healthy backend goes first.
+#
+# Python cannot abort a thread, so a backend that ignores its timeout keeps its
+# worker thread and bulkhead slot. Such calls are flagged as overdue once they
+# run OVERDUE_GRACE seconds past their deadline: each counts as a breaker
+# failure right away, so a hanging provider stops receiving new calls.
+
+# Calls with less time than this left are skipped: HTTP clients reject 0 timeouts
+MIN_TIMEOUT = 0.05
+OVERDUE_GRACE = float(os.getenv("ASK_OVERDUE_GRACE", "1.0"))
+
+BackendFn = Callable[[str, float], Optional[str]]
+StreamFn = Callable[[str, float], Optional[Iterable[str]]]
+AsyncFn = Callable[[str, float], Awaitable[Optional[str]]]
+
+
+class BackendSkipped(RuntimeError):
+    """The backend was not called (breaker open or bulkhead full); not a health failure."""
+
+
+class Backend:
+    """A named backend: fn(prompt, timeout_seconds) -> answer text, or None for 'no answer'."""
+
+    def __init__(self, name: str, fn: BackendFn):
+        self.name = name
+        self.fn = fn
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name!r})"
+
+
+class StreamBackend:
+    """A named streaming backend: fn(prompt, timeout) -> iterable of text chunks, or None for 'no answer'."""
+
+    def __init__(self, name: str, fn: StreamFn):
+        self.name = name
+        self.fn = fn
+
+    def __repr__(self) -> str:
+        return f"StreamBackend({self.name!r})"
+
+
+class AsyncBackend:
+    """A named coroutine backend: await fn(prompt, timeout) -> answer text, or None."""
+
+    def __init__(self, name: str, fn: AsyncFn):
+        self.name = name
+        self.fn = fn
+
+    def __repr__(self) -> str:
+        return f"AsyncBackend({self.name!r})"
+
+
+def call_with_timeout(fn: Callable[..., Any], prompt: str, timeout: float) -> Any:
+    """Call fn(prompt, timeout=...) when fn accepts a timeout, else fn(prompt)."""
+    try:
+        params = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return fn(prompt)
+    if "timeout" in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        return fn(prompt, timeout=timeout)
+    return fn(prompt)
+
+
+class LatencyTracker:
+    """Rolling per-backend latency window used to derive hedge delays."""
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, name: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+class BackendHealth:
+    """
+    Rolling success/latency window, circuit breaker and bulkhead for one backend.
+    The bulkhead caps concurrent calls so a slow provider cannot tie up every
+    worker thread; calls beyond the cap are skipped rather than queued.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 50,
+        max_concurrency: int = 8,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.max_concurrency = max_concurrency
+        self._bulkhead = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.in_flight = 0
+        self.rejected = 0
+        self.overdue = 0
+        # token -> deadline of every in-flight call, and the tokens already flagged overdue
+        self._deadlines: Dict[int, float] = {}
+        self._overdue_tokens: Set[int] = set()
+        self._next_token = 0
+
+    def _flag_overdue(self) -> None:
+        """Count calls running OVERDUE_GRACE past their deadline as failures (once each)."""
+        limit = time.monotonic() - OVERDUE_GRACE
+        with self._lock:
+            late = [t for t, d in self._deadlines.items() if d < limit and t not in self._overdue_tokens]
+            self._overdue_tokens.update(late)
+            self.overdue += len(late)
+        for _ in late:
+            self.breaker.record_failure()
+
+    def acquire(self, deadline: float = float("inf")) -> int:
+        """Claim a bulkhead slot; returns the token to pass to release()."""
+        self._flag_overdue()
+        if not self._bulkhead.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise BackendSkipped(f"{self.name}: bulkhead full ({self.max_concurrency} in flight)")
+        if not self.breaker.allow():
+            self._bulkhead.release()
+            with self._lock:
+                self.rejected += 1
+            raise BackendSkipped(f"{self.name}: circuit open")
+        with self._lock:
+            self.in_flight += 1
+            self._next_token += 1
+            self._deadlines[self._next_token] = deadline
+            return self._next_token
+
+    def release(self, ok: Optional[bool], seconds: float, token: Optional[int] = None) -> None:
+        """ok=True success, ok=False failure, ok=None 'no answer' (neutral)."""
+        with self._lock:
+            self.in_flight -= 1
+            self._deadlines.pop(token, None)
+            late = token in self._overdue_tokens
+            self._overdue_tokens.discard(token)
+            if ok is not None and not late:
+                self._outcomes.append((ok, seconds))
+        self._bulkhead.release()
+        if late:
+            return  # already counted as a failure when it became overdue
+        if ok is True:
+            self.breaker.record_success()
+        elif ok is False:
+            self.breaker.record_failure()
+        else:
+            self.breaker.cancel()
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            outcomes = list(self._outcomes)
+            in_flight, rejected = self.in_flight, self.rejected
+        latencies = sorted(sec for ok, sec in outcomes if ok)
+        successes = sum(1 for ok, _ in outcomes if ok)
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+        return {
+            "samples": len(outcomes),
+            "success_rate": round(successes / len(outcomes), 3) if outcomes else None,
+            "p50_s": pct(0.50),
+            "p95_s": pct(0.95),
+            "in_flight": in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rejected": rejected,
+            "overdue": self.overdue,
+            "breaker": self.breaker.snapshot(),
+        }
+
+    def score(self, min_samples: int) -> Optional[float]:
+        """Expected seconds per good answer (lower is better); None until enough samples."""
+        st = self.stats()
+        if st["samples"] < min_samples or not st["success_rate"] or st["p50_s"] is None:
+            return None
+        return st["p50_s"] / st["success_rate"]
+
+
+class HealthRegistry:
+    """Per-backend health plus the dynamic ordering used by the executor."""
+
+    def __init__(
+        self,
+        window: int = 50,
+        max_concurrency: int = 8,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        min_samples: int = 20,
+    ):
+        self.window = window
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._backends: Dict[str, BackendHealth] = {}
+
+    @classmethod
+    def from_env(cls) -> "HealthRegistry":
+        return cls(
+            max_concurrency=int(os.getenv("ASK_BULKHEAD", "8")),
+            failure_threshold=int(os.getenv("ASK_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("ASK_BREAKER_RESET", "30")),
+            min_samples=int(os.getenv("ASK_REORDER_MIN_SAMPLES", "20")),
+        )
+
+    def get(self, name: str) -> BackendHealth:
+        with self._lock:
+            health = self._backends.get(name)
+            if health is None:
+                limit = int(os.getenv(f"ASK_BULKHEAD_{name.upper()}", str(self.max_concurrency)))
+                health = self._backends[name] = BackendHealth(
+                    name,
+                    window=self.window,
+                    max_concurrency=limit,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                )
+            return health
+
+    def order(self, backends: List[Backend]) -> List[Backend]:
+        """
+        Drop backends whose breaker is open, then prefer the fastest healthy ones.
+        Backends without enough samples keep their configured relative order and
+        go after the scored ones, so the chain is unchanged until data exists.
+        """
+        usable = [b for b in backends if self.get(b.name).available]
+        scored = []
+        unscored = []
+        for idx, b in enumerate(usable):
+            score = self.get(b.name).score(self.min_samples)
+            (unscored if score is None else scored).append((score, idx, b))
+        scored.sort(key=lambda t: (t[0], t[1]))
+        return [b for _, _, b in scored] + [b for _, _, b in unscored]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = list(self._backends.items())
+        return {name: health.stats() for name, health in items}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._backends.clear()
+
+
+class AskResult:
+    def __init__(self, text: str, backend: str, elapsed: float, hedged: bool):
+        self.text = text
+        self.backend = backend
+        self.elapsed = elapsed
+        self.hedged = hedged
+
+
+class BackendExecutor:
+    def __init__(
+        self,
+        max_workers: int = 32,
+        default_hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05,
+        latencies: Optional[LatencyTracker] = None,
+        health: Optional[HealthRegistry] = None,
+    ):
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.latencies = latencies or LatencyTracker()
+        self.health = health or HealthRegistry()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ask-backend")
+
+    @classmethod
+    def from_env(cls) -> "BackendExecutor":
+        return cls(
+            max_workers=int(os.getenv("ASK_MAX_WORKERS", "32")),
+            default_hedge_delay=float(os.getenv("ASK_HEDGE_DELAY", "2.0")),
+            health=HealthRegistry.from_env(),
+        )
+
+    def hedge_delay(self, name: str) -> float:
+        p95 = self.latencies.p95(name)
+        delay = self.default_hedge_delay if p95 is None else p95
+        return max(self.min_hedge_delay, delay)
+
+    def _invoke(self, backend: Backend, prompt: str, deadline: float) -> Tuple[Optional[str], float]:
+        start = time.monotonic()
+        timeout = deadline - start
+        if timeout < MIN_TIMEOUT:
+            raise BackendSkipped(f"{backend.name}: deadline passed")
+        health = self.health.get(backend.name)
+        token = health.acquire(deadline)
+        try:
+            text = backend.fn(prompt, timeout)
+        except QueueFull as e:
+            # Backpressure from a local batch queue: skip, don't count as unhealthy
+            health.release(None, time.monotonic() - start, token)
+            raise BackendSkipped(f"{backend.name}: {e}")
+        except Exception:
+            health.release(False, time.monotonic() - start, token)
+            raise
+        elapsed = time.monotonic() - start
+        health.release(None if text is None else True, elapsed, token)
+        return text, elapsed
+
+    def run(self, backends: List[Backend], prompt: str, deadline: float) -> Optional[AskResult]:
+        """
+        Run the chain against an absolute time.monotonic() deadline.
+        Returns the first answer (any non-None text), or None when every backend
+        failed or the deadline passed.
+        """
+        started = time.monotonic()
+        backends = self.health.order(backends)
+        pending: Dict[Future, Tuple[Backend, float]] = {}
+        next_idx = 0
+        hedged = False
+
+        def launch() -> None:
+            nonlocal next_idx
+            backend = backends[next_idx]
+            next_idx += 1
+            pending[self._pool.submit(self._invoke, backend, prompt, deadline)] = (backend, time.monotonic())
+
+        try:
+            while True:
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                if not pending:
+                    if next_idx >= len(backends):
+                        return None
+                    launch()
+                    continue
+
+                wait_for = remaining
+                if next_idx < len(backends):
+                    # Hedge when the most recently launched backend exceeds its p95
+                    last_backend, last_start = max(pending.values(), key=lambda v: v[1])
+                    wait_for = min(wait_for, max(0.0, last_start + self.hedge_delay(last_backend.name) - now))
+
+                done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+                if not done:
+                    if next_idx < len(backends) and time.monotonic() < deadline:
+                        hedged = True
+                        launch()
+                    continue
+
+                for fut in done:
+                    backend, _ = pending.pop(fut)
+                    try:
+                        text, elapsed = fut.result()
+                    except BackendSkipped as e:
+                        print(f"ask backend skipped: {e}")
+                        continue
+                    except Exception as e:
+                        print(f"ask backend {backend.name} failed: {e}")
+                        continue
+                    self.latencies.observe(backend.name, elapsed)
+                    if text is not None:
+                        return AskResult(text, backend.name, time.monotonic() - started, hedged)
+        finally:
+            # Discard the losers: not-yet-started ones are cancelled, running ones
+            # finish in the background bounded by their own (deadline) timeout.
+            for fut in pending:
+                fut.cancel()
+
+    async def _invoke_async(self, backend: AsyncBackend, prompt: str, deadline: float) -> Tuple[Optional[str], float]:
+        start = time.monotonic()
+        timeout = deadline - start
+        if timeout < MIN_TIMEOUT:
+            raise BackendSkipped(f"{backend.name}: deadline passed")
+        health = self.health.get(backend.name)
+        token = health.acquire(deadline)
+        ok: Optional[bool] = None
+        try:
+            text = await asyncio.wait_for(backend.fn(prompt, timeout), timeout)
+            ok = None if text is None else True
+            return text, time.monotonic() - start
+        except asyncio.CancelledError:
+            raise  # hedge loser: neither a success nor a failure
+        except QueueFull as e:
+            raise BackendSkipped(f"{backend.name}: {e}")
+        except Exception:
+            ok = False
+            raise
+        finally:
+            health.release(ok, time.monotonic() - start, token)
+
+    async def run_async(self, backends: List[AsyncBackend], prompt: str, deadline: float) -> Optional[AskResult]:
+        """
+        asyncio counterpart of run(): same ordering, hedging and deadline rules,
+        but backends are tasks on the event loop, so a waiting request costs a
+        coroutine rather than a thread and hedge losers are really cancelled.
+        """
+        started = time.monotonic()
+        backends = self.health.order(backends)
+        pending: Dict["asyncio.Task[Tuple[Optional[str], float]]", Tuple[AsyncBackend, float]] = {}
+        next_idx = 0
+        hedged = False
+
+        def launch() -> None:
+            nonlocal next_idx
+            backend = backends[next_idx]
+            next_idx += 1
+            task = asyncio.ensure_future(self._invoke_async(backend, prompt, deadline))
+            pending[task] = (backend, time.monotonic())
+
+        try:
+            while True:
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                if not pending:
+                    if next_idx >= len(backends):
+                        return None
+                    launch()
+                    continue
+
+                wait_for = remaining
+                if next_idx < len(backends):
+                    last_backend, last_start = max(pending.values(), key=lambda v: v[1])
+                    wait_for = min(wait_for, max(0.0, last_start + self.hedge_delay(last_backend.name) - now))
+
+                done, _ = await asyncio.wait(list(pending), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if next_idx < len(backends) and time.monotonic() < deadline:
+                        hedged = True
+                        launch()
+                    continue
+
+                for task in done:
+                    backend, _ = pending.pop(task)
+                    try:
+                        text, elapsed = task.result()
+                    except BackendSkipped as e:
+                        print(f"ask backend skipped: {e}")
+                        continue
+                    except Exception as e:
+                        print(f"ask backend {backend.name} failed: {e!r}")
+                        continue
+                    self.latencies.observe(backend.name, elapsed)
+                    if text is not None:
+                        return AskResult(text, backend.name, time.monotonic() - started, hedged)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, backends: List[StreamBackend], prompt: str, deadline: float) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream the first backend that produces output, falling back in order.
+        Yields ("token", text) events followed by one ("done", meta) event.
+        A backend that fails before its first chunk is skipped; once chunks were
+        sent the answer can't be swapped, so a later failure ends the stream with
+        meta["error"] set. Streams are not hedged (two answers can't be merged),
+        but they share the breakers, bulkheads and ordering of run().
+        """
+        started = time.monotonic()
+        for backend in self.health.order(backends):
+            if deadline - time.monotonic() < MIN_TIMEOUT:
+                break
+            health = self.health.get(backend.name)
+            try:
+                token = health.acquire(deadline)
+            except BackendSkipped as e:
+                print(f"ask backend skipped: {e}")
+                continue
+            start = time.monotonic()
+            first_at: Optional[float] = None
+            ok: Optional[bool] = None
+            chunks: Optional[Iterable[str]] = None
+            try:
+                chunks = backend.fn(prompt, max(MIN_TIMEOUT, deadline - start))
+                if chunks is None:
+                    continue
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if first_at is None:
+                        first_at = time.monotonic()
+                    yield "token", chunk
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError("ask deadline exceeded mid-stream")
+                if first_at is None:
+                    continue  # empty stream: treat as 'no answer'
+                ok = True
+                yield "done", {
+                    "backend": backend.name,
+                    "elapsed": round(time.monotonic() - started, 3),
+                    "ttft": round(first_at - started, 3),
+                }
+                return
+            except Exception as e:
+                ok = False
+                print(f"ask backend {backend.name} failed: {e}")
+                if first_at is not None:
+                    yield "done", {
+                        "backend": backend.name,
+                        "elapsed": round(time.monotonic() - started, 3),
+                        "ttft": round(first_at - started, 3),
+                        "error": "stream interrupted",
+                    }
+                    return
+            finally:
+                # Close the upstream stream too when the client went away mid-answer
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                health.release(ok, time.monotonic() - start, token)
+        yield "done", {"backend": None, "elapsed": round(time.monotonic() - started, 3), "ttft": None}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self.health.snapshot()
+
+    def reset(self) -> None:
+        self.latencies.reset()
+        self.health.reset()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Async ask server (aiohttp).
+
+Serves POST /api/ask with the same request/response contract as the Flask
+route in server_improved, but every in-flight question is a coroutine waiting
+on the shared aiohttp pool instead of a blocked worker thread, so one process
+can hold hundreds of concurrent LLM calls.
+
+Users and tokens come from server_improved's store: run both servers with the
+same DB_PATH and tokens issued by /api/register work here too. Validation,
+admission control, the answer/semantic caches (with single-flight), backend
+health and hedging settings are shared with the Flask module.
+
+Usage:
+  DB_PATH=data/app.json python async_server.py [--host 127.0.0.1] [--port 8001]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+import aio_client
+import server_improved as si
+from answer_cache import cache_key
+from ask_backends import AsyncBackend
+
+_db_mtime: Optional[int] = None
+_admission_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _admission_pool() -> ThreadPoolExecutor:
+    """One thread per request the admission queue can hold (threads start on demand)."""
+    global _admission_executor
+    if _admission_executor is None:
+        workers = si._admission.max_concurrent + si._admission.max_queue
+        _admission_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ask-admission")
+    return _admission_executor
+
+
+def _refresh_users() -> None:
+    """Reload the shared JSON store when the Flask server has written to it."""
+    global _db_mtime
+    path = si._db_path()
+    if not path:
+        return
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+    if mtime != _db_mtime:
+        si._load_db()
+        _db_mtime = mtime
+
+
+def _bearer_token(request: web.Request) -> Optional[str]:
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        return auth.split(" ", 1)[1].strip()
+    return None
+
+
+def _auth_user(request: web.Request) -> Optional[Dict[str, Any]]:
+    token = _bearer_token(request)
+    if not token:
+        return None
+    if token not in si._TOKENS:
+        _refresh_users()
+    username = si._TOKENS.get(token)
+    return si._USERS.get(username) if username else None
+
+
+# -------------------------
+# Backends
+# -------------------------
+
+async def _backend_ask_dj(prompt: str, timeout: float) -> Optional[str]:
+    return await asyncio.to_thread(si._backend_ask_dj, prompt, timeout)
+
+
+async def _backend_worker(prompt: str, timeout: float) -> Optional[str]:
+    import worker_logic  # type: ignore
+
+    return si._extract_text(await worker_logic.ask_async(prompt, timeout=timeout))
+
+
+async def _backend_gemini(prompt: str, timeout: float) -> Optional[str]:
+    import gemini_logic  # type: ignore
+
+    result = await gemini_logic.ask_async(prompt, timeout=timeout)
+    return result["text"] if isinstance(result, dict) and "text" in result else None
+
+
+async def _backend_huggingface(prompt: str, timeout: float) -> Optional[str]:
+    # Local inference is CPU-bound: keep it off the event loop
+    return await asyncio.to_thread(si._backend_huggingface, prompt, timeout)
+
+
+async def _backend_self_hosted(prompt: str, timeout: float) -> Optional[str]:
+    import self_hosted_chat
+
+    return await self_hosted_chat.answer_async(prompt, timeout)
+
+
+def _ask_backends() -> List[AsyncBackend]:
+    """Same order and names as server_improved._ask_backends() (shared health)."""
+    backends = [AsyncBackend("ask_dj", _backend_ask_dj)] if si._ask_dj_configured(si.ask_dj) else []
+    if si._self_hosted_ready():
+        backends.append(AsyncBackend("self_hosted", _backend_self_hosted))
+    return backends + [
+        AsyncBackend("worker_logic", _backend_worker),
+        AsyncBackend("gemini", _backend_gemini),
+        AsyncBackend("huggingface", _backend_huggingface),
+    ]
+
+
+# -------------------------
+# Routes
+# -------------------------
+
+async def ask(request: web.Request) -> web.Response:
+    user = _auth_user(request)
+    data = None
+    if user and user.get("is_premium"):
+        try:
+            data = await request.json()
+        except Exception:
+            data = None
+    question, optimized_question, error = si._check_ask(user, data)
+    if error is not None:
+        return web.json_response(error[0], status=error[1])
+
+    # Same admission as the Flask routes; a queued request waits in a thread of
+    # its own so it never holds up the to_thread() pool the backends use.
+    client = _bearer_token(request) or request.remote or ""
+    release, waited, rejected = await asyncio.get_running_loop().run_in_executor(_admission_pool(), si._admit, client)
+    if rejected is not None:
+        resp = web.json_response({"error": rejected.reason}, status=rejected.status)
+        resp.headers["Retry-After"] = rejected.retry_after_header
+        return resp
+    try:
+        return await _answer_ask(question, optimized_question, time.monotonic() + max(0.0, si.ASK_DEADLINE - waited))
+    finally:
+        release()
+
+
+async def _answer_ask(question: str, optimized_question: str, deadline: float) -> web.Response:
+    """server_improved._answer_ask() for coroutines (no chat sessions or prefetch here)."""
+    chain_id = si._ask_chain_id()
+    semantic = si._semantic_cache_enabled()
+    semantic_hit = False
+
+    async def compute() -> Optional[tuple]:
+        nonlocal semantic_hit
+        if semantic:
+            hit = await asyncio.to_thread(si._semantic_cache.lookup, question, chain_id)
+            if hit is not None:
+                semantic_hit = True
+                return hit[0], hit[1]
+        result = await si._ask_executor.run_async(_ask_backends(), optimized_question, deadline)
+        if result is None:
+            return None
+        if semantic and si._cacheable_answer((result.text, result.backend)):
+            await asyncio.to_thread(si._semantic_cache.store, question, chain_id, result.text, result.backend)
+        return result.text, result.backend
+
+    cache_status = "BYPASS"
+    answer = si._faq_answer(question, follow_up=False)
+    if answer is not None:
+        cache_status = "FAQ"
+    elif si._answer_cache_enabled():
+        answer, cache_status = await si._answer_cache.get_or_compute_async(
+            cache_key(optimized_question, chain_id),
+            compute,
+            wait=max(0.0, deadline - time.monotonic()),
+            cacheable=si._cacheable_answer,
+            deadline=deadline,
+        )
+    else:
+        answer = await compute()
+    if semantic_hit:
+        cache_status = "SEMANTIC"
+
+    text, backend = answer if answer is not None else ("Default fallback response", "fallback")
+    resp = web.json_response({"choices": [{"message": {"content": text}}]})
+    resp.headers["X-Ask-Backend"] = backend
+    resp.headers["X-Cache"] = cache_status
+    return resp
+
+
+async def health(_request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def _close_pool(_app: web.Application) -> None:
+    await aio_client.close()
+
+
+async def _start_keepalive(_app: web.Application) -> None:
+    if si.SELF_HOSTED_CHAT_AVAILABLE:
+        import local_llm
+
+        local_llm.start_keepalive()
+
+
+async def _preload_pipelines(_app: web.Application) -> None:
+    if os.getenv("HF_PRELOAD"):
+        import huggingface_logic  # type: ignore
+
+        asyncio.get_running_loop().run_in_executor(None, huggingface_logic.preload)
+
+
+def create_app() -> web.Application:
+    app = web.Application(client_max_size=64 * 1024)
+    app.router.add_post("/api/ask", ask)
+    app.router.add_get("/api/health", health)
+    app.on_cleanup.append(_close_pool)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Async /api/ask server")
+    parser.add_argument("--host", default=os.getenv("ASYNC_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ASYNC_PORT", "8001")))
+    args = parser.parse_args()
+    _refresh_users()
+    app = create_app()
+    app.on_startup.append(_start_keepalive)
+    app.on_startup.append(_preload_pipelines)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Dynamic micro-batching for local generation.
+#
+# Callers submit one item and block on its result; a worker thread collects
+# items until either `max_batch` are waiting or the first one has waited
+# `max_wait_ms`, runs them through `process(items)` in one call and scatters the
+# results back. The queue is bounded: when it is full, submit() raises
+# QueueFull right away so callers can fall back instead of piling up.
+
+
+class QueueFull(RuntimeError):
+    """Raised by MicroBatcher.submit() when the pending queue is at capacity."""
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], Sequence[Any]],
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue: int = 64,
+    ):
+        """
+        `process` receives a list of items and must return one result per item,
+        in order. A result that is an Exception instance fails only that item;
+        an exception raised by `process` fails the whole batch.
+        """
+        self.name = name
+        self.process = process
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "batches": 0, "items": 0, "errors": 0, "max_batch_seen": 0}
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"batch-{name}", daemon=True)
+        self._worker.start()
+
+    def submit_async(self, item: Any) -> "Future[Any]":
+        if self._closed:
+            raise RuntimeError(f"batcher '{self.name}' is closed")
+        fut: "Future[Any]" = Future()
+        try:
+            self._queue.put_nowait((item, fut))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFull(f"batcher '{self.name}' queue is full ({self._queue.maxsize} waiting)")
+        with self._lock:
+            self._stats["submitted"] += 1
+        return fut
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Queue item and wait for its result (TimeoutError after `timeout` seconds)."""
+        fut = self.submit_async(item)
+        try:
+            return fut.result(timeout=timeout)
+        finally:
+            # Not yet picked up by the worker: drop it rather than computing for nobody
+            fut.cancel()
+
+    def _collect(self) -> List[tuple]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        flush_at = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = flush_at - time.monotonic()
+            try:
+                nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                self._closed = True
+                break
+            batch.append(nxt)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            # Skip items whose caller gave up (set_running_or_notify_cancel is False when cancelled)
+            live = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if live:
+                self._dispatch(live)
+            if not batch or self._closed and self._queue.empty():
+                return
+
+    def _dispatch(self, live: List[tuple]) -> None:
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(live)
+            self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(live))
+        try:
+            results = list(self.process([item for item, _ in live]))
+            if len(results) != len(live):
+                raise RuntimeError(f"batch returned {len(results)} results for {len(live)} items")
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            for _, fut in live:
+                fut.set_exception(e)
+            return
+        for (_, fut), result in zip(live, results):
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["queued"] = self._queue.qsize()
+        out["avg_batch"] = round(out["items"] / out["batches"], 2) if out["batches"] else None
+        return out
+
+    def close(self) -> None:
+        """Stop accepting items; already queued ones are still processed."""
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
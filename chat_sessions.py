@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Server-side chat sessions for /api/ask follow-ups.
+#
+# A session keeps two things:
+#   - the Ollama `context` token array from the last local-model turn, so a
+#     follow-up sends only the new turn and the model skips re-reading history;
+#   - a compact text history (last few turns, answers clipped) for remote
+#     backends, which have no server-side state.
+# Sessions live in a bounded LRU with an idle TTL and per-session size caps.
+
+
+class ChatSession:
+    def __init__(self, session_id: str, owner: str, max_turns: int):
+        self.id = session_id
+        self.owner = owner
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+        self.context: Optional[List[int]] = None
+        self.context_model: Optional[str] = None
+        self.created = time.time()
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def is_follow_up(self) -> bool:
+        return bool(self.turns)
+
+    def approx_bytes(self) -> int:
+        text = sum(len(q) + len(a) for q, a in self.turns)
+        return text + 4 * len(self.context or ())
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl: float = 1800.0,
+        max_turns: int = 6,
+        max_answer_chars: int = 600,
+        max_context_tokens: int = 4096,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_answer_chars = max_answer_chars
+        self.max_context_tokens = max_context_tokens
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._stats = {"created": 0, "expired": 0, "evicted": 0, "context_dropped": 0}
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            max_sessions=int(os.getenv("CHAT_SESSIONS_MAX", "1000")),
+            ttl=float(os.getenv("CHAT_SESSION_TTL", "1800")),
+            max_turns=int(os.getenv("CHAT_SESSION_TURNS", "6")),
+            max_answer_chars=int(os.getenv("CHAT_SESSION_ANSWER_CHARS", "600")),
+            max_context_tokens=int(os.getenv("CHAT_SESSION_CONTEXT_TOKENS", "4096")),
+        )
+
+    def create(self, owner: str) -> ChatSession:
+        session = ChatSession(secrets.token_urlsafe(16), owner, self.max_turns)
+        session.updated = self._clock()
+        with self._lock:
+            self._sessions[session.id] = session
+            self._stats["created"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evicted"] += 1
+        return session
+
+    def get(self, session_id: str, owner: str) -> Optional[ChatSession]:
+        """The caller's live session, or None (unknown, expired or someone else's)."""
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return None
+            if now - session.updated > self.ttl:
+                del self._sessions[session_id]
+                self._stats["expired"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            session.updated = now
+            return session
+
+    def get_or_create(self, session_id: Optional[str], owner: str) -> ChatSession:
+        return (session_id and self.get(session_id, owner)) or self.create(owner)
+
+    def history_prompt(self, session: ChatSession, prompt: str) -> str:
+        """Compact transcript + the new prompt, for backends without server-side state."""
+        with session.lock:
+            turns = list(session.turns)
+        if not turns:
+            return prompt
+        lines = ["Conversation so far:"]
+        for q, a in turns:
+            lines.append(f"User: {q}")
+            lines.append(f"Assistant: {a}")
+        return "\n".join(lines) + f"\n\nNew question:\n{prompt}"
+
+    def record(
+        self,
+        session: ChatSession,
+        question: str,
+        answer: str,
+        context: Optional[List[int]] = None,
+        context_model: Optional[str] = None,
+    ) -> None:
+        """
+        Append a turn. `context` is the Ollama context after this turn (only when
+        the local model produced the answer); otherwise the stored context no longer
+        covers the conversation and is dropped.
+        """
+        clipped = answer if len(answer) <= self.max_answer_chars else answer[: self.max_answer_chars] + "…"
+        with session.lock:
+            session.turns.append((question, clipped))
+            if context and len(context) <= self.max_context_tokens:
+                session.context, session.context_model = list(context), context_model
+            else:
+                if context:
+                    with self._lock:
+                        self._stats["context_dropped"] += 1
+                session.context, session.context_model = None, None
+            session.updated = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            sessions = list(self._sessions.values())
+        out["active"] = len(sessions)
+        out["approx_bytes"] = sum(s.approx_bytes() for s in sessions)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            for k in self._stats:
+                self._stats[k] = 0
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Context packing for RAG prompts.
+#
+# rag_store.search() returns up to k chunks of ~1000 words; index_content.py
+# cuts them with a 150-word overlap, so neighbouring hits from one source repeat
+# text. Before the passages reach the prompt they are:
+#   1. merged (adjacent chunks of one source are stitched at their overlap) and
+#      deduplicated (identical or contained passages are dropped);
+#   2. optionally reduced to the sentences that best match the question;
+#   3. added best-score first until the token budget is spent; the passage that
+#      does not fit is cut down to its best sentences instead of dropped.
+#
+# Token counts come from the model's tokenizer when one is configured
+# (RAG_TOKENIZER, a Hugging Face tokenizer id matching the local model) and a
+# word/punctuation estimate otherwise. Counts are cached per text.
+
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+SENTENCE_MODE = os.getenv("RAG_PACK_SENTENCES", "off").lower() in {"on", "1", "true"}
+# Longest chunk overlap looked for when stitching neighbours (index_content uses 150 words)
+MAX_OVERLAP_WORDS = 300
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "the a an and or of to in on for is are was be it this that what how when where why who "
+    "do does can i you we my your de het een en of van te in op voor is zijn wat hoe wanneer "
+    "waar waarom wie ik je jij we mijn".split()
+)
+
+
+class Passage:
+    def __init__(self, text: str, source: str = "unknown source", score: float = 0.0, position: int = -1):
+        self.text = text
+        self.source = source
+        self.score = score
+        # Chunk number in the index; neighbours of one source have consecutive positions
+        self.position = position
+
+
+# -------------------------
+# Token counting
+# -------------------------
+
+def _estimate_tokens(text: str) -> int:
+    # BPE tokenizers split long words further; ~1.3 tokens per word/punctuation mark
+    # is close for English and Dutch prose
+    return int(len(_TOKEN_RE.findall(text)) * 1.3) + 1
+
+
+def _load_tokenizer() -> Optional[Callable[[str], int]]:
+    name = os.getenv("RAG_TOKENIZER", "")
+    if not name:
+        return None
+    try:
+        from transformers import AutoTokenizer  # type: ignore
+    except ImportError:
+        print("RAG_TOKENIZER set but transformers is not installed; estimating token counts")
+        return None
+    try:
+        tok = AutoTokenizer.from_pretrained(name)
+    except Exception as e:
+        print(f"Could not load tokenizer {name}: {e}")
+        return None
+    return lambda text: len(tok.encode(text, add_special_tokens=False))
+
+
+_tokenizer_lock = threading.Lock()
+_tokenizer: Optional[Callable[[str], int]] = None
+_tokenizer_loaded = False
+
+
+def set_tokenizer(count: Optional[Callable[[str], int]]) -> None:
+    """Use `count(text) -> tokens` for budgeting (None: back to RAG_TOKENIZER / estimate)."""
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        _tokenizer, _tokenizer_loaded = count, count is not None
+    count_tokens.cache_clear()
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Token count of `text` (cached: retrieved chunks repeat across questions)."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                _tokenizer, _tokenizer_loaded = _load_tokenizer(), True
+    if _tokenizer is not None:
+        try:
+            return _tokenizer(text)
+        except Exception:
+            pass
+    return _estimate_tokens(text)
+
+
+# -------------------------
+# Merge / dedupe
+# -------------------------
+
+def _overlap(left: List[str], right: List[str]) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (in words)."""
+    for n in range(min(len(left), len(right), MAX_OVERLAP_WORDS), 0, -1):
+        if left[-n:] == right[:n]:
+            return n
+    return 0
+
+
+def merge_passages(passages: Sequence[Passage]) -> List[Passage]:
+    """
+    Stitch adjacent chunks of the same source and drop duplicates. The result keeps
+    the best score of its parts and is ordered by score (best first).
+    """
+    by_source: Dict[str, List[Passage]] = {}
+    for p in passages:
+        if p.text.strip():
+            by_source.setdefault(p.source, []).append(p)
+
+    merged: List[Passage] = []
+    for source, group in by_source.items():
+        group.sort(key=lambda p: (p.position, -p.score))
+        current: Optional[Passage] = None
+        for p in group:
+            if current is None:
+                current = Passage(p.text.strip(), source, p.score, p.position)
+                continue
+            text = p.text.strip()
+            if text in current.text:
+                current.score = max(current.score, p.score)
+                continue
+            words, cur_words = text.split(), current.text.split()
+            n = _overlap(cur_words, words) if p.position == current.position + 1 else 0
+            if n:
+                current.text = " ".join(cur_words + words[n:])
+                current.score = max(current.score, p.score)
+                current.position = p.position
+            else:
+                merged.append(current)
+                current = Passage(text, source, p.score, p.position)
+        if current is not None:
+            merged.append(current)
+
+    # Same text indexed under two sources (e.g. a page and its crawled copy):
+    # keep the longer passage, with the better score of the two
+    unique: List[Tuple[str, Passage]] = []
+    for p in sorted(merged, key=lambda p: -len(p.text)):
+        key = " ".join(p.text.split()).casefold()
+        kept = next((q for k, q in unique if key in k), None)
+        if kept is None:
+            unique.append((key, p))
+        else:
+            kept.score = max(kept.score, p.score)
+    return sorted((p for _, p in unique), key=lambda p: -p.score)
+
+
+# -------------------------
+# Sentence selection
+# -------------------------
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD_RE.findall(text.casefold()) if w not in _STOPWORDS and len(w) > 1}
+
+
+def select_sentences(text: str, query: str, budget: int) -> str:
+    """
+    The sentences of `text` that share the most terms with `query`, in their
+    original order, within `budget` tokens. Without query terms the leading
+    sentences are kept.
+    """
+    sentences = [s.strip() for s in _SENTENCE_RE.split(text) if s.strip()]
+    terms = _terms(query)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(terms & _terms(sentences[i])), i),
+    )
+    keep, used = [], 0
+    for i in ranked:
+        if terms and not terms & _terms(sentences[i]) and keep:
+            break
+        cost = count_tokens(sentences[i])
+        if used + cost > budget:
+            continue
+        keep.append(i)
+        used += cost
+    return " ".join(sentences[i] for i in sorted(keep))
+
+
+# -------------------------
+# Packing
+# -------------------------
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "passages_in": 0, "passages_out": 0, "tokens_in": 0, "tokens_out": 0}
+
+
+def _format(p: Passage, text: str) -> str:
+    source = os.path.basename(p.source) if p.source != "unknown source" else p.source
+    return f"[Source: {source}]\n{text}"
+
+
+def pack(
+    passages: Sequence[Passage],
+    query: str = "",
+    budget: Optional[int] = None,
+    sentences: Optional[bool] = None,
+) -> str:
+    """Merged, deduplicated and budgeted context string ("" when nothing fits)."""
+    budget = CONTEXT_TOKENS if budget is None else budget
+    sentences = SENTENCE_MODE if sentences is None else sentences
+    tokens_in = sum(count_tokens(_format(p, p.text)) for p in passages)
+
+    blocks: List[str] = []
+    used = 0
+    for p in merge_passages(passages):
+        text = select_sentences(p.text, query, budget - used) if sentences and query else p.text
+        block = _format(p, text)
+        cost = count_tokens(block)
+        if used + cost > budget:
+            header = count_tokens(_format(p, ""))
+            text = select_sentences(p.text, query, budget - used - header)
+            if not text:
+                continue
+            block = _format(p, text)
+            cost = count_tokens(block)
+        blocks.append(block)
+        used += cost
+
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["passages_in"] += len(passages)
+        _stats["passages_out"] += len(blocks)
+        _stats["tokens_in"] += tokens_in
+        _stats["tokens_out"] += used
+    return "\n\n".join(blocks)
+
+
+def pack_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out: Dict[str, Any] = dict(_stats)
+    out["budget"] = CONTEXT_TOKENS
+    out["token_ratio"] = round(out["tokens_out"] / out["tokens_in"], 3) if out["tokens_in"] else None
+    out["count_cache"] = count_tokens.cache_info()._asdict()
+    return out
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Precomputed answers for frequent questions.
+#
+# scripts/precompute_faq.py answers a list of common booking/pricing/genre
+# questions offline and writes them to a JSON file (FAQ_PATH); /api/ask looks
+# the user's question up here before calling any live backend. Keys are the
+# question casefolded with punctuation and extra whitespace removed, so trivial
+# variations still hit. Answers generated with RAG context record the index
+# version they saw and are skipped once the index is rebuilt, until the job
+# refreshes them. The server picks up a rewritten file by its mtime.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(BASE_DIR, "data", "faq_answers.json")
+FORMAT_VERSION = 1
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def faq_key(question: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", question.casefold()).split())
+
+
+def rag_version() -> str:
+    try:
+        import rag_store
+    except ImportError:
+        return ""
+    return rag_store.index_version()
+
+
+def read_entries(path: str) -> Dict[str, Dict[str, Any]]:
+    """Entries of an FAQ file ({} when it is missing or unreadable)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != FORMAT_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+
+def write_entries(path: str, entries: Dict[str, Dict[str, Any]]) -> None:
+    """Atomically replace the FAQ file (the server may be reading it)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "entries": entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def make_entry(question: str, answer: str, backend: str, index_version: str = "") -> Dict[str, Any]:
+    return {
+        "question": question,
+        "answer": answer,
+        "backend": backend,
+        "index_version": index_version,
+        "created": int(time.time()),
+    }
+
+
+class FaqStore:
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        enabled: bool = True,
+        version: Optional[Callable[[], str]] = None,
+        check_interval: float = 2.0,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self._version = version or rag_version
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[int] = None
+        self._checked = 0.0
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "reloads": 0}
+
+    @classmethod
+    def from_env(cls) -> "FaqStore":
+        return cls(
+            path=os.getenv("FAQ_PATH", DEFAULT_PATH),
+            enabled=os.getenv("FAQ_ANSWERS", "on").lower() not in {"off", "0", "false"},
+        )
+
+    def _refresh(self) -> None:
+        """Reload the file when it changed (stat at most every check_interval seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            if self._mtime is not None and now - self._checked < self.check_interval:
+                return
+            self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        with self._lock:
+            if mtime == self._mtime:
+                return
+        entries = read_entries(self.path) if mtime else {}
+        with self._lock:
+            self._entries, self._mtime = entries, mtime
+            if mtime:
+                self._stats["reloads"] += 1
+
+    def lookup(self, question: str) -> Optional[Tuple[str, str]]:
+        """(answer, backend) for a precomputed question, else None."""
+        if not self.enabled:
+            return None
+        self._refresh()
+        with self._lock:
+            entry = self._entries.get(faq_key(question))
+        if entry is not None and entry.get("index_version"):
+            try:
+                current = self._version()
+            except Exception:
+                current = ""
+            if current != entry["index_version"]:
+                with self._lock:
+                    self._stats["stale"] += 1
+                entry = None
+        with self._lock:
+            self._stats["hits" if entry is not None else "misses"] += 1
+        if entry is None:
+            return None
+        return entry["answer"], entry.get("backend", "faq")
+
+    def stats(self) -> Dict[str, Any]:
+        self._refresh()
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["entries"] = len(self._entries)
+        out["enabled"] = self.enabled
+        return out
+
+    def clear(self) -> None:
+        """Forget the loaded entries and counters; the file is re-read on next lookup."""
+        with self._lock:
+            self._entries, self._mtime = {}, None
+            for k in self._stats:
+                self._stats[k] = 0
@@ -1,5 +1,11 @@
+import asyncio
+import inspect
 import os
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
 
 # Provide a module-level 'genai' attribute so tests can patch it even if the real
 # google.generativeai package is not installed in the environment.
@@ -35,18 +41,204 @@ def _resolve_api_key(explicit: Optional[str], env_var: str) -> str:
     return key
 
 
-def ask(question: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+MODEL_NAME = "gemini-pro"
+
+# Models are reused per (genai module, model, system prompt): building one per
+# call re-ran the model setup on every ask. The genai object is part of the key
+# so a patched module gets fresh models.
+#
+# The API key is not: genai.configure() is process-global and a model resolves
+# its client from that global config when it is called. So every call runs
+# inside _using_key(), which switches the configured key only once no call with
+# the previous key is still in flight (different keys are serialized).
+_models: Dict[Tuple[Any, str, str], Any] = {}
+_models_lock = threading.Lock()
+_key_cond = threading.Condition()
+_configured: Optional[Tuple[Any, str]] = None
+_in_flight = 0
+_switches_waiting = 0
+
+# Per-call timings (ms) so Gemini's share of /api/ask latency is visible
+_timing_lock = threading.Lock()
+_timings: Deque[float] = deque(maxlen=200)
+_ttfts: Deque[float] = deque(maxlen=200)
+_counts = {"calls": 0, "errors": 0, "model_builds": 0}
+
+
+def _model() -> Any:
+    cache_key = (genai, MODEL_NAME, SYSTEM_PROMPT)
+    with _models_lock:
+        model = _models.get(cache_key)
+        if model is None:
+            model = _models[cache_key] = genai.GenerativeModel(MODEL_NAME, system_instruction=SYSTEM_PROMPT)
+            with _timing_lock:
+                _counts["model_builds"] += 1
+        return model
+
+
+def _enter_key(key: str, blocking: bool = True) -> bool:
+    """
+    Count a call in flight with `key` configured (False: it would have to wait).
+    Calls with the configured key join at once unless a switch to another key is
+    queued; a switch waits for the calls in flight to finish.
+    """
+    global _configured, _in_flight, _switches_waiting
+    wanted = (genai, key)
+    with _key_cond:
+        queued = False
+        try:
+            while _in_flight:
+                if _configured == wanted and _switches_waiting == int(queued):
+                    break
+                if not blocking:
+                    return False
+                if _configured != wanted and not queued:
+                    queued = True
+                    _switches_waiting += 1
+                _key_cond.wait()
+        finally:
+            if queued:
+                _switches_waiting -= 1
+        if _configured != wanted:
+            genai.configure(api_key=key)
+            _configured = wanted
+        _in_flight += 1
+        return True
+
+
+def _leave_key() -> None:
+    global _in_flight
+    with _key_cond:
+        _in_flight -= 1
+        _key_cond.notify_all()
+
+
+@contextmanager
+def _using_key(key: str) -> Iterator[Any]:
+    """The shared model, to be called while genai is configured with `key`."""
+    _enter_key(key)
+    try:
+        yield _model()
+    finally:
+        _leave_key()
+
+
+def _observe(start: float, ok: bool, ttft: Optional[float] = None) -> None:
+    with _timing_lock:
+        _counts["calls"] += 1
+        if not ok:
+            _counts["errors"] += 1
+            return
+        _timings.append((time.monotonic() - start) * 1000.0)
+        if ttft is not None:
+            _ttfts.append(ttft * 1000.0)
+
+
+def _percentile(samples: Any, q: float) -> Optional[float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+def timing_stats() -> Dict[str, Any]:
+    with _timing_lock:
+        out: Dict[str, Any] = dict(_counts)
+        timings, ttfts = list(_timings), list(_ttfts)
+    out["p50_ms"] = _percentile(timings, 0.5)
+    out["p95_ms"] = _percentile(timings, 0.95)
+    out["stream_ttft_p50_ms"] = _percentile(ttfts, 0.5)
+    return out
+
+
+def reset() -> None:
+    """Drop cached models and timings (e.g. after rotating GEMINI_API_KEY)."""
+    global _configured
+    with _models_lock:
+        _models.clear()
+    with _key_cond:
+        _configured = None
+    with _timing_lock:
+        _timings.clear()
+        _ttfts.clear()
+        for k in _counts:
+            _counts[k] = 0
+
+
+def _request_options(timeout: Optional[float]) -> Dict[str, Any]:
+    """generate_content() kwargs bounding the HTTP call (none without a timeout)."""
+    return {"request_options": {"timeout": timeout}} if timeout else {}
+
+
+def ask(question: str, api_key: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
     """
     Create a Gemini model call. Tests patch gemini_logic.genai to assert:
       - genai.configure(api_key=...)
       - genai.GenerativeModel('gemini-pro', system_instruction=SYSTEM_PROMPT)
       - model.generate_content(question)
     Returns a dict with {'text': ...} based on the model response.
+    The model is cached (see _model) and configure() only runs when the key
+    changes, so repeat calls skip setup. With a timeout the request is bounded
+    via request_options; without one the call is exactly generate_content(question).
     """
     key = _resolve_api_key(api_key, "GEMINI_API_KEY")
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel("gemini-pro", system_instruction=SYSTEM_PROMPT)
-    resp = model.generate_content(question)
+    start = time.monotonic()
+    try:
+        with _using_key(key) as model:
+            resp = model.generate_content(question, **_request_options(timeout))
+    except Exception:
+        _observe(start, ok=False)
+        raise
+    _observe(start, ok=True)
     # Tests expect a .text attribute on the response object
     text = getattr(resp, "text", "")
     return {"text": text}
+
+
+async def ask_async(question: str, api_key: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    asyncio version of ask(): uses the SDK's generate_content_async when it is
+    a coroutine function, otherwise runs generate_content in a worker thread.
+    The timeout is passed to the SDK too, so a thread is not left waiting.
+    """
+    key = _resolve_api_key(api_key, "GEMINI_API_KEY")
+    if not _enter_key(key, blocking=False):
+        # Waiting for calls with another key to finish must not block the loop
+        await asyncio.to_thread(_enter_key, key)
+    options = _request_options(timeout)
+    start = time.monotonic()
+    try:
+        model = _model()
+        generate_async = getattr(model, "generate_content_async", None)
+        if inspect.iscoroutinefunction(generate_async):
+            resp = await generate_async(question, **options)
+        else:
+            resp = await asyncio.to_thread(model.generate_content, question, **options)
+    except Exception:
+        _observe(start, ok=False)
+        raise
+    finally:
+        _leave_key()
+    _observe(start, ok=True)
+    return {"text": getattr(resp, "text", "")}
+
+
+def ask_stream(question: str, api_key: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[str]:
+    """Yield answer fragments as Gemini produces them (generate_content(stream=True))."""
+    key = _resolve_api_key(api_key, "GEMINI_API_KEY")
+    options = _request_options(timeout)
+    start = time.monotonic()
+    ttft: Optional[float] = None
+    try:
+        # The key stays configured until the stream is exhausted or closed
+        with _using_key(key) as model:
+            for chunk in model.generate_content(question, stream=True, **options):
+                text = getattr(chunk, "text", "")
+                if text:
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    yield text
+    except Exception:
+        _observe(start, ok=False)
+        raise
+    _observe(start, ok=True, ttft=ttft)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import backoff_delay
+
+# Shared outbound HTTP client for the upstream integrations (YouTube, OpenAI, Ollama, ...).
+# One keep-alive Session per host, so repeated calls reuse TCP+TLS connections
+# instead of paying a fresh handshake every request.
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+MIN_TIMEOUT = 0.05  # seconds; smallest connect/read timeout ever passed to requests
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class HostConfig:
+    def __init__(
+        self,
+        pool_maxsize: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+        retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_cap: float = 2.0,
+    ):
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    @classmethod
+    def from_env(cls) -> "HostConfig":
+        return cls(
+            pool_maxsize=int(_env_float("HTTP_POOL_SIZE", 10)),
+            connect_timeout=_env_float("HTTP_CONNECT_TIMEOUT", 3.05),
+            read_timeout=_env_float("HTTP_READ_TIMEOUT", 30.0),
+            retries=int(_env_float("HTTP_RETRIES", 2)),
+        )
+
+
+class HostStats:
+    """Rolling latency/error statistics for one upstream host."""
+
+    def __init__(self, window: int = 256):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def observe(self, elapsed_ms: float, ok: bool) -> None:
+        self.requests += 1
+        self.total_ms += elapsed_ms
+        self.latencies.append(elapsed_ms)
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def pct(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.requests, 2) if self.requests else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+        }
+
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_configs: Dict[str, HostConfig] = {}
+_stats: Dict[str, HostStats] = {}
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def configure(host: str, **overrides: Any) -> HostConfig:
+    """
+    Override pool size / timeouts / retries for one host, e.g.
+    configure("http://localhost:11434", read_timeout=120, pool_maxsize=4).
+    Must be called before the host's first request to change its pool size.
+    """
+    key = _host_key(host) if "://" in host else host
+    with _lock:
+        cfg = _configs.get(key) or HostConfig.from_env()
+        for name, value in overrides.items():
+            if not hasattr(cfg, name):
+                raise TypeError(f"unknown http_client option: {name}")
+            setattr(cfg, name, value)
+        _configs[key] = cfg
+        return cfg
+
+
+def _session_for(key: str) -> Tuple[requests.Session, HostConfig, HostStats]:
+    with _lock:
+        cfg = _configs.get(key)
+        if cfg is None:
+            cfg = _configs[key] = HostConfig.from_env()
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cfg.pool_maxsize, max_retries=0)
+            session.mount(key + "/", adapter)
+            _sessions[key] = session
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = HostStats()
+        return session, cfg, stats
+
+
+def request(
+    method: str,
+    url: str,
+    timeout: Optional[Timeout] = None,
+    retries: Optional[int] = None,
+    idempotent: Optional[bool] = None,
+    **kwargs: Any,
+) -> requests.Response:
+    """
+    Issue a request on the host's pooled session.
+
+    Idempotent calls (GET/HEAD/... or idempotent=True) are retried on connection
+    errors, timeouts and 429/502/503/504 with jittered exponential backoff.
+    A bare float timeout is treated as the read timeout; the connect timeout
+    always comes from the host config so dead hosts fail fast. When the caller
+    passes a timeout, it also bounds the whole call: no retry is started that
+    could not finish in time. Pass retries=0 for quota-metered APIs, where
+    every attempt is billed.
+    """
+    method = method.upper()
+    key = _host_key(url)
+    session, cfg, stats = _session_for(key)
+
+    deadline: Optional[float] = None
+    if timeout is None:
+        timeout = (cfg.connect_timeout, cfg.read_timeout)
+    else:
+        if not isinstance(timeout, tuple):
+            timeout = (min(cfg.connect_timeout, float(timeout)), float(timeout))
+        # A budget computed from an expired deadline can be <= 0, which urllib3 rejects
+        timeout = (max(MIN_TIMEOUT, timeout[0]), max(MIN_TIMEOUT, timeout[1]))
+        deadline = time.monotonic() + timeout[1]
+
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    attempts = 1 + (cfg.retries if retries is None else retries) if idempotent else 1
+
+    for attempt in range(1, attempts + 1):
+        start = time.perf_counter()
+        resp: Optional[requests.Response] = None
+        error: Optional[Exception] = None
+        try:
+            resp = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            with _lock:
+                stats.observe((time.perf_counter() - start) * 1000.0, ok=False)
+        else:
+            ok = resp.status_code < 500 and resp.status_code != 429
+            with _lock:
+                stats.observe((time.perf_counter() - start) * 1000.0, ok=ok)
+            if resp.status_code not in RETRY_STATUSES:
+                return resp
+
+        delay = backoff_delay(attempt, base=cfg.backoff_base, cap=cfg.backoff_cap)
+        remaining = None if deadline is None else deadline - time.monotonic() - delay
+        if attempt >= attempts or (remaining is not None and remaining <= 0):
+            if error is not None:
+                raise error
+            return resp
+        if resp is not None:
+            resp.close()
+        with _lock:
+            stats.retries += 1
+        time.sleep(delay)
+        if remaining is not None:
+            # The retry only gets what is left of the caller's budget
+            timeout = (max(MIN_TIMEOUT, min(timeout[0], remaining)), max(MIN_TIMEOUT, min(timeout[1], remaining)))
+
+    raise RuntimeError("unreachable")  # pragma: no cover
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Per-host latency and error metrics, keyed by scheme://host[:port]."""
+    with _lock:
+        return {host: s.snapshot() for host, s in _stats.items()}
+
+
+def close_all() -> None:
+    """Close every pooled session (used on shutdown and by tests)."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _stats.clear()
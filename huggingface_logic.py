@@ -1,7 +1,13 @@
+import gc
+import inspect
 import os
-from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 # Expose a `pipeline` symbol that tests can monkeypatch.
+_stub_pipeline: Optional[Callable[..., Any]] = None
 try:
     from transformers import pipeline  # type: ignore
 except Exception:  # pragma: no cover - tests patch huggingface_logic.pipeline
@@ -11,8 +17,212 @@ except Exception:  # pragma: no cover - tests patch huggingface_logic.pipeline
             return [{"generated_text": "fallback"}]
         return _run
 
+    _stub_pipeline = pipeline
 
-def ask(question: str, model: Optional[str] = None) -> Dict[str, Any]:
+try:
+    from transformers import TextIteratorStreamer  # type: ignore
+except Exception:  # pragma: no cover - streaming degrades to a single chunk
+    TextIteratorStreamer = None  # type: ignore
+
+
+# Process-wide pipeline registry: building a pipeline loads the model weights, so
+# each (task, model, device, dtype) is built once and reused. Construction is
+# single-flight per key; at most HF_MAX_PIPELINES stay loaded (least recently
+# used is dropped). The key also includes the `pipeline` factory itself, so a
+# monkeypatched factory never gets a pipeline built by another one.
+HF_MAX_PIPELINES = int(os.getenv("HF_MAX_PIPELINES", "2"))
+HF_DEVICE = os.getenv("HF_DEVICE", "")
+HF_DTYPE = os.getenv("HF_DTYPE", "")
+
+_PipelineKey = Tuple[Any, str, Optional[str], str, str]
+_pipelines: "OrderedDict[_PipelineKey, Dict[str, Any]]" = OrderedDict()
+_pipelines_lock = threading.Lock()
+_loading: Dict[_PipelineKey, threading.Lock] = {}
+
+
+def _model_bytes(run: Any) -> Optional[int]:
+    """Parameter memory of a transformers pipeline's model (None when unknown)."""
+    try:
+        return sum(p.numel() * p.element_size() for p in run.model.parameters())
+    except Exception:
+        return None
+
+
+def _build(task: str, model: Optional[str]) -> Any:
+    kwargs: Dict[str, Any] = {"model": model}
+    if HF_DEVICE:
+        kwargs["device"] = int(HF_DEVICE) if HF_DEVICE.lstrip("-").isdigit() else HF_DEVICE
+    if HF_DTYPE:
+        kwargs["torch_dtype"] = HF_DTYPE
+    return pipeline(task, **kwargs)
+
+
+def get_pipeline(task: str, model: Optional[str] = None) -> Any:
+    """The cached pipeline for (task, model) on the configured device/dtype, built on first use."""
+    key: _PipelineKey = (pipeline, task, model, HF_DEVICE, HF_DTYPE)
+    with _pipelines_lock:
+        entry = _pipelines.get(key)
+        if entry is not None:
+            _pipelines.move_to_end(key)
+            entry["hits"] += 1
+            return entry["pipeline"]
+        load_lock = _loading.setdefault(key, threading.Lock())
+
+    with load_lock:
+        with _pipelines_lock:
+            entry = _pipelines.get(key)
+            if entry is not None:  # built by the thread we waited for
+                entry["hits"] += 1
+                return entry["pipeline"]
+        start = time.monotonic()
+        try:
+            run = _build(task, model)
+        except Exception:
+            with _pipelines_lock:
+                _loading.pop(key, None)
+            raise
+        entry = {
+            "pipeline": run,
+            "task": task,
+            "model": model,
+            "load_ms": round((time.monotonic() - start) * 1000.0, 1),
+            "memory_bytes": _model_bytes(run),
+            "loaded_at": time.time(),
+            "hits": 0,
+        }
+        print(f"Loaded {task} pipeline for {model or 'default model'} in {entry['load_ms']} ms")
+        with _pipelines_lock:
+            _pipelines[key] = entry
+            _loading.pop(key, None)
+            evicted = []
+            while len(_pipelines) > max(1, HF_MAX_PIPELINES):
+                evicted.append(_pipelines.popitem(last=False)[1])
+        if evicted:
+            for old in evicted:
+                print(f"Unloaded {old['task']} pipeline for {old['model'] or 'default model'}")
+            del evicted
+            gc.collect()
+        return run
+
+
+def is_stub() -> bool:
+    """True while `pipeline` is the placeholder above (transformers missing): its output is not an answer."""
+    return _stub_pipeline is not None and pipeline is _stub_pipeline
+
+
+def preload(models: Optional[List[str]] = None) -> None:
+    """Build text-generation pipelines ahead of the first request (default: HF_PRELOAD, comma-separated)."""
+    if models is None:
+        models = [m.strip() for m in os.getenv("HF_PRELOAD", "").split(",") if m.strip()]
+    for model in models:
+        try:
+            get_pipeline("text-generation", model)
+        except Exception as e:
+            print(f"Preloading {model} failed: {e}")
+
+
+def pipeline_stats() -> List[Dict[str, Any]]:
+    """Loaded pipelines, least recently used first."""
+    with _pipelines_lock:
+        return [{k: v for k, v in entry.items() if k != "pipeline"} for entry in _pipelines.values()]
+
+
+def clear_pipelines() -> None:
+    with _pipelines_lock:
+        _pipelines.clear()
+    gc.collect()
+
+
+# Micro-batching (see batching.MicroBatcher): concurrent asks for the same model
+# are generated in one pipeline call. Off unless HF_BATCH_SIZE > 1.
+HF_BATCH_SIZE = int(os.getenv("HF_BATCH_SIZE", "1"))
+HF_BATCH_WAIT_MS = float(os.getenv("HF_BATCH_WAIT_MS", "15"))
+HF_BATCH_QUEUE = int(os.getenv("HF_BATCH_QUEUE", "64"))
+_batchers: Dict[Optional[str], Any] = {}
+_batchers_lock = threading.Lock()
+
+
+def _output_text(out: Any) -> str:
+    if isinstance(out, list) and out:
+        first = out[0]
+        if isinstance(first, dict):
+            return str(first.get("generated_text", "")) or str(first.get("text", ""))
+        return str(first)
+    if isinstance(out, dict):
+        return str(out.get("generated_text", "")) or str(out.get("text", ""))
+    return str(out)
+
+
+def _accepts_kwargs(run: Any) -> bool:
+    """True when the pipeline takes generation kwargs (transformers pipelines do)."""
+    try:
+        params = inspect.signature(run).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(p.kind is inspect.Parameter.VAR_KEYWORD or p.name == "max_time" for p in params)
+
+
+def _prepare_for_batching(run: Any) -> None:
+    """
+    Decoder-only tokenizers often have no pad token (GPT-2), which the pipeline
+    refuses to batch with, and pad on the right, which corrupts continuations.
+    Idempotent, so it simply runs before every batched call.
+    """
+    tokenizer = getattr(run, "tokenizer", None)
+    if tokenizer is None:
+        return
+    if getattr(tokenizer, "pad_token", None) is None and getattr(tokenizer, "eos_token", None) is not None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+
+def _generate_batch(model: Optional[str], prompts: List[str], deadline: Optional[float] = None) -> List[str]:
+    """One pipeline call for all prompts; `deadline` (time.monotonic()) becomes max_time."""
+    run = get_pipeline("text-generation", model)
+    _prepare_for_batching(run)
+    kwargs: Dict[str, Any] = {"batch_size": len(prompts)}
+    if deadline is not None and _accepts_kwargs(run):
+        kwargs["max_time"] = max(0.05, deadline - time.monotonic())
+    outputs = run(prompts, **kwargs)
+    # Batched pipelines return one list of candidates per prompt
+    return [_output_text(out) for out in outputs]
+
+
+def _run_batch(model: Optional[str], items: List[Tuple[str, Optional[float]]]) -> List[str]:
+    """Batcher callback for (prompt, deadline) items: the batch stops by the earliest deadline."""
+    deadline = min((d for _, d in items if d is not None), default=None)
+    return _generate_batch(model, [prompt for prompt, _ in items], deadline)
+
+
+def _batcher(model: Optional[str]) -> Any:
+    from batching import MicroBatcher
+
+    with _batchers_lock:
+        batcher = _batchers.get(model)
+        if batcher is None:
+            batcher = _batchers[model] = MicroBatcher(
+                f"hf-{model or 'default'}",
+                lambda items: _run_batch(model, items),
+                max_batch=HF_BATCH_SIZE,
+                max_wait_ms=HF_BATCH_WAIT_MS,
+                max_queue=HF_BATCH_QUEUE,
+            )
+        return batcher
+
+
+def ask_batch(questions: List[str], model: Optional[str] = None) -> List[str]:
+    """Generate answers for several questions in one pipeline call (offline jobs)."""
+    if not questions:
+        return []
+    return _generate_batch(model or os.getenv("HF_MODEL"), list(questions))
+
+
+def batch_stats() -> Dict[str, Any]:
+    with _batchers_lock:
+        return {str(model): b.stats() for model, b in _batchers.items()}
+
+
+def ask(question: str, model: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
     """
     Simple HuggingFace text-generation wrapper.
 
@@ -21,24 +231,53 @@ def ask(question: str, model: Optional[str] = None) -> Dict[str, Any]:
       - returns a callable producing a list of dicts with `generated_text`
     This function should:
       - choose model from argument or HF_MODEL env var (if provided)
-      - call pipeline("text-generation", model=selected)
+      - call pipeline("text-generation", model=selected) (once per model; see get_pipeline)
       - invoke the returned callable with the question
       - return {'text': <generated_text>} from the first item
     """
     selected_model = model or os.getenv("HF_MODEL")
-    run = pipeline("text-generation", model=selected_model)
+    if HF_BATCH_SIZE > 1:
+        # Raises batching.QueueFull under overload so the caller can fall back
+        deadline = time.monotonic() + timeout if timeout else None
+        return {"text": _batcher(selected_model).submit((question, deadline), timeout=timeout)}
+    run = get_pipeline("text-generation", selected_model)
 
-    out = run(question)
-    text = ""
-    if isinstance(out, list) and out:
-        first = out[0]
-        if isinstance(first, dict):
-            text = str(first.get("generated_text", "")) or str(first.get("text", ""))
-        else:
-            text = str(first)
-    elif isinstance(out, dict):
-        text = str(out.get("generated_text", "")) or str(out.get("text", ""))  # type: ignore[assignment]
+    if timeout and _accepts_kwargs(run):
+        # generate() stops after max_time seconds and returns what it has so far
+        out = run(question, max_time=timeout)
     else:
-        text = str(out)
+        out = run(question)
+    return {"text": _output_text(out)}
+
+
+def ask_stream(question: str, model: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Yield generated text as it is produced, via transformers' TextIteratorStreamer.
+    Pipelines without a tokenizer (or without transformers installed) yield the
+    whole completion as a single chunk.
+    """
+    selected_model = model or os.getenv("HF_MODEL")
+    run = get_pipeline("text-generation", selected_model)
+    tokenizer = getattr(run, "tokenizer", None)
+    if TextIteratorStreamer is None or tokenizer is None:
+        text = _output_text(run(question))
+        if text:
+            yield text
+        return
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    errors: List[BaseException] = []
+
+    def _generate() -> None:
+        try:
+            run(question, streamer=streamer, return_full_text=False)
+        except BaseException as e:  # surfaced to the consumer below
+            errors.append(e)
+            streamer.end()
 
-    return {"text": text}
+    threading.Thread(target=_generate, name="hf-generate", daemon=True).start()
+    for chunk in streamer:
+        if chunk:
+            yield chunk
+    if errors:
+        raise errors[0]
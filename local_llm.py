@@ -1,25 +1,94 @@
+import asyncio
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-def call_local_llm(system: str, user: str) -> str:
+import http_client
+
+# Micro-batching (batching.MicroBatcher) for the self-hosted path. This only
+# shapes concurrency: Ollama's /api/generate takes one prompt per request, so a
+# "batch" is sent as up to LLM_BATCH_SIZE concurrent requests on the pooled
+# session, and any batching happens inside the server (OLLAMA_NUM_PARALLEL).
+# Grouping prompts that way caps the in-flight requests and makes them arrive
+# together; it does not make a single request cheaper. 1 (the default) calls
+# call_local_llm directly.
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", "10"))
+LLM_BATCH_QUEUE = int(os.getenv("LLM_BATCH_QUEUE", "64"))
+_batcher = None
+_batcher_lock = threading.Lock()
+# Threads that send a batch's requests, shared by every batch (the batcher
+# dispatches one batch at a time, so LLM_BATCH_SIZE workers are enough)
+_batch_pool: Optional[ThreadPoolExecutor] = None
+
+# Model residency: every request asks Ollama to keep the model loaded for
+# LLM_KEEP_ALIVE (duration string or seconds; "-1" = forever). While requests
+# keep coming, a background ping renews that before it lapses, and
+# model_status() reads /api/ps so the router can skip a cold model.
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_KEEPALIVE_INTERVAL = float(os.getenv("LLM_KEEPALIVE_INTERVAL", "240"))
+# Stop pinging after this long without a real request (traffic no longer expected)
+LLM_KEEPALIVE_IDLE = float(os.getenv("LLM_KEEPALIVE_IDLE", "3600"))
+LLM_STATUS_TTL = float(os.getenv("LLM_STATUS_TTL", "30"))
+
+_status_lock = threading.Lock()
+_status: Dict[str, Any] = {}
+_status_checked = 0.0
+_last_used = 0.0
+_keepalive_stop = threading.Event()
+_keepalive_thread: Optional[threading.Thread] = None
+
+
+def _generate_url() -> str:
+    return os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+
+def _model() -> str:
+    return os.getenv("LLM_MODEL", "llama3:8b-instruct")
+
+
+def _keep_alive() -> Any:
+    # Ollama accepts "5m"-style durations or a number of seconds
+    value = LLM_KEEP_ALIVE.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _payload(system: str, user: str, stream: bool) -> Dict[str, Any]:
+    return {
+        "model": _model(),
+        "prompt": f"System: {system}\n\nUser: {user}\nAssistant:",
+        "stream": stream,
+        "keep_alive": _keep_alive(),
+        "options": {"temperature": 0.2}
+    }
+
+
+def _touch() -> None:
+    global _last_used
+    _last_used = time.monotonic()
+
+
+def call_local_llm(system: str, user: str, timeout: float = 120) -> str:
     """
     Calls the local LLM runtime and returns the AI generated response.
     Uses Ollama or llama.cpp via HTTP. Expects OLLAMA_URL and LLM_MODEL environment variables.
     """
-    OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
-    MODEL = os.getenv("LLM_MODEL", "llama3:8b-instruct")
+    OLLAMA_URL = _generate_url()
+    MODEL = _model()
     
-    payload = {
-        "model": MODEL,
-        "prompt": f"System: {system}\n\nUser: {user}\nAssistant:",
-        "stream": False,
-        "options": {"temperature": 0.2}
-    }
+    payload = _payload(system, user, stream=False)
+    _touch()
     
     try:
         print(f"Calling local LLM at {OLLAMA_URL} with model {MODEL}")
-        r = requests.post(OLLAMA_URL, json=payload, timeout=120)
+        r = http_client.post(OLLAMA_URL, json=payload, timeout=timeout)
         r.raise_for_status()
         data = r.json()
         response = data.get("response", "").strip()
@@ -41,3 +110,245 @@ def call_local_llm(system: str, user: str) -> str:
     except Exception as e:
         print(f"Error calling local LLM: {e}")
         raise Exception(f"Failed to get response from local LLM: {str(e)}")
+
+
+def call_local_llm_turn(
+    system: str, user: str, context: Optional[List[int]] = None, timeout: float = 120
+) -> Tuple[str, Optional[List[int]]]:
+    """
+    One chat turn that can continue a previous one: with `context` (the array
+    Ollama returned last time) only the new user turn is sent and the model
+    resumes from its cached state instead of re-reading the conversation.
+    Returns (response text, new context).
+    """
+    payload = _payload(system, user, stream=False)
+    if context:
+        payload["prompt"] = f"\n\nUser: {user}\nAssistant:"
+        payload["context"] = context
+    _touch()
+    try:
+        r = http_client.post(_generate_url(), json=payload, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Failed to get response from local LLM: {e}")
+    response = data.get("response", "").strip()
+    if not response:
+        raise Exception("Failed to get response from local LLM: Empty response from local LLM")
+    return response, data.get("context")
+
+
+def _run_batch(items):
+    """Send a batch of (system, user, timeout) prompts concurrently; one result or exception each."""
+    def one(item):
+        try:
+            return call_local_llm(*item)
+        except Exception as e:
+            return e
+
+    global _batch_pool
+    if len(items) == 1:
+        return [one(items[0])]
+    with _batcher_lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=max(2, LLM_BATCH_SIZE), thread_name_prefix="llm-batch")
+    return list(_batch_pool.map(one, items))
+
+
+def generate(system: str, user: str, timeout: float = 120) -> str:
+    """
+    call_local_llm, going through the micro-batcher when LLM_BATCH_SIZE > 1.
+    Raises batching.QueueFull when too many prompts are already waiting.
+    """
+    global _batcher
+    if LLM_BATCH_SIZE <= 1:
+        return call_local_llm(system, user, timeout=timeout)
+    from batching import MicroBatcher
+
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                "local-llm", _run_batch,
+                max_batch=LLM_BATCH_SIZE, max_wait_ms=LLM_BATCH_WAIT_MS, max_queue=LLM_BATCH_QUEUE,
+            )
+    return _batcher.submit((system, user, timeout), timeout=timeout)
+
+
+def batch_stats():
+    return _batcher.stats() if _batcher is not None else None
+
+
+def stream_local_llm(system: str, user: str, timeout: float = 120) -> Iterator[str]:
+    """
+    Streaming variant of call_local_llm: yields response fragments from the
+    Ollama NDJSON stream ("stream": true) as they are generated.
+    """
+    OLLAMA_URL = _generate_url()
+    payload = _payload(system, user, stream=True)
+    _touch()
+
+    r = http_client.post(OLLAMA_URL, json=payload, timeout=timeout, stream=True)
+    try:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise Exception(f"Local LLM error: {data['error']}")
+            fragment = data.get("response", "")
+            if fragment:
+                yield fragment
+            if data.get("done"):
+                break
+    finally:
+        r.close()
+
+
+async def call_local_llm_async(system: str, user: str, timeout: float = 120) -> str:
+    """asyncio version of call_local_llm on the shared aiohttp pool."""
+    import aiohttp
+    import aio_client
+
+    OLLAMA_URL = _generate_url()
+    payload = _payload(system, user, stream=False)
+    _touch()
+
+    try:
+        async with aio_client.session().post(OLLAMA_URL, json=payload, timeout=aio_client.timeout(timeout)) as r:
+            r.raise_for_status()
+            data = await r.json()
+    except aiohttp.ClientConnectionError:
+        raise Exception("Local LLM server is not available. Please ensure Ollama is running on the configured port.")
+    except asyncio.TimeoutError:
+        raise Exception("Local LLM request timed out. The model might be processing a complex query.")
+    except aiohttp.ClientResponseError as e:
+        raise Exception(f"Local LLM server returned an error: {e}")
+
+    response = data.get("response", "").strip()
+    if not response:
+        raise Exception("Failed to get response from local LLM: Empty response from local LLM")
+    return response
+
+
+# -------------------------
+# Residency: warm-up, status, keep-alive
+# -------------------------
+
+def _api_url(path: str) -> str:
+    url = _generate_url()
+    base = url.split("/api/", 1)[0] if "/api/" in url else url.rstrip("/")
+    return f"{base}{path}"
+
+
+def _names_match(entry: Dict[str, Any], model: str) -> bool:
+    names = {entry.get("name"), entry.get("model")}
+    return model in names or (":" not in model and f"{model}:latest" in names)
+
+
+def model_status(timeout: float = 1.0) -> Dict[str, Any]:
+    """
+    Ask Ollama (/api/ps) whether LLM_MODEL is loaded.
+    Returns {"reachable", "resident", "expires_at", "size_vram", "checked_at"}.
+    """
+    global _status, _status_checked
+    model = _model()
+    status: Dict[str, Any] = {"model": model, "reachable": False, "resident": False, "expires_at": None}
+    try:
+        r = http_client.get(_api_url("/api/ps"), timeout=timeout, retries=0)
+        r.raise_for_status()
+        status["reachable"] = True
+        for entry in r.json().get("models") or []:
+            if _names_match(entry, model):
+                status.update(resident=True, expires_at=entry.get("expires_at"), size_vram=entry.get("size_vram"))
+                break
+    except Exception as e:
+        status["error"] = str(e)
+    status["checked_at"] = time.time()
+    with _status_lock:
+        _status, _status_checked = status, time.monotonic()
+    return status
+
+
+_probing = threading.Lock()
+_warming = threading.Lock()
+
+
+def _in_background(lock: threading.Lock, fn: Any, name: str) -> bool:
+    """Run fn in a daemon thread unless one holding `lock` is already running."""
+    if not lock.acquire(blocking=False):
+        return False
+
+    def run() -> None:
+        try:
+            fn()
+        finally:
+            lock.release()
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return True
+
+
+def is_warm(max_age: Optional[float] = None) -> bool:
+    """
+    Residency for routing, from the last probe; never blocks the request.
+    A stale (or missing) status triggers a background re-probe; until the
+    first probe answers the model counts as cold.
+    """
+    max_age = LLM_STATUS_TTL if max_age is None else max_age
+    with _status_lock:
+        fresh = bool(_status) and time.monotonic() - _status_checked < max_age
+        status = _status
+    if not fresh:
+        _in_background(_probing, lambda: model_status(timeout=1.0), "llm-status")
+    return bool(status.get("resident"))
+
+
+def warm_up_async() -> bool:
+    """Start a background warm-up unless one is already running."""
+    return _in_background(_warming, warm_up, "llm-warmup")
+
+
+def warm_up(timeout: float = 120) -> bool:
+    """Load the model (a generate request without a prompt) and pin it for LLM_KEEP_ALIVE."""
+    try:
+        r = http_client.post(
+            _generate_url(), json={"model": _model(), "keep_alive": _keep_alive()}, timeout=timeout, retries=0
+        )
+        r.raise_for_status()
+    except Exception as e:
+        print(f"Local LLM warm-up failed: {e}")
+        model_status(timeout=1.0)
+        return False
+    model_status(timeout=1.0)
+    return True
+
+
+def _keepalive_loop() -> None:
+    while not _keepalive_stop.wait(LLM_KEEPALIVE_INTERVAL):
+        if time.monotonic() - _last_used <= LLM_KEEPALIVE_IDLE:
+            warm_up(timeout=60)
+        else:
+            model_status(timeout=1.0)
+
+
+def start_keepalive(warm: bool = True) -> bool:
+    """Warm the model now and keep renewing its residency while traffic continues."""
+    global _keepalive_thread
+    if _keepalive_thread and _keepalive_thread.is_alive():
+        return False
+    _touch()  # treat startup as traffic so the first interval is covered
+    if warm:
+        warm_up_async()
+    _keepalive_stop.clear()
+    _keepalive_thread = threading.Thread(target=_keepalive_loop, name="llm-keepalive", daemon=True)
+    _keepalive_thread.start()
+    return True
+
+
+def stop_keepalive() -> None:
+    global _keepalive_thread
+    _keepalive_stop.set()
+    if _keepalive_thread:
+        _keepalive_thread.join(timeout=5)
+        _keepalive_thread = None
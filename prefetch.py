@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+# Speculative retrieval while the user is typing.
+#
+# The chat widget posts partial text to /api/ask/prefetch. Per user only the
+# latest text is kept. It is retrieved (embed + rag_store search) once the user
+# has paused for `debounce` seconds, and only when that user has no retrieval
+# in flight, so one user can never cost more than one retrieval at a time. A
+# small shared pool caps the total. Results are kept per user (a few recent
+# texts, short TTL). When the real /api/ask arrives, a result whose text
+# matches the final question closely enough is used instead of retrieving again.
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD_RE.findall(text.casefold()))
+
+
+def similarity(a: str, b: str) -> float:
+    """Word-set Jaccard similarity (cheap enough to run on every ask)."""
+    wa, wb = _words(a), _words(b)
+    if not wa or not wb:
+        return 0.0
+    return len(wa & wb) / len(wa | wb)
+
+
+class _UserState:
+    def __init__(self) -> None:
+        self.pending: Optional[Tuple[str, float]] = None  # (text, due time)
+        self.running = False
+        # normalized text -> (text, retrieved context, stored at)
+        self.results: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+
+
+class RetrievalPrefetcher:
+    def __init__(
+        self,
+        retrieve: Callable[[str], str],
+        debounce: float = 0.3,
+        ttl: float = 120.0,
+        min_chars: int = 8,
+        match_threshold: float = 0.8,
+        per_user: int = 4,
+        max_users: int = 1000,
+        workers: int = 2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._retrieve = retrieve
+        self.debounce = debounce
+        self.ttl = ttl
+        self.min_chars = min_chars
+        self.match_threshold = match_threshold
+        self.per_user = max(1, per_user)
+        self.max_users = max_users
+        self.workers = max(1, workers)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._users: "OrderedDict[str, _UserState]" = OrderedDict()
+        self._running = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stats = {"submitted": 0, "superseded": 0, "retrieved": 0, "errors": 0, "hits": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls, retrieve: Callable[[str], str]) -> "RetrievalPrefetcher":
+        return cls(
+            retrieve,
+            debounce=float(os.getenv("PREFETCH_DEBOUNCE_MS", "300")) / 1000.0,
+            ttl=float(os.getenv("PREFETCH_TTL", "120")),
+            min_chars=int(os.getenv("PREFETCH_MIN_CHARS", "8")),
+            match_threshold=float(os.getenv("PREFETCH_MATCH", "0.8")),
+            per_user=int(os.getenv("PREFETCH_PER_USER", "4")),
+            max_users=int(os.getenv("PREFETCH_MAX_USERS", "1000")),
+            workers=int(os.getenv("PREFETCH_WORKERS", "2")),
+        )
+
+    def _start(self) -> None:
+        # Caller holds self._cond
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._pool = self._pool or ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="prefetch-dispatch", daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, user: str, text: str) -> bool:
+        """Schedule retrieval for the user's latest partial question; False when ignored."""
+        text = " ".join(text.split())
+        if len(text) < self.min_chars:
+            return False
+        key = text.casefold()
+        now = self._clock()
+        with self._cond:
+            state = self._users.get(user)
+            if state is None:
+                state = self._users[user] = _UserState()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user)
+            cached = state.results.get(key)
+            if cached is not None and now - cached[2] <= self.ttl:
+                return True
+            if state.pending is not None:
+                self._stats["superseded"] += 1
+            state.pending = (text, now + self.debounce)
+            self._stats["submitted"] += 1
+            self._start()
+            self._cond.notify()
+        return True
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                now = self._clock()
+                ready, next_due = [], None
+                for user, state in self._users.items():
+                    if state.pending is None or state.running:
+                        continue
+                    text, due = state.pending
+                    if due <= now and self._running + len(ready) < self.workers:
+                        ready.append((user, state, text))
+                    elif due > now:
+                        next_due = due if next_due is None else min(next_due, due)
+                for user, state, text in ready:
+                    state.pending, state.running = None, True
+                    self._running += 1
+                if not ready:
+                    self._cond.wait(None if next_due is None else max(0.001, next_due - now))
+            for user, state, text in ready:
+                self._pool.submit(self._run, user, state, text)
+
+    def _run(self, user: str, state: _UserState, text: str) -> None:
+        try:
+            context = self._retrieve(text)
+        except Exception as e:
+            print(f"Prefetch retrieval failed: {e}")
+            context = None
+        with self._cond:
+            state.running = False
+            self._running -= 1
+            if context is None:
+                self._stats["errors"] += 1
+            else:
+                self._stats["retrieved"] += 1
+                state.results[text.casefold()] = (text, context, self._clock())
+                state.results.move_to_end(text.casefold())
+                while len(state.results) > self.per_user:
+                    state.results.popitem(last=False)
+            self._cond.notify()
+
+    def lookup(self, user: str, question: str) -> Optional[str]:
+        """Prefetched context for a question close enough to something the user typed."""
+        question = " ".join(question.split())
+        now = self._clock()
+        with self._cond:
+            state = self._users.get(user)
+            results = list(state.results.values()) if state is not None else []
+        best, best_score = None, 0.0
+        for text, context, stored in results:
+            if now - stored > self.ttl:
+                continue
+            score = 1.0 if text.casefold() == question.casefold() else similarity(text, question)
+            if score >= self.match_threshold and score > best_score:
+                best, best_score = context, score
+        with self._cond:
+            self._stats["hits" if best is not None else "misses"] += 1
+        return best
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out["users"] = len(self._users)
+            out["running"] = self._running
+            out["pending"] = sum(1 for s in self._users.values() if s.pending is not None)
+        return out
+
+    def clear(self) -> None:
+        """Forget pending work, results and counters (retrievals in flight still finish)."""
+        with self._cond:
+            for state in self._users.values():
+                state.pending = None
+                state.results.clear()
+            self._users.clear()
+            for k in self._stats:
+                self._stats[k] = 0
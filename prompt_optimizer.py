@@ -1,6 +1,43 @@
 from __future__ import annotations
 
-from typing import Dict, Optional
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# Per-call cost matters here: optimize() runs on every /api/ask. Keyword
+# detection is one precompiled regex search, token encodings are cached per
+# text, and whole results are memoized (LRU) for repeat questions.
+
+BULLET_KEYWORDS = (
+    # English
+    "list", "compare", "vs", "versus", "pros and cons", "advantages",
+    "disadvantages", "steps", "how do i", "how to", "tutorial", "checklist",
+    "recommendations", "suggest", "top", "best", "options",
+    # Dutch
+    "lijst", "vergelijk", "voor- en nadelen", "voordelen", "nadelen", "stappen",
+    "hoe moet ik", "hoe kan ik", "handleiding", "aanbevel", "aanrad", "tips",
+    "opties", "suggesties",
+)
+# Substring semantics, as before: a keyword matches anywhere in the question.
+# Longest first so overlapping keywords resolve the same way on every run.
+_BULLET_RE = re.compile("|".join(re.escape(k) for k in sorted(BULLET_KEYWORDS, key=len, reverse=True)))
+
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "0"))  # 0 = character limit only
+MEMO_SIZE = int(os.getenv("PROMPT_MEMO_SIZE", "1024"))
+
+_PREFIXES = {
+    "bullets": (
+        "Answer concisely and focus on music, events, mixes, and DJ topics. "
+        "Use short bullet points."
+    ),
+    "brief": (
+        "Answer concisely and focus on music, events, mixes, and DJ topics. "
+        "Use 1-2 sentences."
+    ),
+}
+_SEP = "\n\n"
 
 
 def _normalize_text(text: str) -> str:
@@ -20,29 +57,162 @@ def _detect_intent_style(q: str) -> str:
     Extremely lightweight intent heuristic to recommend response style.
     Returns one of: "bullets" | "brief"
     """
-    lq = q.lower()
-    bullet_keywords = [
-        "list", "compare", "vs", "versus", "pros and cons", "advantages",
-        "disadvantages", "steps", "how do i", "how to", "tutorial", "checklist",
-        "recommendations", "suggest", "top", "best", "options",
-    ]
-    if any(k in lq for k in bullet_keywords):
+    if _BULLET_RE.search(q.lower()):
         return "bullets"
+    return "brief"
 
-    interrogatives = ("who", "what", "when", "where", "why", "how", "which")
-    if lq.startswith(interrogatives):
-        return "brief"
 
-    return "brief"
+# -------------------------
+# Tokenizers
+# -------------------------
+
+class RegexTokenizer:
+    """
+    Dependency-free default: one token per word or punctuation mark. Encodings
+    are token end offsets, so a prefix of n tokens is text[:ends[n - 1]].
+    """
+
+    name = "regex"
+    _token_re = re.compile(r"\w+|[^\w\s]")
+
+    def encode(self, text: str) -> Tuple[int, ...]:
+        return tuple(m.end() for m in self._token_re.finditer(text))
+
+    def decode_prefix(self, text: str, encoding: Tuple[Any, ...], n: int) -> str:
+        return text[: encoding[n - 1]] if n > 0 else ""
+
+
+class HFTokenizer:
+    """A Hugging Face tokenizer (PROMPT_TOKENIZER), matching a backend model's token counts."""
+
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer  # type: ignore
+
+        self.name = name
+        self._tok = AutoTokenizer.from_pretrained(name)
+
+    def encode(self, text: str) -> Tuple[int, ...]:
+        return tuple(self._tok.encode(text, add_special_tokens=False))
+
+    def decode_prefix(self, text: str, encoding: Tuple[Any, ...], n: int) -> str:
+        return self._tok.decode(list(encoding[:n]), skip_special_tokens=True)
+
+
+def _default_tokenizer() -> Any:
+    name = os.getenv("PROMPT_TOKENIZER", "")
+    if name:
+        try:
+            return HFTokenizer(name)
+        except Exception as e:
+            print(f"Could not load tokenizer {name}: {e}; counting regex tokens")
+    return RegexTokenizer()
+
+
+_tokenizer_lock = threading.Lock()
+_tokenizer: Any = None
+# Bumped on set_tokenizer() so memoized results never mix tokenizers
+_tokenizer_generation = 0
+
+
+def get_tokenizer() -> Any:
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = _default_tokenizer()
+    return _tokenizer
+
+
+def set_tokenizer(tokenizer: Any) -> None:
+    """
+    Plug in a tokenizer: any object with encode(text) -> tuple and
+    decode_prefix(text, encoding, n) -> str. None restores the default.
+    """
+    global _tokenizer, _tokenizer_generation
+    with _tokenizer_lock:
+        _tokenizer = tokenizer
+        _tokenizer_generation += 1
+    _encode.cache_clear()
+    _optimize.cache_clear()
+
+
+@lru_cache(maxsize=2048)
+def _encode(text: str) -> Tuple[Any, ...]:
+    return get_tokenizer().encode(text)
+
+
+def count_tokens(text: str) -> int:
+    return len(_encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` that fits in max_tokens tokens."""
+    encoding = _encode(text)
+    if len(encoding) <= max_tokens:
+        return text
+    return get_tokenizer().decode_prefix(text, encoding, max(0, max_tokens))
+
+
+# -------------------------
+# Optimization
+# -------------------------
 
+@lru_cache(maxsize=MEMO_SIZE)
+def _optimize(original: str, max_len: int, max_tokens: int, generation: int) -> Tuple[str, str, bool, str, Optional[int]]:
+    """(prompt, normalized, truncated, style, prompt tokens or None); memoized per question."""
+    normalized = _normalize_text(original)
+    style = _detect_intent_style(normalized)
+
+    # Compose a small, prepend-only instruction that doesn't conflict with backend system prompts.
+    # Keep it short to avoid inflating tokens and to respect max_len.
+    prefix = _PREFIXES[style]
+
+    # Candidate optimized prompt with prefix + user content
+    question = normalized
+    truncated = False
+    tokens: Optional[int] = None
+    if max_tokens > 0:
+        # Token budget: keep the prefix when the question still gets a useful share
+        available = max_tokens - count_tokens(prefix + _SEP)
+        if count_tokens(question) > max(available, 0):
+            truncated = True
+            if available > 8:
+                question = truncate_tokens(question, available)
+            else:
+                prefix, question = "", truncate_tokens(question, max_tokens)
+
+    candidate = f"{prefix}{_SEP}{question}" if prefix and question else (prefix or question)
+
+    if len(candidate) > max_len:
+        # Prefer preserving as much of the user's normalized content as possible.
+        # If prefix makes the prompt exceed max_len, drop or shorten it.
+        # Try keeping prefix but clipping the normalized part.
+        available_for_question = max_len - len(prefix) - len(_SEP)
+        if prefix and available_for_question > 40:
+            candidate = f"{prefix}{_SEP}{question[:available_for_question]}"
+        else:
+            # If there's not enough room for both, just return the clipped normalized question.
+            candidate = question[:max_len]
+        truncated = True
+
+    if max_tokens > 0:
+        tokens = count_tokens(candidate)
+    return candidate, normalized, truncated, style, tokens
 
-def optimize(question: str, backend: Optional[str] = None, max_len: int = 1000) -> Dict[str, object]:
+
+def optimize(
+    question: str,
+    backend: Optional[str] = None,
+    max_len: int = 1000,
+    max_tokens: Optional[int] = None,
+) -> Dict[str, object]:
     """
     Produce a minimally opinionated, safe, and concise optimization of a user prompt.
     - Normalizes whitespace
     - Adds a short instruction for concise, domain-focused responses
     - Hints style (bullets vs. brief) based on naive intent detection
-    - Enforces a safe max length constraint
+    - Enforces a safe max length constraint (characters), and a token budget when
+      max_tokens (default PROMPT_MAX_TOKENS) is set
 
     Returns:
         {
@@ -52,52 +222,31 @@ def optimize(question: str, backend: Optional[str] = None, max_len: int = 1000)
             "normalized": bool,
             "truncated": bool,
             "strategy": str,
-            "backend": Optional[str]
+            "backend": Optional[str],
+            "tokens": int          # only in token-budget mode
           }
         }
+    Results are memoized; every call returns a fresh dict.
     """
     original = question if isinstance(question, str) else str(question)
-    normalized = _normalize_text(original)
-    style = _detect_intent_style(normalized)
+    budget = PROMPT_MAX_TOKENS if max_tokens is None else max_tokens
+    prompt, normalized, truncated, style, tokens = _optimize(original, max_len, budget, _tokenizer_generation)
 
-    # Compose a small, prepend-only instruction that doesn't conflict with backend system prompts.
-    # Keep it short to avoid inflating tokens and to respect max_len.
-    if style == "bullets":
-        prefix = (
-            "Answer concisely and focus on music, events, mixes, and DJ topics. "
-            "Use short bullet points."
-        )
-    else:
-        prefix = (
-            "Answer concisely and focus on music, events, mixes, and DJ topics. "
-            "Use 1-2 sentences."
-        )
+    meta: Dict[str, Any] = {
+        "normalized": normalized != original,
+        "truncated": truncated,
+        "strategy": f"concise+domain-hint:{style}",
+        "backend": backend,
+    }
+    if tokens is not None:
+        meta["tokens"] = tokens
+    return {"prompt": prompt, "original": original, "meta": meta}
 
-    # Candidate optimized prompt with prefix + user content
-    sep = "\n\n"
-    candidate = f"{prefix}{sep}{normalized}" if normalized else prefix
 
-    truncated = False
-    if len(candidate) > max_len:
-        # Prefer preserving as much of the user's normalized content as possible.
-        # If prefix makes the prompt exceed max_len, drop or shorten it.
-        # Try keeping prefix but clipping the normalized part.
-        available_for_question = max_len - len(prefix) - len(sep)
-        if available_for_question > 40:
-            candidate = f"{prefix}{sep}{normalized[:available_for_question]}"
-            truncated = True
-        else:
-            # If there's not enough room for both, just return the clipped normalized question.
-            candidate = normalized[:max_len]
-            truncated = True
+def memo_stats() -> Dict[str, Any]:
+    return {"optimize": _optimize.cache_info()._asdict(), "encode": _encode.cache_info()._asdict()}
 
-    return {
-        "prompt": candidate,
-        "original": original,
-        "meta": {
-            "normalized": normalized != original,
-            "truncated": truncated,
-            "strategy": f"concise+domain-hint:{style}",
-            "backend": backend,
-        },
-    }
+
+def clear_memo() -> None:
+    _optimize.cache_clear()
+    _encode.cache_clear()
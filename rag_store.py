@@ -5,6 +5,8 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Tuple, Optional
 
+from context_packer import Passage, pack
+
 # Define the embedding model – multilingual model that handles Dutch/English well
 EMB_MODEL = "BAAI/bge-m3"
 
@@ -17,6 +19,22 @@ META_PATH = os.path.join(RAG_STORE_DIR, "meta.json")
 _index: Optional[faiss.Index] = None
 _meta: List[Dict[str, Any]] = []
 _embedder: Optional[SentenceTransformer] = None
+_loaded_version: str = ""
+
+
+def index_version() -> str:
+    """
+    Cheap identity of the on-disk index (mtime/size of index and metadata).
+    Changes whenever index_content.py rebuilds the store; "" when there is no index.
+    """
+    parts = []
+    for path in (INDEX_PATH, META_PATH):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return ""
+        parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+    return "-".join(parts)
 
 def _ensure_model_loaded() -> SentenceTransformer:
     """Lazy load the sentence transformer model"""
@@ -26,11 +44,17 @@ def _ensure_model_loaded() -> SentenceTransformer:
         _embedder = SentenceTransformer(EMB_MODEL)
     return _embedder
 
+def embed(texts: List[str]) -> np.ndarray:
+    """L2-normalized float32 embeddings (one row per text), so inner product == cosine."""
+    model = _ensure_model_loaded()
+    return np.asarray(model.encode(list(texts), normalize_embeddings=True), dtype="float32")
+
 def load_index_and_meta() -> Tuple[Optional[faiss.Index], List[Dict[str, Any]]]:
     """Load FAISS index and meta data from disk"""
-    global _index, _meta
+    global _index, _meta, _loaded_version
     
-    if _index is not None and _meta:
+    version = index_version()
+    if _index is not None and _meta and version == _loaded_version:
         return _index, _meta
     
     if not os.path.exists(INDEX_PATH) or not os.path.exists(META_PATH):
@@ -45,6 +69,7 @@ def load_index_and_meta() -> Tuple[Optional[faiss.Index], List[Dict[str, Any]]]:
         print(f"Loading metadata from {META_PATH}")
         with open(META_PATH, "r", encoding="utf-8") as f:
             _meta = json.load(f)
+        _loaded_version = version
         
         print(f"Loaded index with {_index.ntotal} vectors and {len(_meta)} metadata entries")
         return _index, _meta
@@ -70,17 +95,27 @@ def retrieve(query: str, k: int = 5) -> str:
             print("No RAG index available, returning empty context")
             return ""
         
-        # Load the embedding model
-        model = _ensure_model_loaded()
-        
         # Encode the query
-        q_embedding = model.encode([query], normalize_embeddings=True)
-        q_embedding = np.array(q_embedding).astype("float32")
+        return search(embed([query]), k, query=query)
+            
+    except Exception as e:
+        print(f"Error in retrieval: {e}")
+        return ""
+
+def search(q_embedding: np.ndarray, k: int = 5, query: str = "") -> str:
+    """
+    Search the index with an already computed query embedding (see embed()).
+    Split from retrieve() so callers can budget embedding and search separately.
+    """
+    try:
+        index, meta = load_index_and_meta()
+        if index is None or len(meta) == 0:
+            return ""
         
         # Search for similar chunks
         distances, indices = index.search(q_embedding, k)
         
-        context_chunks = []
+        passages = []
         for i, idx in enumerate(indices[0]):
             if idx == -1 or idx >= len(meta):
                 continue
@@ -90,13 +125,13 @@ def retrieve(query: str, k: int = 5) -> str:
             source = chunk_data.get("source", "unknown source")
             
             if chunk_text:
-                # Clean up source path for display
-                source_display = os.path.basename(source) if source != "unknown source" else source
-                context_chunks.append(f"[Source: {source_display}]\n{chunk_text}")
+                passages.append(Passage(chunk_text, source, float(distances[0][i]), int(idx)))
         
-        if context_chunks:
-            print(f"Retrieved {len(context_chunks)} relevant chunks for query: {query[:50]}...")
-            return "\n\n".join(context_chunks)
+        # Merge overlapping neighbours, dedupe and trim to the prompt token budget
+        context = pack(passages, query=query)
+        if context:
+            print(f"Retrieved {len(passages)} relevant chunks for query: {query[:50]}...")
+            return context
         else:
             print("No relevant chunks found for query")
             return ""
@@ -116,7 +151,8 @@ def get_index_stats() -> Dict[str, Any]:
             "status": "loaded",
             "vectors": index.ntotal,
             "metadata_entries": len(meta),
-            "embedding_model": EMB_MODEL
+            "embedding_model": EMB_MODEL,
+            "version": _loaded_version
         }
     except Exception as e:
         return {"status": "error", "error": str(e)}
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Small, dependency-free resilience primitives shared by the upstream integrations
+# (YouTube today; LLM backends reuse the same breaker).
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 300.0, jitter: bool = True) -> float:
+    """
+    Exponential backoff delay for the given attempt (1-based).
+    With jitter enabled this is "equal jitter": a uniform value in [delay/2, delay],
+    so retries spread out but never come back sooner than half the backoff.
+    """
+    attempt = max(1, int(attempt))
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    if jitter:
+        delay = random.uniform(delay / 2.0, delay)
+    return delay
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"circuit '{name}' is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+
+    - After `failure_threshold` consecutive failures the circuit opens.
+    - While open, calls are rejected until the reset timeout elapses; then a single
+      trial call is let through (half-open).
+    - A failed trial re-opens the circuit with a doubled reset timeout (capped at
+      `max_reset_timeout`); a successful one closes it and resets the backoff.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.max_reset_timeout = float(max_reset_timeout)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._opened_at = 0.0
+            self._current_timeout = self.reset_timeout
+            self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self._current_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._current_timeout - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed now (claims the half-open trial slot)."""
+        with self._lock:
+            state = self._state_locked()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def cancel(self) -> None:
+        """Give back a slot claimed by allow() when the call was not attempted after all."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._current_timeout = self.reset_timeout
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if was_trial or self._failures >= self.failure_threshold:
+                self._trips += 1
+                self._current_timeout = min(
+                    self.max_reset_timeout, self.reset_timeout * (2 ** (self._trips - 1))
+                )
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state_locked()
+            retry = 0.0
+            if self._state == self.OPEN:
+                retry = max(0.0, self._current_timeout - (self._clock() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "trips": self._trips,
+                "retry_after": round(retry, 3),
+            }
+
+
+class NegativeCache:
+    """
+    Remembers recent failures per key so callers can fail fast instead of
+    re-hitting an upstream that just failed. Each consecutive failure for a key
+    doubles its embargo (exponential backoff with jitter, capped).
+    """
+
+    def __init__(self, base: float = 5.0, cap: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.base = base
+        self.cap = cap
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, int, str]] = {}  # key -> (expires_at, failures, error)
+
+    def record(self, key: str, error: str) -> float:
+        """Record a failure for key and return the embargo length in seconds."""
+        with self._lock:
+            _, failures, _ = self._entries.get(key, (0.0, 0, ""))
+            failures += 1
+            delay = backoff_delay(failures, base=self.base, cap=self.cap)
+            self._entries[key] = (self._clock() + delay, failures, error)
+            return delay
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (error, retry_after) while key is embargoed, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            remaining = entry[0] - self._clock()
+            if remaining <= 0:
+                return None
+            return entry[2], remaining
+
+    def clear(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for prompt_optimizer.optimize().
+
+Reports the per-call cost of:
+  - the old keyword scan (`any(k in q for k in keywords)`) vs the precompiled regex
+  - optimize() on unique questions (memo miss) and on repeats (memo hit)
+  - optimize() in token-budget mode, cold and with cached encodings
+
+Usage:
+  python scripts/bench_prompt_optimizer.py [--calls 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import prompt_optimizer as po  # noqa: E402
+
+QUESTIONS = [
+    "What does a booking for a wedding cost?",
+    "Wat kost een boeking voor een bedrijfsfeest in Amsterdam?",
+    "List the best techno tracks for a warehouse set",
+    "Kun je een lijst geven van de beste house mixes?",
+    "When is the next event and where can I buy tickets?",
+    "How do I request a song during a live stream?",
+]
+LONG_QUESTION = " ".join(QUESTIONS * 20)
+
+
+def _old_scan(q):
+    lq = q.lower()
+    return any(k in lq for k in po.BULLET_KEYWORDS)
+
+
+def _per_call_us(fn, calls):
+    return timeit.timeit(fn, number=calls) / calls * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-call cost of prompt_optimizer.optimize()")
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+    n = args.calls
+    qs = QUESTIONS
+    counter = iter(range(10 ** 9))
+
+    rows = [
+        ("keyword scan (any/in)", _per_call_us(lambda: [_old_scan(q) for q in qs], n) / len(qs)),
+        ("keyword scan (regex)", _per_call_us(lambda: [po._detect_intent_style(q) for q in qs], n) / len(qs)),
+        ("optimize, unique question", _per_call_us(lambda: po.optimize(f"{next(counter)} {qs[0]}"), n)),
+        ("optimize, repeat (memo)", _per_call_us(lambda: po.optimize(qs[0]), n)),
+        ("optimize, 256-token budget, unique", _per_call_us(
+            lambda: po.optimize(f"{next(counter)} {LONG_QUESTION}", max_len=100000, max_tokens=256), n // 10)),
+    ]
+    po.clear_memo()
+    po.optimize(LONG_QUESTION, max_len=100000, max_tokens=256)
+    rows.append(("optimize, 256-token budget, repeat", _per_call_us(
+        lambda: po.optimize(LONG_QUESTION, max_len=100000, max_tokens=256), n)))
+
+    width = max(len(name) for name, _ in rows)
+    for name, us in rows:
+        print(f"{name:<{width}}  {us:8.2f} us/call")
+    print(po.memo_stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Responsive image variants for assets/images.
+
+For every PNG/JPEG source this writes width-stepped WebP (and AVIF, when the
+installed Pillow can encode it) copies into assets/images/variants/ and a
+srcset manifest (assets/images/image-manifest.json) that server.py uses to
+pick the best variant per request from the Accept header.
+
+Output names embed the source hash (name-<width>w.<hash>.<fmt>), so reruns
+only encode images that changed. Encoding runs in a process pool.
+
+Usage:
+  python scripts/image_variants.py [--src assets/images] [--widths 320,640,960,1280,1920]
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, features
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+    features = None
+
+SOURCE_PATTERNS = ('*.png', '*.jpg', '*.jpeg')
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1920)
+HASH_LEN = 10  # same fingerprint length as scripts/import_assets.py
+VARIANTS_DIR = 'variants'
+MANIFEST_NAME = 'image-manifest.json'
+QUALITY = {'webp': 80, 'avif': 55}
+
+
+def available_formats():
+    """Formats the installed Pillow can encode, best compression first."""
+    if Image is None:
+        return []
+    formats = []
+    try:
+        has_avif = features.check('avif')
+    except ValueError:  # Pillow < 11.2 does not know the feature name
+        has_avif = False
+    if has_avif or 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    return formats
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:HASH_LEN]
+
+
+def _site_rel(path, root):
+    """Path relative to the site root as a URL path, or None when it lies outside it."""
+    try:
+        return path.resolve().relative_to(root).as_posix()
+    except ValueError:
+        return None
+
+
+def _variant_name(stem, width, digest, fmt):
+    return f"{stem}-{width}w.{digest}.{fmt}"
+
+
+def _encode(job):
+    """Worker: resize one source to every missing (width, format). Runs in a subprocess."""
+    src, out_dir, digest, widths, formats = job
+    written = 0
+    with Image.open(src) as im:
+        im.load()
+        if im.mode not in ('RGB', 'RGBA'):
+            has_alpha = im.mode in ('LA', 'PA') or 'transparency' in im.info
+            im = im.convert('RGBA' if has_alpha else 'RGB')
+        for width in widths:
+            resized = None
+            for fmt in formats:
+                target = Path(out_dir) / _variant_name(Path(src).stem, width, digest, fmt)
+                if target.exists():
+                    continue
+                if resized is None:
+                    height = max(1, round(im.height * width / im.width))
+                    resized = im if width == im.width else im.resize((width, height), Image.LANCZOS)
+                options = {'quality': QUALITY[fmt]}
+                if fmt == 'webp':
+                    options['method'] = 6
+                tmp = target.with_name(target.name + '.tmp')
+                resized.save(tmp, format=fmt.upper(), **options)
+                os.replace(tmp, target)
+                written += 1
+    return written
+
+
+def build_variants(src_dir='assets/images', widths=DEFAULT_WIDTHS, workers=None, site_root='.'):
+    if Image is None:
+        raise RuntimeError("Pillow is required for image variants: pip install pillow")
+    formats = available_formats()
+    if not formats:
+        raise RuntimeError("Installed Pillow cannot encode WebP or AVIF")
+
+    src_path = Path(src_dir)
+    out_dir = src_path / VARIANTS_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    root = Path(site_root).resolve()
+
+    sources = sorted(
+        {p for pattern in SOURCE_PATTERNS for p in src_path.rglob(pattern) if VARIANTS_DIR not in p.parts}
+    )
+    manifest = {}
+    jobs = []
+    if _site_rel(out_dir, root) is None:
+        raise ValueError(f"Image directory {src_dir} is outside the site root {root}; pass --root")
+    for src in sources:
+        rel = _site_rel(src, root)
+        if rel is None:
+            # e.g. a symlink pointing outside the site: the server could not serve it anyway
+            print(f"Skipping {src}: outside the site root {root}")
+            continue
+        try:
+            with Image.open(src) as im:
+                src_w, src_h = im.size
+        except OSError as e:
+            print(f"Skipping unreadable image {src}: {e}")
+            continue
+        digest = _hash_file(src)
+        # Never upscale; always include the native width so the best format is available full-size
+        steps = sorted({w for w in widths if w < src_w} | {src_w})
+        jobs.append((str(src), str(out_dir), digest, steps, formats))
+
+        entry = {'width': src_w, 'height': src_h, 'variants': {}, 'srcset': {}}
+        for fmt in formats:
+            items = [
+                {'w': w, 'src': _site_rel(out_dir / _variant_name(src.stem, w, digest, fmt), root)}
+                for w in steps
+            ]
+            entry['variants'][fmt] = items
+            entry['srcset'][fmt] = ', '.join(f"/{i['src']} {i['w']}w" for i in items)
+        manifest[rel] = entry
+
+    written = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(_encode, jobs))
+
+    # Drop variants of sources that changed or disappeared
+    keep = {Path(v['src']).name for e in manifest.values() for items in e['variants'].values() for v in items}
+    for old in out_dir.iterdir():
+        if old.is_file() and old.name not in keep:
+            old.unlink()
+
+    manifest_path = src_path / MANIFEST_NAME
+    tmp = manifest_path.with_name(MANIFEST_NAME + '.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    os.replace(tmp, manifest_path)
+    return {'sources': len(manifest), 'written': written, 'formats': formats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate responsive WebP/AVIF variants and a srcset manifest')
+    parser.add_argument('--src', default='assets/images', help='Image source directory')
+    parser.add_argument('--widths', default=','.join(map(str, DEFAULT_WIDTHS)), help='Comma-separated widths')
+    parser.add_argument('--workers', type=int, default=None, help='Encoder processes (default: CPU count)')
+    parser.add_argument('--root', default='.', help='Site root the manifest paths are relative to')
+    args = parser.parse_args()
+    widths = tuple(int(w) for w in args.widths.split(',') if w.strip())
+    try:
+        summary = build_variants(args.src, widths=widths, workers=args.workers, site_root=args.root)
+    except (RuntimeError, ValueError) as e:
+        parser.error(str(e))
+    print(f"Image variants in {args.src}/{VARIANTS_DIR}: {summary}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,207 @@
 import argparse
+import gzip
+import hashlib
+import json
+import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import brotli  # optional: enables .br variants
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
 ASSET_TYPES = {
     'images': ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.svg', '*.webp'],
     'css': ['*.css'],
     'js': ['*.js']
 }
 
-def copy_assets(src_dir, dest_dir):
+# Text-like assets worth shipping precompressed; images are already compressed.
+COMPRESSIBLE = {'.css', '.js', '.svg'}
+HASH_LEN = 10  # static_files.FINGERPRINT_RE expects at least 8 hex chars
+MANIFEST_NAME = 'asset-manifest.json'
+BUILD_CACHE_NAME = '.asset-build-cache.json'
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _fingerprinted(rel, digest):
+    p = Path(rel)
+    return str(p.with_name(f"{p.stem}.{digest[:HASH_LEN]}{p.suffix}")).replace(os.sep, '/')
+
+
+def _collect(src_path):
+    """Yield (category, source file, path relative to src) for every matching asset."""
+    seen = set()
+    for category, patterns in ASSET_TYPES.items():
+        for pattern in patterns:
+            for file in sorted(src_path.rglob(pattern)):
+                if file.is_file() and file not in seen:
+                    seen.add(file)
+                    yield category, file, file.relative_to(src_path).as_posix()
+
+
+def _stat_key(file):
+    st = file.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+def _digest(file, cached):
+    """Content hash of file, reusing the cached one when size and mtime are unchanged."""
+    size, mtime_ns = _stat_key(file)
+    if cached and cached.get('size') == size and cached.get('mtime_ns') == mtime_ns:
+        return cached['hash']
+    return _hash_file(file)
+
+
+def _precompress(out_file, force=False):
+    """
+    Write .gz (and .br when brotli is installed) siblings when they are smaller.
+    force=True rebuilds them even if they look newer: copy2 keeps the source's
+    mtime, so replaced content can be older than a stale sibling.
+    """
+    data = out_file.read_bytes()
+    written = []
+    variants = [('.gz', lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda b: brotli.compress(b, quality=11)))
+    for suffix, compress in variants:
+        target = out_file.with_name(out_file.name + suffix)
+        if not force and target.exists() and target.stat().st_mtime_ns >= out_file.stat().st_mtime_ns:
+            continue
+        packed = compress(data)
+        if len(packed) < len(data):
+            target.write_bytes(packed)
+            written.append(target)
+        elif target.exists():
+            target.unlink()  # left over from older content
+    return written
+
+
+def _emit(file, out_file, compress, content_addressed):
+    copied = False
+    # Fingerprinted outputs are content-addressed, so existing means current; otherwise
+    # copy2 preserves mtime, so an identical size+mtime means the output is current.
+    stale = not out_file.exists() or (not content_addressed and _stat_key(out_file) != _stat_key(file))
+    if stale:
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(file, out_file)
+        copied = True
+    if compress and out_file.suffix.lower() in COMPRESSIBLE:
+        _precompress(out_file, force=copied)
+    return copied
+
+
+def copy_assets(src_dir, dest_dir, fingerprint=False, compress=True, workers=None, prune=False):
+    """
+    Incrementally build assets from src_dir into dest_dir/<category>/<relative path>.
+
+    - Unchanged sources (same size/mtime) reuse their cached content hash.
+    - By default outputs keep their names, so pages can link assets/images/logo.png.
+    - With fingerprint=True (opt-in; pages must then resolve names through
+      dest_dir/asset-manifest.json) outputs are named name.<hash>.ext
+      ("images/logo.png" -> "images/logo.<hash>.png") and identical blobs are
+      written once, with every logical name pointing at that file.
+    - prune=True deletes outputs an earlier build wrote (per the build cache)
+      that no source maps to any more; other files under dest_dir, such as
+      images/variants/ from scripts/image_variants.py, are left alone.
+    - Text assets get precompressed .gz/.br siblings for the static server.
+    Returns a summary dict with copied/skipped/deduped counts.
+    """
     src_path = Path(src_dir)
     dest_path = Path(dest_dir)
     if not src_path.exists():
         raise FileNotFoundError(f"Source directory '{src_dir}' does not exist")
+    dest_path.mkdir(parents=True, exist_ok=True)
+
+    cache_file = dest_path / BUILD_CACHE_NAME
+    build_cache = _load_json(cache_file)
+    entries = list(_collect(src_path))
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 2)) as pool:
+        digests = list(pool.map(lambda e: _digest(e[1], build_cache.get(e[2])), entries))
+
+        manifest = {}
+        blobs = {}  # (sha256, suffix) -> output rel path; dedupes identical files
+        jobs = []
+        new_cache = {}
+        deduped = 0
+        for (category, file, rel), digest in zip(entries, digests):
+            logical = f"{category}/{rel}"
+            blob_key = (digest, file.suffix.lower())
+            if fingerprint and blob_key in blobs:
+                out_rel = blobs[blob_key]
+                deduped += 1
+            else:
+                out_rel = _fingerprinted(logical, digest) if fingerprint else logical
+                blobs[blob_key] = out_rel
+                jobs.append((file, dest_path / out_rel))
+            manifest[logical] = out_rel
+            size, mtime_ns = _stat_key(file)
+            # 'out' records what this build wrote, so prune only ever deletes its own files
+            new_cache[rel] = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest, 'out': out_rel}
+
+        copied = sum(pool.map(lambda j: _emit(j[0], j[1], compress, fingerprint), jobs))
+
+    if prune:
+        keep = set(manifest.values())
+        written_before = {e['out'] for e in build_cache.values() if isinstance(e, dict) and e.get('out')}
+        for rel in written_before - keep:
+            out = dest_path / rel
+            for path in (out, out.with_name(out.name + '.gz'), out.with_name(out.name + '.br')):
+                if path.is_file():
+                    path.unlink()
+
+    if fingerprint:
+        _write_json(dest_path / MANIFEST_NAME, manifest)
+    _write_json(cache_file, new_cache)
+    return {'assets': len(entries), 'copied': copied, 'skipped': len(jobs) - copied, 'deduped': deduped}
 
-    for category, patterns in ASSET_TYPES.items():
-        target = dest_path / category
-        target.mkdir(parents=True, exist_ok=True)
-        for pattern in patterns:
-            for file in src_path.rglob(pattern):
-                shutil.copy2(file, target / file.name)
 
 def main():
     parser = argparse.ArgumentParser(description="Copy local assets into the project's assets directory")
     parser.add_argument('source', help='Path to the folder containing your assets')
     parser.add_argument('--dest', default='assets', help='Destination assets directory')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel hashing/compression workers')
+    parser.add_argument('--fingerprint', action='store_true',
+                        help='Content-hashed file names plus asset-manifest.json (pages must use the manifest)')
+    parser.add_argument('--no-compress', action='store_true', help='Skip .gz/.br variants')
+    parser.add_argument('--prune', action='store_true',
+                        help='Delete outputs of earlier builds that no source maps to any more')
     args = parser.parse_args()
-    copy_assets(args.source, args.dest)
-    print(f"Assets imported from {args.source} to {args.dest}/")
+    summary = copy_assets(
+        args.source,
+        args.dest,
+        fingerprint=args.fingerprint,
+        compress=not args.no_compress,
+        workers=args.workers,
+        prune=args.prune,
+    )
+    print(f"Assets imported from {args.source} to {args.dest}/: {summary}")
 
 if __name__ == '__main__':
     main()
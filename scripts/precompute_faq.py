@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Precompute answers for frequent /api/ask questions.
+
+Reads questions from a text file (one per line) or a JSON-lines request log
+(objects with a "question" field), keeps the most frequent ones, answers them
+offline in batches and merges the results into the FAQ file that
+server_improved serves before any live backend (see faq_store.py).
+
+Refresh is incremental: questions that already have an answer are skipped,
+except self-hosted answers generated against an older RAG index (or
+everything with --force).
+
+Backends:
+  worker  OpenAI via worker_logic (concurrent requests)
+  local   self-hosted RAG + Ollama via self_hosted_chat (uses LLM_BATCH_SIZE batching)
+  hf      Hugging Face batch generation via huggingface_logic
+
+Usage:
+  python scripts/precompute_faq.py questions.txt [--backend worker] [--top 200] [--min-count 2]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import faq_store  # noqa: E402
+
+
+def read_questions(path: str) -> List[str]:
+    """Questions from a text file or a JSON-lines request log, one entry per occurrence."""
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    question = json.loads(line).get('question')
+                except (ValueError, AttributeError):
+                    continue
+                if isinstance(question, str) and question.strip():
+                    questions.append(question.strip())
+            else:
+                questions.append(line)
+    return questions
+
+
+def most_frequent(questions: List[str], top: int, min_count: int) -> List[str]:
+    """Top questions by normalized form; each represented by its most common spelling."""
+    counts: Counter = Counter()
+    spellings: Dict[str, Counter] = {}
+    for q in questions:
+        key = faq_store.faq_key(q)
+        if not key:
+            continue
+        counts[key] += 1
+        spellings.setdefault(key, Counter())[q] += 1
+    return [
+        spellings[key].most_common(1)[0][0]
+        for key, n in counts.most_common(top)
+        if n >= min_count
+    ]
+
+
+def _prompt(question: str) -> str:
+    # Same prompt shaping as the live /api/ask path
+    if os.getenv('PROMPT_OPTIMIZER', 'on').lower() in {'off', '0', 'false'}:
+        return question
+    from prompt_optimizer import optimize
+
+    return str(optimize(question).get('prompt', question)) or question
+
+
+def _answer_worker(question: str, timeout: float) -> Optional[str]:
+    import worker_logic
+
+    result = worker_logic.ask(_prompt(question), timeout=timeout)
+    return result.get('choices', [{}])[0].get('message', {}).get('content') or None
+
+
+def _answer_local(question: str, timeout: float) -> Optional[str]:
+    import self_hosted_chat
+
+    return self_hosted_chat.answer(_prompt(question), timeout)
+
+
+def answer_all(questions: List[str], backend: str, batch_size: int, timeout: float) -> List[Tuple[str, Optional[str]]]:
+    """(question, answer or None) for every question, answered batch_size at a time."""
+    if backend == 'hf':
+        import huggingface_logic
+
+        results = []
+        for i in range(0, len(questions), batch_size):
+            batch = questions[i:i + batch_size]
+            try:
+                answers = huggingface_logic.ask_batch([_prompt(q) for q in batch])
+            except Exception as e:
+                print(f"Batch {i // batch_size + 1} failed: {e}")
+                answers = [None] * len(batch)
+            results.extend(zip(batch, answers))
+        return results
+
+    answer = _answer_worker if backend == 'worker' else _answer_local
+
+    def _one(question: str) -> Tuple[str, Optional[str]]:
+        try:
+            return question, answer(question, timeout)
+        except Exception as e:
+            print(f"Failed: {question[:60]}: {e}")
+            return question, None
+
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        return list(pool.map(_one, questions))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precompute answers for frequent questions")
+    parser.add_argument('source', help="Text file (one question per line) or JSON-lines request log")
+    parser.add_argument('--backend', choices=('worker', 'local', 'hf'), default='worker')
+    parser.add_argument('--top', type=int, default=200, help="Keep this many most frequent questions")
+    parser.add_argument('--min-count', type=int, default=1, help="Ignore questions seen fewer times")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--out', default=os.getenv('FAQ_PATH', faq_store.DEFAULT_PATH))
+    parser.add_argument('--force', action='store_true', help="Re-answer questions that already have an answer")
+    parser.add_argument('--prune', action='store_true', help="Drop stored answers not in this question list")
+    args = parser.parse_args()
+
+    questions = most_frequent(read_questions(args.source), args.top, args.min_count)
+    existing = faq_store.read_entries(args.out)
+    current_version = faq_store.rag_version()
+    # Only self-hosted answers depend on the RAG index
+    index_version = current_version if args.backend == 'local' else ''
+
+    todo = []
+    for q in questions:
+        entry = existing.get(faq_store.faq_key(q))
+        stale = entry is None or (entry.get('index_version') and entry['index_version'] != current_version)
+        if args.force or stale:
+            todo.append(q)
+    print(f"{len(questions)} frequent question(s), {len(todo)} to answer with '{args.backend}'")
+
+    backend_name = {'worker': 'worker_logic', 'local': 'self_hosted', 'hf': 'huggingface'}[args.backend]
+    answered = 0
+    for question, text in answer_all(todo, args.backend, max(1, args.batch_size), args.timeout):
+        if text:
+            existing[faq_store.faq_key(question)] = faq_store.make_entry(question, text, backend_name, index_version)
+            answered += 1
+    if args.prune:
+        keep = {faq_store.faq_key(q) for q in questions}
+        existing = {k: v for k, v in existing.items() if k in keep}
+
+    faq_store.write_entries(args.out, existing)
+    print(f"Answered {answered}/{len(todo)}; {len(existing)} answer(s) in {args.out}")
+    return 0 if answered == len(todo) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
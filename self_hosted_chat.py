@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Self-hosted answer path for /api/ask: detect language -> embed -> search the
+# RAG index -> generate with the local LLM (Ollama).
+#
+# Every stage runs under its own time budget (RAG_*_BUDGET, seconds), capped by
+# what is left of the request deadline minus a reserve for generation. A stage
+# that overruns or fails degrades instead of failing the answer: language falls
+# back to a stopword heuristic, and slow/broken retrieval means answering
+# without context. Only generation failing makes this backend give up.
+
+STAGE_BUDGETS: Dict[str, float] = {
+    "detect": float(os.getenv("RAG_DETECT_BUDGET", "0.05")),
+    "embed": float(os.getenv("RAG_EMBED_BUDGET", "0.5")),
+    "search": float(os.getenv("RAG_SEARCH_BUDGET", "0.2")),
+}
+# Time kept back for the local LLM when budgeting the earlier stages
+GENERATE_RESERVE = float(os.getenv("RAG_GENERATE_RESERVE", "3"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+
+SYSTEM_PROMPTS = {
+    "nl": (
+        "Je bent de assistent van BaddBeatz. Antwoord kort en behulpzaam in het Nederlands "
+        "over muziek, evenementen, mixes en DJ-onderwerpen."
+    ),
+    "en": (
+        "You are BaddBeatz' assistant. Answer briefly and helpfully in English "
+        "about music, events, mixes, and DJ-related topics."
+    ),
+}
+CONTEXT_INSTRUCTION = {
+    "nl": "Gebruik de onderstaande context als die relevant is. Verzin geen feiten.",
+    "en": "Use the context below when it is relevant. Do not invent facts.",
+}
+
+_DUTCH_MARKERS = frozenset(
+    "de het een en is van ik je jij wat hoe waar wanneer waarom niet met voor op zijn "
+    "kan kun wil boeken prijs kost hoeveel graag bedankt".split()
+)
+
+# Stages run in this pool so an overrun can be abandoned; the work itself finishes
+# in the background (e.g. a first-call model load still warms the cache).
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_STAGE_WORKERS", "8")), thread_name_prefix="rag-stage")
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _record(stage: str, outcome: str, seconds: float) -> None:
+    with _stats_lock:
+        st = _stats.setdefault(stage, {"calls": 0, "ok": 0, "timeout": 0, "error": 0, "skipped": 0, "total_ms": 0.0})
+        st["calls"] += 1
+        st[outcome] += 1
+        st["total_ms"] += seconds * 1000.0
+
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        out = {}
+        for stage, st in _stats.items():
+            ran = st["calls"] - st["skipped"]
+            out[stage] = {k: v for k, v in st.items() if k != "total_ms"}
+            out[stage]["avg_ms"] = round(st["total_ms"] / ran, 2) if ran else None
+        return out
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def _run_stage(stage: str, deadline: float, fn: Callable[..., Any], *args: Any) -> Tuple[Any, str]:
+    """Run fn(*args) within min(stage budget, time left before the generation reserve)."""
+    budget = min(STAGE_BUDGETS[stage], deadline - GENERATE_RESERVE - time.monotonic())
+    if budget <= 0:
+        _record(stage, "skipped", 0.0)
+        return None, "skipped"
+    start = time.monotonic()
+    fut = _pool.submit(fn, *args)
+    try:
+        result, outcome = fut.result(timeout=budget), "ok"
+    except FutureTimeout:
+        fut.cancel()
+        result, outcome = None, "timeout"
+    except Exception as e:
+        print(f"Self-hosted {stage} stage failed: {e}")
+        result, outcome = None, "error"
+    _record(stage, outcome, time.monotonic() - start)
+    return result, outcome
+
+
+def guess_language(text: str) -> str:
+    """Cheap nl/en guess from common Dutch words (used when langdetect is slow or missing)."""
+    words = [w.strip(".,!?;:()\"'").lower() for w in text.split()]
+    hits = sum(1 for w in words if w in _DUTCH_MARKERS)
+    return "nl" if words and hits / len(words) >= 0.2 else "en"
+
+
+def _detect(text: str) -> str:
+    from langdetect import detect
+
+    return detect(text)
+
+
+def _embed(text: str) -> Any:
+    import rag_store
+
+    return rag_store.embed([text])
+
+
+def _search(vec: Any, query: str = "") -> str:
+    import rag_store
+
+    return rag_store.search(vec, RAG_TOP_K, query=query)
+
+
+def _query_text(prompt: str) -> str:
+    # prompt_optimizer prepends an English instruction block and a blank line; the
+    # user's own words come last (whitespace-normalized, so they contain no blank line)
+    return prompt.rsplit("\n\n", 1)[-1]
+
+
+def retrieve(query: str) -> str:
+    """Embed + search without stage budgets (speculative prefetch runs off the request path)."""
+    return _search(_embed(query), query) or ""
+
+
+def prepare(
+    question: str, deadline: float, retrieved: Optional[str] = None
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Run detect/embed/search under their budgets; returns (system prompt, user prompt, stage meta).
+    `retrieved` is context prefetched for this question: embed and search are skipped.
+    """
+    meta: Dict[str, Any] = {}
+    query = _query_text(question)
+    lang, meta["detect"] = _run_stage("detect", deadline, _detect, query)
+    if lang not in SYSTEM_PROMPTS:
+        lang = guess_language(query)
+    meta["language"] = lang
+
+    context = ""
+    if retrieved is not None:
+        context, meta["embed"], meta["search"] = retrieved, "prefetched", "prefetched"
+    else:
+        vec, meta["embed"] = _run_stage("embed", deadline, _embed, query)
+        if vec is not None:
+            context, meta["search"] = _run_stage("search", deadline, _search, vec, query)
+            context = context or ""
+        else:
+            meta["search"] = "skipped"
+            _record("search", "skipped", 0.0)
+    meta["context"] = bool(context)
+    meta["retrieved"] = context
+
+    system = SYSTEM_PROMPTS[lang]
+    if context:
+        system = f"{system}\n\n{CONTEXT_INSTRUCTION[lang]}\n\n{context}"
+    return system, question, meta
+
+
+def answer(question: str, timeout: float, retrieved: Optional[str] = None) -> Optional[str]:
+    """Full self-hosted answer within `timeout` seconds, or raise if generation fails."""
+    from local_llm import generate
+
+    deadline = time.monotonic() + timeout
+    system, user, _meta = prepare(question, deadline, retrieved)
+    start = time.monotonic()
+    try:
+        text = generate(system, user, timeout=max(0.1, deadline - start))
+    except Exception:
+        _record("generate", "error", time.monotonic() - start)
+        raise
+    _record("generate", "ok", time.monotonic() - start)
+    return text
+
+
+def answer_turn(
+    question: str, timeout: float, context: Optional[List[int]] = None, retrieved: Optional[str] = None
+) -> Tuple[str, Optional[List[int]]]:
+    """
+    Session-aware answer(): with the Ollama `context` of the previous turn only
+    the new turn (plus any freshly retrieved passages) is sent to the model.
+    Returns (text, new context).
+    """
+    from local_llm import call_local_llm_turn
+
+    deadline = time.monotonic() + timeout
+    system, user, meta = prepare(question, deadline, retrieved)
+    if context and meta["retrieved"]:
+        user = f"{CONTEXT_INSTRUCTION[meta['language']]}\n\n{meta['retrieved']}\n\n{user}"
+    start = time.monotonic()
+    try:
+        result = call_local_llm_turn(system, user, context=context, timeout=max(0.1, deadline - start))
+    except Exception:
+        _record("generate", "error", time.monotonic() - start)
+        raise
+    _record("generate", "ok", time.monotonic() - start)
+    return result
+
+
+def answer_stream(question: str, timeout: float, retrieved: Optional[str] = None) -> Iterator[str]:
+    """Streaming variant of answer(): yields local LLM fragments as they arrive."""
+    from local_llm import stream_local_llm
+
+    deadline = time.monotonic() + timeout
+    system, user, _meta = prepare(question, deadline, retrieved)
+    start = time.monotonic()
+    try:
+        yield from stream_local_llm(system, user, timeout=max(0.1, deadline - start))
+    except Exception:
+        _record("generate", "error", time.monotonic() - start)
+        raise
+    _record("generate", "ok", time.monotonic() - start)
+
+
+async def answer_async(question: str, timeout: float) -> Optional[str]:
+    """asyncio variant: stages run in a thread, generation awaits the shared aiohttp pool."""
+    from local_llm import call_local_llm_async
+
+    deadline = time.monotonic() + timeout
+    system, user, _meta = await asyncio.to_thread(prepare, question, deadline)
+    start = time.monotonic()
+    try:
+        text = await call_local_llm_async(system, user, timeout=max(0.1, deadline - start))
+    except Exception:
+        _record("generate", "error", time.monotonic() - start)
+        raise
+    _record("generate", "ok", time.monotonic() - start)
+    return text
+
+
+def warm_up() -> None:
+    """Load the embedding model and index ahead of the first question."""
+    try:
+        import rag_store
+
+        rag_store.load_index_and_meta()
+        rag_store.embed(["warm up"])
+    except Exception as e:
+        print(f"Self-hosted warm-up failed: {e}")
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Semantic answer cache for /api/ask.
+#
+# Previously answered questions are embedded with the rag_store model and kept
+# in a small in-memory inner-product index (FAISS IndexIDMap over IndexFlatIP,
+# or a NumPy equivalent when faiss isn't installed). A new question reuses a
+# cached answer when its cosine similarity clears the threshold and the answer
+# came from the same backend chain. Entries expire by TTL and are evicted LRU;
+# every eviction removes the vector too, so index and entries stay in step.
+# The whole cache is dropped whenever the RAG index version changes.
+
+EmbedFn = Callable[[List[str]], np.ndarray]
+
+
+class _NumpyFlatIP:
+    """Minimal stand-in for faiss.IndexIDMap(faiss.IndexFlatIP(dim))."""
+
+    def __init__(self, dim: int):
+        self.d = dim
+        self._ids = np.empty(0, dtype="int64")
+        self._vecs = np.empty((0, dim), dtype="float32")
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._ids)
+
+    def add_with_ids(self, vecs: np.ndarray, ids: np.ndarray) -> None:
+        self._vecs = np.vstack([self._vecs, vecs.astype("float32")])
+        self._ids = np.concatenate([self._ids, ids.astype("int64")])
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        keep = ~np.isin(self._ids, ids)
+        removed = int((~keep).sum())
+        self._ids, self._vecs = self._ids[keep], self._vecs[keep]
+        return removed
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = q @ self._vecs.T
+        order = np.argsort(-scores, axis=1)[:, :k]
+        d = np.full((len(q), k), -np.inf, dtype="float32")
+        i = np.full((len(q), k), -1, dtype="int64")
+        n = order.shape[1]
+        d[:, :n] = np.take_along_axis(scores, order, axis=1)
+        i[:, :n] = self._ids[order]
+        return d, i
+
+    def reset(self) -> None:
+        self._ids = self._ids[:0]
+        self._vecs = self._vecs[:0]
+
+
+def _new_index(dim: int) -> Any:
+    try:
+        import faiss  # type: ignore
+    except ImportError:
+        return _NumpyFlatIP(dim)
+    return faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+
+
+def _rag_embed(texts: List[str]) -> np.ndarray:
+    import rag_store  # lazy: pulls in faiss and sentence-transformers
+
+    return rag_store.embed(texts)
+
+
+def _rag_version() -> str:
+    import rag_store
+
+    return rag_store.index_version()
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl: float = 3600.0,
+        enabled: bool = True,
+        embed: Optional[EmbedFn] = None,
+        version: Optional[Callable[[], str]] = None,
+        clock: Callable[[], float] = time.time,
+        candidates: int = 4,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.candidates = candidates
+        self._embed = embed or _rag_embed
+        self._version = version or _rag_version
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._index: Any = None
+        # id -> (answer text, backend name, chain id, expires); order is LRU
+        self._entries: "OrderedDict[int, Tuple[str, str, str, float]]" = OrderedDict()
+        self._next_id = 1
+        self._seen_version: Optional[str] = None
+        self._unavailable = False
+        # Set once the version lookup fails to import rag_store; not retried per lookup
+        self._no_version = False
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+            enabled=os.getenv("SEMANTIC_CACHE", "on").lower() not in {"off", "0", "false"},
+        )
+
+    def _vector(self, question: str) -> Optional[np.ndarray]:
+        if self._unavailable:
+            return None
+        try:
+            vec = np.asarray(self._embed([" ".join(question.split())]), dtype="float32").reshape(1, -1)
+        except ImportError as e:
+            # No embedding stack installed: stop trying for the life of the process
+            print(f"Semantic cache disabled: {e}")
+            self._unavailable = True
+            return None
+        except Exception as e:
+            print(f"Semantic cache embedding failed: {e}")
+            return None
+        return vec
+
+    def _check_version(self) -> None:
+        """Drop everything when the RAG index was rebuilt (answers may be stale). Caller holds the lock."""
+        version = ""
+        if not self._no_version:
+            try:
+                version = self._version()
+            except ImportError:
+                self._no_version = True
+            except Exception:
+                pass
+        if self._seen_version is not None and version != self._seen_version and self._entries:
+            self._clear_locked()
+            self._stats["invalidations"] += 1
+        self._seen_version = version
+
+    def _evict_locked(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        for i in ids:
+            self._entries.pop(i, None)
+        if self._index is not None:
+            self._index.remove_ids(np.asarray(ids, dtype="int64"))
+        self._stats["evictions"] += len(ids)
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    def lookup(self, question: str, chain_id: str) -> Optional[Tuple[str, str, float]]:
+        """(answer text, backend, similarity) for the closest fresh paraphrase, else None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version()
+            empty = not self._entries
+        if empty:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        vec = self._vector(question)
+        if vec is None:
+            return None
+        now = self._clock()
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0 or vec.shape[1] != self._index.d:
+                self._stats["misses"] += 1
+                return None
+            scores, ids = self._index.search(vec, min(self.candidates, self._index.ntotal))
+            expired = []
+            hit = None
+            for score, i in zip(scores[0], ids[0]):
+                entry = self._entries.get(int(i))
+                if entry is None:
+                    continue
+                if entry[3] <= now:
+                    expired.append(int(i))
+                    continue
+                if score >= self.threshold and entry[2] == chain_id and hit is None:
+                    hit = (entry[0], entry[1], float(score))
+                    self._entries.move_to_end(int(i))
+            self._evict_locked(expired)
+            self._stats["hits" if hit else "misses"] += 1
+            return hit
+
+    def store(self, question: str, chain_id: str, text: str, backend: str) -> None:
+        if not self.enabled:
+            return
+        vec = self._vector(question)
+        if vec is None:
+            return
+        with self._lock:
+            self._check_version()
+            if self._index is None or vec.shape[1] != self._index.d:
+                self._index = _new_index(vec.shape[1])
+                self._entries.clear()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.asarray([entry_id], dtype="int64"))
+            self._entries[entry_id] = (text, backend, chain_id, self._clock() + self.ttl)
+            self._stats["stores"] += 1
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._evict_locked(list(self._entries)[:overflow])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["vectors"] = int(self._index.ntotal) if self._index is not None else 0
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else None
+        out["enabled"] = self.enabled and not self._unavailable
+        out["threshold"] = self.threshold
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear_locked()
+            self._seen_version = None
+            for k in self._stats:
+                self._stats[k] = 0
@@ -2,9 +2,10 @@
 from __future__ import annotations
 
 import os
-from flask import send_from_directory
-import requests
+from flask import abort, request
+import http_client
 import server_improved as si
+from static_files import StaticIndex
 
 # Expose the Flask app for tests (server.app.test_client())
 app = si.app
@@ -20,8 +21,13 @@ def _yt_get_latest_videos(channel_id: str):
         "type": "video",
         "key": api_key,
     }
-    resp = requests.get(
-        "https://www.googleapis.com/youtube/v3/search", params=params, timeout=10
+    # Keep the upstream timeout short: failures are absorbed by the guard in
+    # server_improved (negative cache + breaker + last-known-good data). No
+    # HTTP-level retries: every search.list attempt costs quota, and the guard
+    # charges one call per fetch.
+    timeout = float(os.getenv("YOUTUBE_TIMEOUT", "5"))
+    resp = http_client.get(
+        "https://www.googleapis.com/youtube/v3/search", params=params, timeout=timeout, retries=0
     )
     resp.raise_for_status()
     payload = resp.json()
@@ -36,22 +42,37 @@ def _yt_get_latest_videos(channel_id: str):
 # Inject into server_improved so its /api/youtube uses the HTTP-backed implementation
 si.get_latest_videos = _yt_get_latest_videos
 
-# Serve static site files (index.html etc.) from project root
+# Serve static site files (index.html etc.) from project root. The public files are
+# indexed once here; see static_files.StaticIndex for caching/compression rules.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_INDEX = StaticIndex.from_env(BASE_DIR).build()
+# Let a fronting nginx/Apache stream large files itself when configured
+app.use_x_sendfile = os.getenv("USE_X_SENDFILE", "").lower() in {"1", "true", "on"}
+
+
+def _serve_static(filename: str):
+    resp = STATIC_INDEX.serve(filename, request)
+    if resp is None:
+        abort(404)
+    return resp
+
 
 # Avoid registering routes after the app has already handled a request (which can happen
 # when importing this module in a test run after other tests have already used the app).
 if not getattr(app, "_got_first_request", False):
     @app.route("/")
     def root():
-        return send_from_directory(BASE_DIR, "index.html")
+        return _serve_static("index.html")
 
     @app.route("/<path:filename>")
     def static_files(filename: str):
-        return send_from_directory(BASE_DIR, filename)
+        return _serve_static(filename)
 
 if __name__ == "__main__":
     # Initialize persistence if configured (DB_PATH) and run Flask app
     si.init_db()
+    # Warm configured YouTube channels before serving, then keep them fresh;
+    # also WebSub and the self-hosted chat warm-up/keep-alive
+    si.start_background()
     port = int(os.getenv("PORT", "8000"))
     app.run(host="0.0.0.0", port=port, debug=False)
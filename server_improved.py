@@ -1,23 +1,39 @@
 from __future__ import annotations
 
 import os
+import hashlib
+import hmac
 import json
+import struct
+import threading
 import time
 import uuid
-from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Set
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from prompt_optimizer import optimize
+from youtube_service import YouTubeGuard, YouTubePrefetcher, YouTubeUnavailable
+from websub import WebSubSubscriber
+from ask_backends import Backend, BackendExecutor, StreamBackend, call_with_timeout
+from answer_cache import AnswerCache, cache_key
+from semantic_cache import SemanticCache
+from chat_sessions import ChatSession, SessionStore
+from faq_store import FaqStore
+from admission import AdmissionController, Rejected
+from prefetch import RetrievalPrefetcher
+import http_client
+import local_llm
+import waveform
 from dotenv import load_dotenv
 
 # Load environment variables from .env at import time for local/dev
 load_dotenv()
 
-# Import new modules for self-hosted chat
+# Self-hosted chat (self_hosted_chat.py) needs langdetect and the RAG index deps
 try:
-    from langdetect import detect
-    from local_llm import call_local_llm
-    from rag_store import retrieve, get_index_stats
+    import langdetect  # noqa: F401
+    from rag_store import get_index_stats
     SELF_HOSTED_CHAT_AVAILABLE = True
 except ImportError as e:
     print(f"Self-hosted chat dependencies not available: {e}")
@@ -32,20 +48,41 @@ _TOKENS: Dict[str, str] = {}  # token -> username
 _TRACKS: List[Dict[str, str]] = []
 
 
-# Simple cache for YouTube (and anything else if needed)
+# Simple cache for YouTube (and anything else if needed). The prefetch thread and
+# request threads share it, so every access holds the lock.
 class SimpleCache:
     def __init__(self):
+        self._lock = threading.Lock()
         self._store: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
 
     def get(self, key: str) -> Any:
-        return self._store.get(key)
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is not None and time.monotonic() >= expires:
+                self._store.pop(key, None)
+                self._expires.pop(key, None)
+                return None
+            return self._store.get(key)
 
     def set(self, key: str, value: Any, timeout: Optional[int] = None) -> None:
-        # timeout ignored for tests; they only assert caching behavior
-        self._store[key] = value
+        # No timeout (or 0) keeps the entry until cleared, which is what tests rely on
+        with self._lock:
+            self._store[key] = value
+            if timeout:
+                self._expires[key] = time.monotonic() + timeout
+            else:
+                self._expires.pop(key, None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._store.pop(key, None)
+            self._expires.pop(key, None)
 
     def clear(self) -> None:
-        self._store.clear()
+        with self._lock:
+            self._store.clear()
+            self._expires.clear()
 
 
 # Expose cache in app.extensions as tests refer to it
@@ -60,6 +97,123 @@ class _AskDJNamespace:
 
 ask_dj = _AskDJNamespace()
 
+# Quota/breaker/negative-cache guard around the YouTube fetcher. Fresh results are
+# cached for YOUTUBE_CACHE_TTL seconds; the guard keeps the last good payload per
+# channel so it can still be served while YouTube is failing or out of quota.
+YOUTUBE_CACHE_TTL = int(os.getenv("YOUTUBE_CACHE_TTL", "900"))
+_yt_guard = YouTubeGuard()
+
+
+def _yt_cache_ttl(channel_id: str) -> int:
+    # Push-invalidated channels can be cached for a long time: WebSub tells us
+    # about new uploads within seconds.
+    if _websub.is_subscribed(channel_id):
+        return max(YOUTUBE_CACHE_TTL, YOUTUBE_WEBSUB_TTL)
+    # Prefetched channels must outlive their refresh interval so users never miss.
+    if channel_id in _yt_prefetcher.channels:
+        return max(YOUTUBE_CACHE_TTL, int(2 * _yt_prefetcher.interval))
+    return YOUTUBE_CACHE_TTL
+
+
+def refresh_youtube_channel(channel_id: str) -> Any:
+    """Fetch a channel through the guard and store it under yt:<channel_id>."""
+    data = _yt_guard.fetch(channel_id, get_latest_videos)
+    app.extensions["cache"].set(f"yt:{channel_id}", data, timeout=_yt_cache_ttl(channel_id))
+    return data
+
+
+# Channels listed in YOUTUBE_PREFETCH_CHANNELS are kept warm in the background.
+_yt_prefetcher = YouTubePrefetcher.from_env(lambda cid: refresh_youtube_channel(cid))
+
+
+def start_youtube_prefetch() -> bool:
+    """Warm the configured channels and start the background refresher (no-op if none)."""
+    return _yt_prefetcher.start(warm=True)
+
+
+# WebSub push invalidation (enabled when WEBSUB_CALLBACK_URL is set)
+WEBSUB_CALLBACK_PATH = "/api/websub/youtube"
+YOUTUBE_WEBSUB_TTL = int(os.getenv("YOUTUBE_WEBSUB_TTL", "86400"))
+_websub = WebSubSubscriber.from_env()
+
+
+def _websub_channels() -> List[str]:
+    raw = ",".join([os.getenv("YOUTUBE_WEBSUB_CHANNELS", ""), os.getenv("YOUTUBE_PREFETCH_CHANNELS", "")])
+    return list(dict.fromkeys(c.strip() for c in raw.split(",") if c.strip()))
+
+
+def _websub_loop(channels: List[str]) -> None:
+    pending = list(channels)
+    while True:
+        for channel_id in pending:
+            try:
+                _websub.request(channel_id, "subscribe")
+            except Exception as e:
+                print(f"WebSub subscribe failed for {channel_id}: {e}")
+        # Check back sooner while a request failed or the hub has not verified it yet
+        time.sleep(600 if any(not _websub.is_subscribed(c) for c in channels) else 3600)
+        due = set(_websub.renew_due(margin=2 * 3600))
+        pending = [c for c in channels if c in due or not _websub.is_subscribed(c)]
+
+
+# Notification refreshes run on a small pool; a channel already queued is not queued twice
+_websub_refresh_lock = threading.Lock()
+_websub_refreshing: Set[str] = set()
+_websub_refresh_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _websub_refresh(channel_id: str) -> None:
+    try:
+        _yt_prefetcher.refresh_one(channel_id)
+    finally:
+        with _websub_refresh_lock:
+            _websub_refreshing.discard(channel_id)
+
+
+def _schedule_websub_refresh(channel_id: str) -> bool:
+    global _websub_refresh_pool
+    with _websub_refresh_lock:
+        if channel_id in _websub_refreshing:
+            return False
+        _websub_refreshing.add(channel_id)
+        if _websub_refresh_pool is None:
+            workers = int(os.getenv("WEBSUB_REFRESH_WORKERS", "2"))
+            _websub_refresh_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="websub-refresh")
+    _websub_refresh_pool.submit(_websub_refresh, channel_id)
+    return True
+
+
+def start_websub() -> bool:
+    """Subscribe configured channels at the hub and keep their leases renewed."""
+    channels = _websub_channels()
+    if not _websub.enabled or not channels:
+        return False
+    threading.Thread(target=_websub_loop, args=(channels,), name="websub", daemon=True).start()
+    return True
+
+
+def start_background() -> Dict[str, bool]:
+    """
+    Start every background job a serving process needs (call once, after
+    init_db): YouTube prefetch, WebSub, Hugging Face preloading (HF_PRELOAD)
+    and, when self-hosted chat is available, the RAG warm-up and the local
+    model keep-alive.
+    """
+    started = {"youtube_prefetch": start_youtube_prefetch(), "websub": start_websub(), "hf_preload": False}
+    if os.getenv("HF_PRELOAD"):
+        import huggingface_logic  # type: ignore
+
+        threading.Thread(target=huggingface_logic.preload, name="hf-preload", daemon=True).start()
+        started["hf_preload"] = True
+    started["rag_warmup"] = started["llm_keepalive"] = False
+    if SELF_HOSTED_CHAT_AVAILABLE:
+        import self_hosted_chat
+
+        threading.Thread(target=self_hosted_chat.warm_up, name="rag-warmup", daemon=True).start()
+        started["rag_warmup"] = True
+        started["llm_keepalive"] = local_llm.start_keepalive()
+    return started
+
 
 # --- Simple JSON file persistence for subprocess-based tests (disabled in TESTING) ---
 
@@ -121,8 +275,29 @@ def _save_db() -> None:
 
 def init_db() -> None:
     """Initialize or reset data store (in-memory for tests, JSON when DB_PATH is set)."""
-    # clear cache as part of DB init
+    # clear cache (and upstream guard state) as part of DB init
     app.extensions["cache"].clear()
+    _yt_guard.reset()
+    _websub.reset()
+    with _websub_refresh_lock:
+        _websub_refreshing.clear()
+    _ask_executor.reset()
+    # The sqlite tier (ASK_CACHE_DB) is meant to survive restarts; only drop memory
+    _answer_cache.clear(disk=False)
+    _semantic_cache.clear()
+    _chat_sessions.clear()
+    _faq_store.clear()
+    _admission.reset()
+    _prefetcher.clear()
+    import gemini_logic  # type: ignore
+
+    gemini_logic.reset()
+    if SELF_HOSTED_CHAT_AVAILABLE:
+        import context_packer
+        import self_hosted_chat
+
+        self_hosted_chat.reset_stats()
+        context_packer.reset_stats()
     if _persist_enabled():
         # Load existing DB if present, else start fresh and save
         dbp = _db_path() or ""
@@ -141,10 +316,16 @@ def init_db() -> None:
 def _gen_token(username: str) -> str:
     return f"tok_{username}_{uuid.uuid4().hex[:8]}"
 
-def _auth_user() -> Optional[Dict[str, Any]]:
+def _bearer_token() -> Optional[str]:
     auth = request.headers.get("Authorization", "")
     if auth.startswith("Bearer "):
-        token = auth.split(" ", 1)[1].strip()
+        return auth.split(" ", 1)[1].strip()
+    return None
+
+
+def _auth_user() -> Optional[Dict[str, Any]]:
+    token = _bearer_token()
+    if token:
         username = _TOKENS.get(token)
         if username:
             return _USERS.get(username)
@@ -253,7 +434,7 @@ def add_track():
     if len(url) > 500:
         return jsonify({"error": "url too long"}), 400
 
-    track = {"title": title, "url": url, "user": user["username"]}
+    track = {"id": uuid.uuid4().hex[:12], "title": title, "url": url, "user": user["username"]}
     _TRACKS.append(track)
     if _persist_enabled():
         _save_db()
@@ -271,6 +452,32 @@ def list_tracks():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/tracks/<peaks_id>/peaks", methods=["GET"])
+def track_peaks(peaks_id: str):
+    """Precomputed waveform peaks (see waveform.py) as int8 min/max pairs."""
+    if not waveform.is_valid_id(peaks_id):
+        return jsonify({"error": "invalid track id"}), 400
+    try:
+        res = int(request.args.get("res", "1024"))
+    except ValueError:
+        return jsonify({"error": "res must be an integer"}), 400
+
+    path = waveform.peaks_path(peaks_id)
+    if not os.path.exists(path):
+        return jsonify({"error": "peaks not found"}), 404
+    try:
+        with open(path, "rb") as f:
+            bins, body = waveform.select_level(f.read(), res)
+    except (OSError, ValueError, struct.error) as e:
+        return jsonify({"error": str(e)}), 500
+
+    resp = app.response_class(body, mimetype="application/octet-stream")
+    resp.headers["X-Peaks-Bins"] = str(bins)
+    resp.headers["Cache-Control"] = "public, max-age=604800, stale-while-revalidate=86400"
+    resp.set_etag(hashlib.sha256(body).hexdigest()[:32])
+    return resp.make_conditional(request)
+
+
 @app.route("/api/youtube", methods=["GET"])
 def youtube():
     channel_id = request.args.get("channel_id")
@@ -283,8 +490,7 @@ def youtube():
         return jsonify(cached), 200
 
     try:
-        data = get_latest_videos(channel_id)
-        cache.set(f"yt:{channel_id}", data)
+        data = refresh_youtube_channel(channel_id)
         # Ensure clearer performance delta in tests: make first-call slightly slower
         if app.config.get("TESTING", False):
             try:
@@ -293,9 +499,63 @@ def youtube():
                 pass
         return jsonify(data), 200
     except Exception as e:
+        # Serve the last good payload while upstream is unhealthy
+        stale = _yt_guard.last_known_good(channel_id)
+        if stale is not None:
+            resp = jsonify(stale)
+            resp.headers["Warning"] = '110 - "Response is Stale"'
+            return resp, 200
+        if isinstance(e, YouTubeUnavailable):
+            resp = jsonify({"error": str(e)})
+            resp.headers["Retry-After"] = str(int(e.retry_after + 0.5))
+            return resp, 503
         return jsonify({"error": str(e)}), 500
 
 
+@app.route(WEBSUB_CALLBACK_PATH, methods=["GET"])
+def websub_verify():
+    """Hub verification of (un)subscribe intent: echo the challenge for topics we requested."""
+    if not _websub.enabled:
+        return jsonify({"error": "not found"}), 404
+    challenge = _websub.verify(
+        request.args.get("hub.mode", ""),
+        request.args.get("hub.topic", ""),
+        request.args.get("hub.challenge", ""),
+        request.args.get("hub.lease_seconds"),
+    )
+    if challenge is None:
+        return jsonify({"error": "unknown subscription"}), 404
+    return challenge, 200, {"Content-Type": "text/plain"}
+
+
+@app.route(WEBSUB_CALLBACK_PATH, methods=["POST"])
+def websub_notify():
+    """Atom notification from the hub: drop (and optionally refresh) only the affected channels."""
+    if not _websub.enabled:
+        return jsonify({"error": "not found"}), 404
+    body = request.get_data(cache=False)
+    try:
+        channels = _websub.accept(body, request.headers.get("X-Hub-Signature"))
+    except PermissionError:
+        # Per WebSub, acknowledge but ignore notifications with a bad signature
+        return "", 202
+    except Exception:
+        return jsonify({"error": "invalid notification"}), 400
+
+    cache: SimpleCache = app.extensions["cache"]
+    mode = os.getenv("WEBSUB_REFRESH", "async").lower()
+    for channel_id in channels:
+        cache.delete(f"yt:{channel_id}")
+        if mode == "sync":
+            try:
+                refresh_youtube_channel(channel_id)
+            except Exception as e:
+                print(f"WebSub refresh failed for {channel_id}: {e}")
+        elif mode != "off":
+            _schedule_websub_refresh(channel_id)
+    return "", 204
+
+
 @app.route("/api/auth/user", methods=["GET"])
 def get_auth_user():
     """Get current authenticated user information"""
@@ -319,29 +579,271 @@ def rag_status():
         return jsonify({"error": "Self-hosted chat not available"}), 503
     
     try:
+        import context_packer
+        import self_hosted_chat
+
         stats = get_index_stats()
+        stats["stages"] = self_hosted_chat.stage_stats()
+        stats["model"] = local_llm.model_status()
+        stats["packing"] = context_packer.pack_stats()
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/ask", methods=["POST"])
-def ask_chat():
+# -------------------------
+# /api/ask backend chain
+# -------------------------
+
+# End-to-end budget for one question; each backend gets the time that is left.
+ASK_DEADLINE = float(os.getenv("ASK_DEADLINE", "25"))
+_ask_executor = BackendExecutor.from_env()
+_answer_cache = AnswerCache.from_env()
+_semantic_cache = SemanticCache.from_env()
+_faq_store = FaqStore.from_env()
+_admission = AdmissionController.from_env()
+
+
+def _answer_cache_enabled() -> bool:
+    # Tests patch backends per call, so caching is opt-in (ASK_CACHE=on) under TESTING
+    if app.config.get("TESTING") and "ASK_CACHE" not in os.environ:
+        return False
+    return _answer_cache.enabled
+
+
+def _semantic_cache_enabled() -> bool:
+    if app.config.get("TESTING") and "SEMANTIC_CACHE" not in os.environ:
+        return False
+    return _semantic_cache.enabled
+
+
+def _admit_ask():
+    """
+    Admission control for the ask routes: (release callback, seconds queued, error
+    response). The callback must run once the request stops using its slot.
+    """
+    release, waited, rejected = _admit(_bearer_token() or request.remote_addr or "")
+    if rejected is not None:
+        resp = jsonify({"error": rejected.reason})
+        resp.headers["Retry-After"] = rejected.retry_after_header
+        return None, 0.0, (resp, rejected.status)
+    return release, waited, None
+
+
+def _admit(client: str):
+    """
+    Framework-free core of _admit_ask() (also used by async_server): (release
+    callback, seconds queued, Rejected or None). Blocks while queued.
+    """
+    if not _admission.enabled or (app.config.get("TESTING") and "ASK_ADMISSION" not in os.environ):
+        return (lambda: None), 0.0, None
+    try:
+        waited = _admission.acquire(client)
+    except Rejected as e:
+        return None, 0.0, e
+    admitted = time.monotonic()
+    released = threading.Event()
+
+    def release() -> None:
+        if not released.is_set():
+            released.set()
+            _admission.release(time.monotonic() - admitted)
+
+    return release, waited, None
+
+
+def _faq_answer(question: str, follow_up: bool) -> Optional[tuple]:
+    """Precomputed (answer, backend) for a frequent question (see scripts/precompute_faq.py)."""
+    if follow_up or (app.config.get("TESTING") and "FAQ_ANSWERS" not in os.environ):
+        return None
+    return _faq_store.lookup(question)
+
+
+def _ask_chain_id() -> str:
+    """
+    Identity of the backend chain/models an answer came from; part of the cache
+    key. Only backends that can actually answer are listed, so wiring a backend
+    in or out invalidates answers cached under the old chain.
+    """
+    parts = [b.name for b in _ask_backends(include_cold=True)]
+    parts += [os.getenv(k, "") for k in ("HF_MODEL", "LLM_MODEL", "ASK_CACHE_NAMESPACE")]
+    return "|".join(parts)
+
+
+def _cacheable_answer(answer: tuple) -> bool:
+    """Canned fallback text, empty answers and placeholder output are never cached."""
+    text, backend = answer
+    if backend == "fallback" or not text:
+        return False
+    if backend == "ask_dj":
+        return _ask_dj_configured(ask_dj)
+    if backend == "huggingface":
+        import huggingface_logic  # type: ignore
+
+        return not huggingface_logic.is_stub()
+    return True
+
+
+def _extract_text(result: Any) -> Optional[str]:
+    if isinstance(result, dict) and "text" in result:
+        return result["text"]
+    if isinstance(result, dict):
+        # If OpenAI-like response, extract best-effort content
+        return (
+            result.get("choices", [{}])[0]
+            .get("message", {})
+            .get("content", "")
+        ) or result.get("id", "ok")
+    return None
+
+
+def _ask_dj_configured(dj: Any) -> bool:
+    """True when a real DJ assistant is wired in, not the unpatched placeholder."""
+    fn = getattr(dj, "ai_ask", None)
+    if fn is None:
+        return False
+    return getattr(fn, "__func__", None) is not _AskDJNamespace.ai_ask
+
+
+def _backend_ask_dj(prompt: str, timeout: float) -> Optional[str]:
+    # Prefer an injected DJ assistant if patched in tests
+    # (this attribute may be created by patch with create=True)
+    dj = getattr(__import__(__name__), "ask_dj", None)
+    if not _ask_dj_configured(dj):
+        return None
+    result = dj.ai_ask(prompt)
+    if isinstance(result, dict) and "text" in result:
+        return result["text"]
+    return None
+
+
+def _backend_worker(prompt: str, timeout: float) -> Optional[str]:
+    import worker_logic  # type: ignore
+
+    return _extract_text(call_with_timeout(worker_logic.ask, prompt, timeout))
+
+
+def _backend_gemini(prompt: str, timeout: float) -> Optional[str]:
+    import gemini_logic  # type: ignore
+
+    result = call_with_timeout(gemini_logic.ask, prompt, timeout)
+    return result["text"] if isinstance(result, dict) and "text" in result else None
+
+
+def _backend_huggingface(prompt: str, timeout: float) -> Optional[str]:
+    import huggingface_logic  # type: ignore
+
+    result = call_with_timeout(huggingface_logic.ask, prompt, timeout)
+    return result["text"] if isinstance(result, dict) and "text" in result else None
+
+
+def _backend_self_hosted(prompt: str, timeout: float) -> Optional[str]:
+    import self_hosted_chat
+
+    return self_hosted_chat.answer(prompt, timeout)
+
+
+def _self_hosted_ready() -> bool:
+    """
+    Route to the local model only while Ollama reports it resident; a cold model
+    would spend the request's budget loading. Cold models are warmed in the background.
+    LLM_ROUTE_COLD=on routes to it regardless.
+    """
+    if not SELF_HOSTED_CHAT_AVAILABLE:
+        return False
+    if os.getenv("LLM_ROUTE_COLD", "off").lower() in {"on", "1", "true"}:
+        return True
+    if local_llm.is_warm():
+        return True
+    local_llm.warm_up_async()
+    return False
+
+
+def _ask_backends(include_cold: bool = False) -> List[Backend]:
+    """Backends in preference order (tests patch the underlying modules)."""
+    backends = [Backend("ask_dj", _backend_ask_dj)] if _ask_dj_configured(ask_dj) else []
+    if SELF_HOSTED_CHAT_AVAILABLE and (include_cold or _self_hosted_ready()):
+        # Local RAG + LLM goes before the paid APIs
+        backends.append(Backend("self_hosted", _backend_self_hosted))
+    return backends + [
+        Backend("worker_logic", _backend_worker),
+        Backend("gemini", _backend_gemini),
+        Backend("huggingface", _backend_huggingface),
+    ]
+
+
+def _single_chunk(fn: Any) -> Any:
+    """Adapt a non-streaming backend to the streaming chain (one chunk with the whole answer)."""
+    def run(prompt: str, timeout: float) -> Optional[List[str]]:
+        text = fn(prompt, timeout)
+        return None if text is None else [text]
+    return run
+
+
+def _stream_worker(prompt: str, timeout: float):
+    import worker_logic  # type: ignore
+
+    return worker_logic.ask_stream(prompt, timeout=timeout)
+
+
+def _stream_gemini(prompt: str, timeout: float):
+    import gemini_logic  # type: ignore
+
+    return gemini_logic.ask_stream(prompt, timeout=timeout)
+
+
+def _stream_huggingface(prompt: str, timeout: float):
+    import huggingface_logic  # type: ignore
+
+    return huggingface_logic.ask_stream(prompt, timeout=timeout)
+
+
+def _stream_self_hosted(prompt: str, timeout: float):
+    import self_hosted_chat
+
+    return self_hosted_chat.answer_stream(prompt, timeout)
+
+
+def _ask_stream_backends() -> List[StreamBackend]:
+    """Same order and names as _ask_backends(), so both share health and breakers."""
+    backends = [StreamBackend("ask_dj", _single_chunk(_backend_ask_dj))] if _ask_dj_configured(ask_dj) else []
+    if _self_hosted_ready():
+        backends.append(StreamBackend("self_hosted", _stream_self_hosted))
+    return backends + [
+        StreamBackend("worker_logic", _stream_worker),
+        StreamBackend("gemini", _stream_gemini),
+        StreamBackend("huggingface", _stream_huggingface),
+    ]
+
+
+def _parse_ask_request():
+    """Shared auth/validation for the ask routes: (question, optimized prompt, error response)."""
     user = _auth_user()
+    data = _json_or_400() if user and user.get("is_premium") else None
+    question, optimized_question, error = _check_ask(user, data)
+    if error is not None:
+        return None, None, (jsonify(error[0]), error[1])
+    g.ask_user, g.ask_data = user, data
+    return question, optimized_question, None
+
+
+def _check_ask(user: Optional[Dict[str, Any]], data: Any):
+    """
+    Framework-free core of _parse_ask_request() (also used by async_server):
+    (question, optimized prompt, (error body, status) or None).
+    """
     if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+        return None, None, ({"error": "Unauthorized"}, 401)
     if not user.get("is_premium"):
-        return jsonify({"error": "Premium required"}), 403
-
-    data = _json_or_400()
-    if data is None:
-        return jsonify({"error": "Invalid JSON"}), 400
+        return None, None, ({"error": "Premium required"}, 403)
+    if not isinstance(data, dict):
+        return None, None, ({"error": "Invalid JSON"}, 400)
 
     question = data.get("question", "")
     if not isinstance(question, str) or len(question.strip()) == 0:
-        return jsonify({"error": "question required"}), 400
+        return None, None, ({"error": "question required"}, 400)
     if len(question) > 1000:
-        return jsonify({"error": "question too long"}), 400
+        return None, None, ({"error": "question too long"}, 400)
 
     # Apply prompt optimization unless disabled by env var
     optimized_question = question
@@ -352,64 +854,348 @@ def ask_chat():
                 optimized_question = str(opt.get("prompt", question)) or question
     except Exception:
         optimized_question = question
+    return question, optimized_question, None
 
-    # Prefer an injected DJ assistant if patched in tests
-    text: Optional[str] = None
+
+# -------------------------
+# Chat sessions (opt-in per request: "session": true or "session_id": "...")
+# -------------------------
+
+_chat_sessions = SessionStore.from_env()
+
+
+def _chat_session() -> Optional[ChatSession]:
+    """The request's session (continued or new), or None for a stateless ask."""
+    data, user = g.ask_data, g.ask_user
+    session_id = data.get("session_id")
+    if not data.get("session") and not isinstance(session_id, str):
+        return None
+    return _chat_sessions.get_or_create(session_id if isinstance(session_id, str) else None, user["username"])
+
+
+def _prefetch_retrieve(text: str) -> str:
+    import self_hosted_chat
+
+    return self_hosted_chat.retrieve(text)
+
+
+_prefetcher = RetrievalPrefetcher.from_env(_prefetch_retrieve)
+
+
+def _prefetched(question: str, backends: List[Any]) -> Optional[str]:
+    """RAG context prefetched while the user typed this question (only if self_hosted may answer)."""
+    if not any(b.name == "self_hosted" for b in backends):
+        return None
+    return _prefetcher.lookup(g.ask_user["username"], question)
+
+
+def _prefetched_backends(backends: List[Any], retrieved: str, stream: bool = False) -> List[Any]:
+    """Bind prefetched context to the self-hosted backend so it skips embed and search."""
+    import self_hosted_chat
+
+    if stream:
+        return [
+            StreamBackend(b.name, lambda p, t: self_hosted_chat.answer_stream(p, t, retrieved=retrieved))
+            if b.name == "self_hosted" else b
+            for b in backends
+        ]
+    return [
+        Backend(b.name, lambda p, t: self_hosted_chat.answer(p, t, retrieved=retrieved))
+        if b.name == "self_hosted" else b
+        for b in backends
+    ]
+
+
+def _session_backends(
+    backends: List[Backend], session: ChatSession, prompt: str, turn: Dict[str, Any], retrieved: Optional[str] = None
+) -> List[Backend]:
+    """
+    Bind the self-hosted backend to the session: it continues from the stored
+    Ollama context (sending only `prompt`) and leaves the new context in `turn`.
+    Other backends get the compact history prompt from the executor as usual.
+    """
+    model = os.getenv("LLM_MODEL", "")
+    context = session.context if session.context_model == model else None
+
+    def self_hosted(history_prompt: str, timeout: float) -> Optional[str]:
+        import self_hosted_chat
+
+        text, new_context = self_hosted_chat.answer_turn(
+            prompt if context else history_prompt, timeout, context=context, retrieved=retrieved
+        )
+        turn["context"] = new_context
+        return text
+
+    return [Backend(b.name, self_hosted) if b.name == "self_hosted" else b for b in backends]
+
+
+def _record_turn(session: Optional[ChatSession], question: str, text: str, backend: str, turn: Dict[str, Any]) -> None:
+    if session is None or backend == "fallback":
+        return
+    context = turn.get("context") if backend == "self_hosted" else None
+    _chat_sessions.record(session, question, text, context=context, context_model=os.getenv("LLM_MODEL", ""))
+
+
+@app.route("/api/ask", methods=["POST"])
+def ask_chat():
+    question, optimized_question, error = _parse_ask_request()
+    if error:
+        return error
+
+    release, waited, rejected = _admit_ask()
+    if rejected:
+        return rejected
     try:
-        # This attribute may be created by patch with create=True
-        dj = getattr(__import__(__name__), "ask_dj", None)
-        if dj and hasattr(dj, "ai_ask"):
-            result = dj.ai_ask(optimized_question)
-            if isinstance(result, dict) and "text" in result:
-                text = result["text"]
-    except Exception:
-        text = None
-
-    if text is None:
-        # Try worker_logic first (tests patch this frequently)
-        try:
-            import worker_logic  # type: ignore
-
-            result = worker_logic.ask(optimized_question)
-            if isinstance(result, dict) and "text" in result:
-                text = result["text"]
-            elif isinstance(result, dict):
-                # If OpenAI-like response, extract best-effort content
-                text = (
-                    result.get("choices", [{}])[0]
-                    .get("message", {})
-                    .get("content", "")
-                ) or result.get("id", "ok")
-        except Exception:
-            text = None
-
-    if text is None:
-        # Try gemini_logic
-        try:
-            import gemini_logic  # type: ignore
-
-            result = gemini_logic.ask(optimized_question)
-            if isinstance(result, dict) and "text" in result:
-                text = result["text"]
-        except Exception:
-            text = None
-
-    if text is None:
-        # Try huggingface_logic
-        try:
-            import huggingface_logic  # type: ignore
-
-            result = huggingface_logic.ask(optimized_question)
-            if isinstance(result, dict) and "text" in result:
-                text = result["text"]
-        except Exception:
-            text = None
-
-    if text is None:
+        # Time spent in the admission queue counts against the ask deadline
+        return _answer_ask(question, optimized_question, time.monotonic() + ASK_DEADLINE - waited)
+    finally:
+        release()
+
+
+def _answer_ask(question: str, optimized_question: str, deadline: float):
+    chain_id = _ask_chain_id()
+    session = _chat_session()
+    follow_up = session is not None and session.is_follow_up
+    turn: Dict[str, Any] = {}
+    prompt = optimized_question
+    backends = _ask_backends()
+    retrieved = _prefetched(question, backends)
+    if session is not None:
+        prompt = _chat_sessions.history_prompt(session, optimized_question)
+        backends = _session_backends(backends, session, optimized_question, turn, retrieved)
+    elif retrieved is not None:
+        backends = _prefetched_backends(backends, retrieved)
+    # Follow-up answers depend on the conversation, so they bypass both caches
+    semantic = _semantic_cache_enabled() and not follow_up
+    semantic_hit = False
+    timing: Dict[str, Any] = {}
+
+    def compute() -> Optional[tuple]:
+        nonlocal semantic_hit
+        if semantic:
+            # Paraphrase of an answered question (embedding of the user's own words)
+            hit = _semantic_cache.lookup(question, chain_id)
+            if hit is not None:
+                semantic_hit = True
+                return hit[0], hit[1]
+        result = _ask_executor.run(backends, prompt, deadline)
+        if result is None:
+            return None
+        timing[result.backend] = result.elapsed
+        if semantic and _cacheable_answer((result.text, result.backend)):
+            _semantic_cache.store(question, chain_id, result.text, result.backend)
+        return result.text, result.backend
+
+    cache_status = "BYPASS"
+    faq = _faq_answer(question, follow_up)
+    if faq is not None:
+        answer, cache_status = faq, "FAQ"
+    elif _answer_cache_enabled() and not follow_up:
+        key = cache_key(optimized_question, chain_id)
+        answer, cache_status = _answer_cache.get_or_compute(
+            key,
+            compute,
+            wait=max(0.0, deadline - time.monotonic()),
+            cacheable=_cacheable_answer,
+            deadline=deadline,
+        )
+    else:
+        answer = compute()
+    if semantic_hit:
+        cache_status = "SEMANTIC"
+    if answer is not None:
+        text, backend = answer
+    else:
         # Final fallback content to satisfy tests when modules are missing
-        text = "Default fallback response"
+        text, backend = "Default fallback response", "fallback"
+    _record_turn(session, question, text, backend, turn)
+
+    resp = jsonify({"choices": [{"message": {"content": text}}]})
+    resp.headers["X-Ask-Backend"] = backend
+    resp.headers["X-Cache"] = cache_status
+    if timing:
+        # Which backend answered and how long it took (shown in browser dev tools)
+        resp.headers["Server-Timing"] = ", ".join(f"{name};dur={sec * 1000.0:.1f}" for name, sec in timing.items())
+    if session is not None:
+        resp.headers["X-Session-Id"] = session.id
+    return resp, 200
+
+
+@app.route("/api/ask/prefetch", methods=["POST"])
+def ask_prefetch():
+    """
+    Speculative retrieval for a question that is still being typed: the chat
+    widget posts partial text, retrieval runs debounced in the background and
+    a matching /api/ask reuses it (see prefetch.py). Always answers 202 at once.
+    """
+    user = _auth_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not user.get("is_premium"):
+        return jsonify({"error": "Premium required"}), 403
+    data = _json_or_400()
+    if data is None:
+        return jsonify({"error": "Invalid JSON"}), 400
+    text = data.get("question", "")
+    if not isinstance(text, str):
+        return jsonify({"error": "question required"}), 400
+    if len(text) > 1000:
+        return jsonify({"error": "question too long"}), 400
+    accepted = SELF_HOSTED_CHAT_AVAILABLE and _prefetcher.submit(user["username"], text)
+    return jsonify({"accepted": bool(accepted)}), 202
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/api/ask/stream", methods=["POST"])
+def ask_stream():
+    """
+    Server-Sent Events variant of /api/ask: "token" events carry text as it is
+    generated, then one "done" event carries the backend and timing metadata.
+    Cached answers are sent as a single token. Sessions work as in /api/ask,
+    using the compact history only (no Ollama context reuse while streaming).
+    """
+    question, optimized_question, error = _parse_ask_request()
+    if error:
+        return error
+
+    release, waited, rejected = _admit_ask()
+    if rejected:
+        return rejected
+    try:
+        resp = _stream_ask(question, optimized_question, time.monotonic() + ASK_DEADLINE - waited)
+    except BaseException:
+        release()
+        raise
+    # The admission slot is held until the stream is finished or the client goes away
+    resp.call_on_close(release)
+    return resp
+
+
+def _stream_ask(question: str, optimized_question: str, deadline: float) -> Response:
+    chain_id = _ask_chain_id()
+    key = cache_key(optimized_question, chain_id)
+    session = _chat_session()
+    follow_up = session is not None and session.is_follow_up
+    prompt = optimized_question if session is None else _chat_sessions.history_prompt(session, optimized_question)
+    use_cache = _answer_cache_enabled() and not follow_up
+    semantic = _semantic_cache_enabled() and not follow_up
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if session is not None:
+        headers["X-Session-Id"] = session.id
+
+    def events():
+        cached = _faq_answer(question, follow_up)
+        status = "FAQ" if cached is not None else "BYPASS"
+        if cached is None and use_cache:
+            cached, status = _answer_cache.get(key), "MISS"
+            status = "HIT" if cached else status
+        if cached is None and semantic:
+            hit = _semantic_cache.lookup(question, chain_id)
+            if hit is not None:
+                cached, status = (hit[0], hit[1]), "SEMANTIC"
+        if cached is not None:
+            _record_turn(session, question, cached[0], cached[1], {})
+            yield _sse("token", {"text": cached[0]})
+            yield _sse("done", {"backend": cached[1], "cache": status, "elapsed": 0.0, "ttft": 0.0})
+            return
+
+        backends = _ask_stream_backends()
+        retrieved = _prefetched(question, backends)
+        if retrieved is not None:
+            backends = _prefetched_backends(backends, retrieved, stream=True)
+        parts: List[str] = []
+        for kind, payload in _ask_executor.stream(backends, prompt, deadline):
+            if kind == "token":
+                parts.append(payload)
+                yield _sse("token", {"text": payload})
+                continue
+            meta = dict(payload, cache=status)
+            if meta["backend"] is None:
+                meta["backend"] = "fallback"
+                yield _sse("token", {"text": "Default fallback response"})
+            elif "error" not in meta:
+                text = "".join(parts)
+                if use_cache and _cacheable_answer((text, meta["backend"])):
+                    _answer_cache.set(key, text, meta["backend"])
+                if semantic and _cacheable_answer((text, meta["backend"])):
+                    _semantic_cache.store(question, chain_id, text, meta["backend"])
+                _record_turn(session, question, text, meta["backend"], {})
+            yield _sse("done", meta)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+
+# -------------------------
+# Admin
+# -------------------------
+
+def _admin_authorized() -> bool:
+    expected = os.getenv("ADMIN_TOKEN", "")
+    header = request.headers.get("Authorization", "")
+    if not expected or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(header[len("Bearer "):].strip(), expected)
+
+
+def _admin_denied():
+    """Error response for admin routes, or None when the caller may proceed."""
+    # Disabled unless ADMIN_TOKEN is configured
+    if not os.getenv("ADMIN_TOKEN"):
+        return jsonify({"error": "not found"}), 404
+    if not _admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def _batch_stats() -> Dict[str, Any]:
+    import huggingface_logic  # type: ignore
+
+    return {"huggingface": huggingface_logic.batch_stats(), "local_llm": local_llm.batch_stats()}
+
+
+def _gemini_stats() -> Dict[str, Any]:
+    import gemini_logic  # type: ignore
+
+    return gemini_logic.timing_stats()
+
+
+def _pipeline_stats() -> List[Dict[str, Any]]:
+    import huggingface_logic  # type: ignore
+
+    return huggingface_logic.pipeline_stats()
+
+
+@app.route("/api/admin/backends", methods=["GET"])
+def admin_backends():
+    denied = _admin_denied()
+    if denied:
+        return denied
+    health = _ask_executor.health
+    return jsonify({
+        "order": [b.name for b in health.order(_ask_backends())],
+        "backends": _ask_executor.snapshot(),
+        "upstream_http": http_client.stats(),
+        "batches": _batch_stats(),
+        "pipelines": _pipeline_stats(),
+        "gemini": _gemini_stats(),
+        "admission": _admission.stats(),
+    }), 200
+
 
-    return jsonify({"choices": [{"message": {"content": text}}]}), 200
+@app.route("/api/admin/cache", methods=["GET"])
+def admin_cache():
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        "answers": _answer_cache.stats(),
+        "semantic": _semantic_cache.stats(),
+        "faq": _faq_store.stats(),
+        "prefetch": _prefetcher.stats(),
+    }), 200
 
 
 # 404 handler
@@ -420,4 +1206,7 @@ def not_found(_e):
 
 if __name__ == "__main__":
     init_db()
+    # The debug reloader runs this block in both processes; prefetch only in the child
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")), debug=True)
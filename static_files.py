@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Request, Response, send_file
+
+# Static layer for the site files served by server.py.
+#
+# The public files are indexed once at startup (size, content hash, precompressed
+# siblings), so serving a hit needs no filesystem stat. Small files are kept in an
+# in-memory LRU; large media go through send_file so the WSGI server can use its
+# zero-copy file wrapper (sendfile) and honour Range requests.
+
+PUBLIC_EXTENSIONS = frozenset(
+    {
+        ".html", ".css", ".js", ".mjs", ".map", ".json", ".webmanifest", ".txt", ".xml",
+        ".ico", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".avif",
+        ".woff", ".woff2", ".ttf", ".otf", ".eot",
+        ".mp3", ".m3u", ".wav", ".flac", ".ogg", ".mp4", ".webm", ".peaks",
+    }
+)
+# Project/tooling directories that live next to the site but must never be served
+EXCLUDED_DIRS = frozenset(
+    {
+        "node_modules", "backend", "backend-new", "docker", "kubernetes", "monitoring",
+        "scripts", "src", "streaming-app", "tests", "workers-site", "data", "rag_store",
+        "images", "__pycache__",
+    }
+)
+EXCLUDED_FILES = frozenset(
+    {
+        "package.json", "package-lock.json", "tsconfig.json", "bundle.config.json",
+        "monitoring-report.json", "seo-enhancement-report.json", "SECURITY_FIX_REPORT.json",
+        "requirements.txt", "requirements-dev.txt", "requirements-python313.txt",
+        "requirements-security-fixed.txt", "constraints.txt", "runtime.txt",
+        "proposed_removals.txt", "setup_complete.txt", "eslint.config.js", "next.config.js",
+        "postcss.config.mjs", "tailwind.config.js",
+    }
+)
+# Must always be revalidated so clients pick up new deploys
+REVALIDATE_FILES = frozenset(
+    {"service-worker.js", "sw.js", "manifest.json", "asset-manifest.json", "image-manifest.json"}
+)
+# name.<8+ hex chars>.ext, as produced by scripts/import_assets.py --fingerprint
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+# Written by scripts/image_variants.py: original image -> width-stepped WebP/AVIF copies
+IMAGE_MANIFEST = "assets/images/image-manifest.json"
+IMAGE_FORMATS = (("avif", "image/avif"), ("webp", "image/webp"))
+# Browsers only send Sec-CH-Width after the server opts in with Accept-CH
+WIDTH_HINT = "Sec-CH-Width"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+HTML_CACHE = "no-cache"
+DEFAULT_CACHE = "public, max-age=3600"
+
+
+def is_public(rel_path: str) -> bool:
+    parts = rel_path.split("/")
+    if any(p.startswith(".") and p != ".well-known" for p in parts):
+        return False
+    if parts[0] in EXCLUDED_DIRS or parts[-1] in EXCLUDED_FILES:
+        return False
+    base = parts[-1]
+    for _, suffix in PRECOMPRESSED:
+        if base.endswith(suffix):
+            base = base[: -len(suffix)]
+    return os.path.splitext(base)[1].lower() in PUBLIC_EXTENSIONS
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:32]
+
+
+class StaticFile:
+    __slots__ = ("rel", "path", "size", "etag", "mimetype", "cache_control", "encodings")
+
+    def __init__(self, rel: str, path: str, size: int, etag: str):
+        self.rel = rel
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if FINGERPRINT_RE.search(rel):
+            self.cache_control = IMMUTABLE_CACHE
+        elif rel.endswith(".html") or rel.rsplit("/", 1)[-1] in REVALIDATE_FILES:
+            self.cache_control = HTML_CACHE
+        else:
+            self.cache_control = DEFAULT_CACHE
+        self.encodings: Dict[str, "StaticFile"] = {}
+
+
+class StaticIndex:
+    """Startup index of the public site files plus an in-memory cache of the small ones."""
+
+    def __init__(
+        self,
+        root: str,
+        max_cached_file: int = 256 * 1024,
+        max_cache_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.root = os.path.abspath(root)
+        self.max_cached_file = max_cached_file
+        self.max_cache_bytes = max_cache_bytes
+        self._files: Dict[str, StaticFile] = {}
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cached_bytes = 0
+        self._images: Dict[str, Dict[str, List[Tuple[int, str]]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, root: str) -> "StaticIndex":
+        return cls(
+            root,
+            max_cached_file=int(os.getenv("STATIC_MAX_CACHED_FILE", str(256 * 1024))),
+            max_cache_bytes=int(os.getenv("STATIC_CACHE_BYTES", str(64 * 1024 * 1024))),
+        )
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _walk(self) -> Iterable[str]:
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            rel_dir = "" if rel_dir == "." else rel_dir + "/"
+            dirnames[:] = [d for d in dirnames if is_public(rel_dir + d + "/x.html")]
+            for name in filenames:
+                rel = rel_dir + name
+                if is_public(rel):
+                    yield rel
+
+    def build(self) -> "StaticIndex":
+        files: Dict[str, StaticFile] = {}
+        for rel in self._walk():
+            entry = self._make_entry(rel)
+            if entry is not None:
+                files[rel] = entry
+        # Attach precompressed siblings (foo.js.br / foo.js.gz) to their originals
+        for rel, entry in list(files.items()):
+            for encoding, suffix in PRECOMPRESSED:
+                if rel.endswith(suffix) and rel[: -len(suffix)] in files:
+                    original = files[rel[: -len(suffix)]]
+                    entry.mimetype = original.mimetype
+                    entry.cache_control = original.cache_control
+                    original.encodings[encoding] = entry
+        images = self._load_image_manifest()
+        with self._lock:
+            self._files = files
+            self._images = images
+            self._bodies.clear()
+            self._cached_bytes = 0
+        return self
+
+    def _load_image_manifest(self) -> Dict[str, Dict[str, List[Tuple[int, str]]]]:
+        try:
+            with open(os.path.join(self.root, *IMAGE_MANIFEST.split("/")), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        images: Dict[str, Dict[str, List[Tuple[int, str]]]] = {}
+        for rel, entry in (raw or {}).items():
+            variants = {}
+            for fmt, items in (entry.get("variants") or {}).items():
+                steps = sorted((int(i["w"]), str(i["src"])) for i in items if i.get("src"))
+                if steps:
+                    variants[fmt] = steps
+            if variants:
+                images[rel] = variants
+        return images
+
+    def _pick_image_variant(self, rel: str, request: Request) -> Optional[str]:
+        """
+        Best variant of an image for this client: the first format from IMAGE_FORMATS
+        the Accept header allows, at the smallest width covering the requested one
+        (?w= or the Sec-CH-Width client hint; full width when unknown).
+        """
+        variants = self._images.get(rel)
+        if not variants:
+            return None
+        # Only explicit listings count: "*/*" must not turn into AVIF for clients without support
+        listed = {value for value, quality in request.accept_mimetypes if quality > 0}
+        fmt = next((f for f, mime in IMAGE_FORMATS if f in variants and mime in listed), None)
+        if fmt is None:
+            return None
+        steps = variants[fmt]
+        hint = request.args.get("w") or request.headers.get(WIDTH_HINT)
+        try:
+            want = int(float(hint)) if hint else 0
+        except ValueError:
+            want = 0
+        if want <= 0:
+            return steps[-1][1]
+        return next((src for w, src in steps if w >= want), steps[-1][1])
+
+    def _make_entry(self, rel: str) -> Optional[StaticFile]:
+        path = os.path.join(self.root, *rel.split("/"))
+        try:
+            size = os.path.getsize(path)
+            etag = _hash_file(path)
+        except OSError:
+            return None
+        return StaticFile(rel, path, size, etag)
+
+    def lookup(self, rel: str) -> Optional[StaticFile]:
+        entry = self._files.get(rel)
+        if entry is None and is_public(rel) and ".." not in rel.split("/"):
+            # Files added after startup are indexed on first hit
+            entry = self._make_entry(rel)
+            if entry is not None:
+                with self._lock:
+                    self._files[rel] = entry
+        return entry
+
+    def _body(self, entry: StaticFile) -> Optional[bytes]:
+        if entry.size > self.max_cached_file:
+            return None
+        with self._lock:
+            body = self._bodies.get(entry.rel)
+            if body is not None:
+                self._bodies.move_to_end(entry.rel)
+                return body
+        with open(entry.path, "rb") as f:
+            body = f.read()
+        with self._lock:
+            if entry.rel not in self._bodies:
+                self._bodies[entry.rel] = body
+                self._cached_bytes += len(body)
+                while self._cached_bytes > self.max_cache_bytes and self._bodies:
+                    _, old = self._bodies.popitem(last=False)
+                    self._cached_bytes -= len(old)
+        return body
+
+    def serve(self, rel: str, request: Request) -> Optional[Response]:
+        """Build the response for rel, or None when it is not a public site file."""
+        negotiated = rel in self._images
+        variant_rel = self._pick_image_variant(rel, request) if negotiated else None
+        entry = self.lookup(variant_rel) if variant_rel else None
+        if entry is None:
+            entry = self.lookup(rel)
+        if entry is None:
+            return None
+
+        chosen = entry
+        accepted = request.accept_encodings
+        for encoding, _ in PRECOMPRESSED:
+            variant = entry.encodings.get(encoding)
+            if variant is not None and accepted[encoding]:
+                chosen = variant
+                break
+
+        body = self._body(chosen)
+        if body is not None:
+            resp = Response(body, mimetype=entry.mimetype)
+        else:
+            resp = send_file(chosen.path, mimetype=entry.mimetype, conditional=False, etag=False)
+        resp.set_etag(entry.etag if chosen is entry else f"{entry.etag}-{chosen.rel.rsplit('.', 1)[1]}")
+        resp.headers["Cache-Control"] = entry.cache_control
+        if chosen is not entry:
+            resp.headers["Content-Encoding"] = next(e for e, v in entry.encodings.items() if v is chosen)
+        if entry.encodings:
+            resp.vary.add("Accept-Encoding")
+        if negotiated:
+            # The URL of the original image now varies by format and width
+            resp.vary.add("Accept")
+            resp.vary.add(WIDTH_HINT)
+            resp.headers["Cache-Control"] = DEFAULT_CACHE
+        if self._images and (negotiated or entry.mimetype == "text/html"):
+            # Ask the browser for the width hint on the page's later image requests
+            resp.headers["Accept-CH"] = WIDTH_HINT
+        return resp.make_conditional(request, accept_ranges=True, complete_length=chosen.size)
@@ -0,0 +1,47 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Manual clock for components that take a `clock` callable; set or bump `now`."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def app_client():
+    """Flask test client on a freshly reset server_improved app."""
+    import server_improved as si
+
+    si.app.config["TESTING"] = True
+    si.init_db()
+    with si.app.test_client() as c:
+        yield c
+
+
+@pytest.fixture
+def premium_user():
+    return "premium"
+
+
+@pytest.fixture
+def premium_client(app_client, premium_user):
+    """(client, auth headers) for a newly registered premium user named `premium_user`."""
+    token = app_client.post(
+        "/api/register", json={"username": premium_user, "password": "password123", "is_premium": True}
+    ).get_json()["token"]
+    return app_client, {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,84 @@
+import sys
+import os
+import threading
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from admission import AdmissionController, Rejected, TokenBucket  # noqa: E402
+
+
+def test_token_bucket_limits_each_key_and_refills(clock):
+    bucket = TokenBucket(rate=1.0, burst=2, clock=clock)
+    assert bucket.take("a") == 0 and bucket.take("a") == 0
+    assert bucket.take("a") == pytest.approx(1.0)
+    assert bucket.take("b") == 0
+    clock.now = 1.0
+    assert bucket.take("a") == 0
+
+
+def test_saturation_queues_then_sheds_with_503():
+    ctl = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.1, rate=100, burst=100)
+    assert ctl.acquire("a") == 0.0
+    # One waiter fits in the queue and times out; a second is refused immediately
+    errors = []
+    waiter = threading.Thread(target=lambda: errors.append(pytest.raises(Rejected, ctl.acquire, "b").value))
+    waiter.start()
+    time.sleep(0.02)
+    with pytest.raises(Rejected) as full:
+        ctl.acquire("c")
+    waiter.join()
+    assert full.value.status == 503 and errors[0].status == 503
+    # A slot freed while waiting is handed to the queued request
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(ctl.acquire("b")))
+    waiter.start()
+    time.sleep(0.02)
+    ctl.release(0.5)
+    waiter.join()
+    assert got and got[0] > 0
+    stats = ctl.stats()
+    assert stats["queue_full"] == 1 and stats["queue_timeout"] == 1 and stats["active"] == 1
+
+
+def test_ask_route_rate_limits_with_retry_after(monkeypatch, premium_client):
+    from unittest.mock import patch
+    import server_improved as si
+
+    monkeypatch.setenv("ASK_ADMISSION", "on")
+    monkeypatch.setattr(si, "_admission", AdmissionController(rate=1 / 60, burst=1))
+    c, headers = premium_client
+    with patch.object(si.ask_dj, "ai_ask", return_value={"text": "ok"}):
+        first = c.post("/api/ask", json={"question": "one"}, headers=headers)
+        second = c.post("/api/ask", json={"question": "two"}, headers=headers)
+    tracks = c.get("/api/tracks")
+    assert first.status_code == 200
+    assert second.status_code == 429 and int(second.headers["Retry-After"]) >= 1
+    assert tracks.status_code == 200
+    assert si._admission.stats()["active"] == 0
+
+
+def test_zero_rate_disables_the_limit_and_retry_after_stays_finite(monkeypatch):
+    monkeypatch.setenv("ASK_RATE_PER_MIN", "0")
+    ctl = AdmissionController.from_env()
+    for _ in range(50):
+        assert ctl.acquire("a") == 0.0
+        ctl.release(0.0)
+    assert Rejected(429, "rate limit exceeded", float("inf")).retry_after_header == "3600"
+    assert Rejected(503, "server busy", 0.2).retry_after_header == "1"
+
+
+def test_rejected_stream_is_turned_away_before_opening_a_session(monkeypatch, premium_client):
+    import server_improved as si
+
+    monkeypatch.setenv("ASK_ADMISSION", "on")
+    monkeypatch.setattr(si, "_admission", AdmissionController(max_concurrent=1, max_queue=0, rate=100, burst=100))
+    c, headers = premium_client
+    si._admission.acquire("someone else")
+    r = c.post("/api/ask/stream", json={"question": "hi", "session": True}, headers=headers)
+    si._admission.release(0.0)
+    assert r.status_code == 503 and "Retry-After" in r.headers
+    assert "X-Session-Id" not in r.headers and si._chat_sessions.stats()["active"] == 0
@@ -0,0 +1,113 @@
+import sys
+import os
+import threading
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import AnswerCache, cache_key  # noqa: E402
+
+
+def test_key_normalizes_prompt_and_includes_backend_identity():
+    assert cache_key("How much  does a\nbooking cost?", "a|b") == cache_key("how much does a booking cost?", "a|b")
+    assert cache_key("q", "a|b") != cache_key("q", "a|c")
+
+
+def test_ttl_and_lru_eviction():
+    now = [1000.0]
+    cache = AnswerCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", "A", "x")
+    cache.set("b", "B", "x")
+    assert cache.get("a") == ("A", "x")  # a is now most recent
+    cache.set("c", "C", "x")
+    assert cache.get("b") is None and cache.get("a") == ("A", "x")
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    AnswerCache(disk_path=path).set("k", "answer", "worker_logic")
+    fresh = AnswerCache(disk_path=path)
+    assert fresh.get("k") == ("answer", "worker_logic")
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_single_flight_shares_one_upstream_call():
+    cache = AnswerCache()
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(2)
+        return ("shared answer", "gemini")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute, wait=2))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ["MISS"] + ["SHARED"] * 4
+    assert cache.get_or_compute("k", compute) == (("shared answer", "gemini"), "HIT")
+    assert cache.stats()["hit_rate"] == round(5 / 6, 3)
+
+
+def test_ask_route_serves_repeat_question_from_cache(monkeypatch, premium_client):
+    from unittest.mock import patch
+    import server_improved as si
+
+    monkeypatch.setenv("ASK_CACHE", "on")
+    c, headers = premium_client
+    with patch.object(si.ask_dj, "ai_ask", return_value={"text": "cached answer"}) as dj:
+        first = c.post("/api/ask", json={"question": "How much is a booking?"}, headers=headers)
+        second = c.post("/api/ask", json={"question": "how much is a  booking?"}, headers=headers)
+    assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "HIT"
+    assert second.get_json()["choices"][0]["message"]["content"] == "cached answer"
+    assert second.headers["X-Ask-Backend"] == "ask_dj"
+    assert dj.call_count == 1
+
+
+def test_uncacheable_answers_are_not_stored():
+    cache = AnswerCache()
+    answer, status = cache.get_or_compute("k", lambda: ("canned", "fallback"), cacheable=lambda a: a[1] != "fallback")
+    assert answer == ("canned", "fallback") and status == "MISS"
+    assert cache.get("k") is None and cache.stats()["stores"] == 0
+
+
+def test_followers_wait_no_longer_than_the_leaders_deadline():
+    gate = threading.Event()
+    cache = AnswerCache()
+    deadline = time.monotonic() + 0.1
+    leader = threading.Thread(
+        target=cache.get_or_compute, args=("k", lambda: gate.wait(2) and ("late", "x")), kwargs={"deadline": deadline}
+    )
+    leader.start()
+    time.sleep(0.02)
+    start = time.monotonic()
+    answer, status = cache.get_or_compute("k", lambda: ("own", "y"), wait=5)
+    gate.set()
+    leader.join()
+    assert (answer, status) == (("own", "y"), "MISS")
+    assert time.monotonic() - start < 1
+
+
+def test_stub_pipeline_and_empty_answers_are_not_cacheable(monkeypatch):
+    import huggingface_logic
+    import server_improved as si
+
+    def stub(task, model=None):
+        return lambda prompt, **_: [{"generated_text": "fallback"}]
+
+    monkeypatch.setattr(huggingface_logic, "_stub_pipeline", stub)
+    monkeypatch.setattr(huggingface_logic, "pipeline", stub)
+    assert not si._cacheable_answer(("fallback", "huggingface"))
+    monkeypatch.setattr(huggingface_logic, "pipeline", lambda task, model=None: None)
+    assert si._cacheable_answer(("fallback", "huggingface"))
+    assert not si._cacheable_answer(("", "gemini"))
+    assert si._cacheable_answer(("an answer", "gemini"))
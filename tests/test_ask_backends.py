@@ -0,0 +1,170 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import patch  # noqa: E402
+
+from ask_backends import Backend, BackendExecutor  # noqa: E402
+
+
+def _sleepy(text, delay):
+    def fn(prompt, timeout):
+        time.sleep(min(delay, timeout))
+        return text
+    return fn
+
+
+def _boom(prompt, timeout):
+    raise RuntimeError("down")
+
+
+def test_fallback_runs_in_order_after_failure():
+    ex = BackendExecutor(default_hedge_delay=5)
+    res = ex.run([Backend("a", _boom), Backend("b", lambda p, t: "from b")], "q", time.monotonic() + 2)
+    assert res.text == "from b" and res.backend == "b" and not res.hedged
+
+
+def test_hedge_starts_when_primary_is_slow():
+    ex = BackendExecutor(default_hedge_delay=0.05)
+    start = time.monotonic()
+    res = ex.run([Backend("slow", _sleepy("slow", 2)), Backend("fast", _sleepy("fast", 0))], "q", start + 3)
+    assert res.backend == "fast" and res.hedged
+    assert time.monotonic() - start < 1
+
+
+def test_deadline_is_propagated_and_enforced():
+    seen = []
+
+    def record(prompt, timeout):
+        seen.append(timeout)
+        time.sleep(timeout + 0.05)
+        return "late"
+
+    ex = BackendExecutor(default_hedge_delay=5)
+    start = time.monotonic()
+    assert ex.run([Backend("a", record)], "q", start + 0.2) is None
+    assert 0 < seen[0] <= 0.2
+    assert time.monotonic() - start < 0.5
+
+
+def test_ask_route_uses_first_good_backend(premium_client):
+    import server_improved as si
+
+    c, headers = premium_client
+    with patch.object(si.ask_dj, "ai_ask", side_effect=RuntimeError("dj down")), patch(
+        "worker_logic.ask", return_value={"text": "worker answer"}
+    ):
+        r = c.post("/api/ask", json={"question": "hi"}, headers=headers)
+    assert r.status_code == 200
+    assert r.get_json()["choices"][0]["message"]["content"] == "worker answer"
+    assert r.headers["X-Ask-Backend"] == "worker_logic"
+
+
+def test_placeholder_dj_assistant_does_not_answer(premium_client):
+    c, headers = premium_client
+    with patch("worker_logic.ask", return_value={"text": "worker answer"}):
+        r = c.post("/api/ask", json={"question": "hi"}, headers=headers)
+    assert r.status_code == 200
+    assert r.get_json()["choices"][0]["message"]["content"] == "worker answer"
+    assert r.headers["X-Ask-Backend"] == "worker_logic"
+
+
+def test_open_breaker_skips_backend_and_fast_backend_is_preferred():
+    from ask_backends import HealthRegistry
+
+    ex = BackendExecutor(default_hedge_delay=5, health=HealthRegistry(failure_threshold=2, min_samples=3))
+    calls = []
+    flaky = Backend("flaky", lambda p, t: calls.append(p) or _boom(p, t))
+    chain = [flaky, Backend("slow", _sleepy("slow", 0.05)), Backend("fast", lambda p, t: "fast")]
+    for _ in range(3):
+        assert ex.run(chain, "q", time.monotonic() + 2).backend == "slow"
+    assert len(calls) == 2  # breaker opened after two failures
+    for _ in range(3):
+        ex.run([Backend("fast", lambda p, t: "fast")], "q", time.monotonic() + 2)
+    assert [b.name for b in ex.health.order(chain)] == ["fast", "slow"]
+
+
+def test_expired_deadline_skips_backend_without_calling_it():
+    calls = []
+    ex = BackendExecutor(default_hedge_delay=5)
+    res = ex.run([Backend("a", lambda p, t: calls.append(t) or "a")], "q", time.monotonic() + 0.01)
+    assert res is None and calls == []
+
+
+def test_call_overrunning_its_deadline_counts_as_failure(monkeypatch):
+    import threading
+    import ask_backends
+    from ask_backends import HealthRegistry
+
+    monkeypatch.setattr(ask_backends, "OVERDUE_GRACE", 0.0)
+    gate = threading.Event()
+    ex = BackendExecutor(default_hedge_delay=5, health=HealthRegistry(failure_threshold=1))
+    hung = Backend("hung", lambda p, t: gate.wait(2) and "late")
+    assert ex.run([hung], "q", time.monotonic() + 0.1) is None
+    res = ex.run([hung, Backend("ok", lambda p, t: "ok")], "q", time.monotonic() + 2)
+    gate.set()
+    assert res.backend == "ok"
+    stats = ex.snapshot()["hung"]
+    assert stats["overdue"] == 1 and stats["breaker"]["state"] == "open"
+
+
+def test_bulkhead_rejects_when_full():
+    import threading
+    from ask_backends import HealthRegistry
+
+    gate = threading.Event()
+    ex = BackendExecutor(default_hedge_delay=5, health=HealthRegistry(max_concurrency=1))
+    blocker = Backend("one", lambda p, t: gate.wait(t) and "held")
+    t = threading.Thread(target=ex.run, args=([blocker], "q", time.monotonic() + 2))
+    t.start()
+    time.sleep(0.1)
+    res = ex.run([blocker, Backend("other", lambda p, t: "other")], "q", time.monotonic() + 2)
+    gate.set()
+    t.join()
+    assert res.backend == "other"
+    assert ex.snapshot()["one"]["rejected"] == 1
+
+
+def test_stream_falls_back_until_first_chunk():
+    from ask_backends import StreamBackend
+
+    def broken(prompt, timeout):
+        raise RuntimeError("down")
+        yield  # pragma: no cover
+
+    ex = BackendExecutor()
+    events = list(ex.stream(
+        [StreamBackend("a", broken), StreamBackend("b", lambda p, t: None), StreamBackend("c", lambda p, t: iter(["he", "llo"]))],
+        "q",
+        time.monotonic() + 2,
+    ))
+    assert events[:2] == [("token", "he"), ("token", "llo")]
+    assert events[-1][0] == "done" and events[-1][1]["backend"] == "c"
+
+
+def test_ask_stream_route_emits_tokens_and_metadata(monkeypatch, premium_client):
+    import json
+    import requests_mock
+    import server_improved as si
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    c, headers = premium_client
+    body = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n" for piece in ("Hi ", "there")
+    ) + "data: [DONE]\n\n"
+    with requests_mock.Mocker() as m:
+        m.post("https://api.openai.com/v1/chat/completions", text=body)
+        with patch.object(si.ask_dj, "ai_ask", side_effect=RuntimeError("dj down")):
+            r = c.post("/api/ask/stream", json={"question": "hi"}, headers=headers)
+            raw = r.get_data(as_text=True)
+    assert r.mimetype == "text/event-stream"
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in raw.strip().split("\n\n")
+    ]
+    assert [e[1]["text"] for e in events if e[0] == "token"] == ["Hi ", "there"]
+    assert events[-1][0] == "done" and events[-1][1]["backend"] == "worker_logic"
+    assert m.last_request.json()["stream"] is True
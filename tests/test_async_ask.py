@@ -0,0 +1,104 @@
+import sys
+import os
+import asyncio
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import patch  # noqa: E402
+
+from ask_backends import AsyncBackend, BackendExecutor  # noqa: E402
+
+
+def test_run_async_hedges_and_cancels_loser():
+    cancelled = []
+
+    async def slow(prompt, timeout):
+        try:
+            await asyncio.sleep(2)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "slow"
+
+    async def fast(prompt, timeout):
+        return "fast"
+
+    async def main():
+        ex = BackendExecutor(default_hedge_delay=0.05)
+        res = await ex.run_async([AsyncBackend("slow", slow), AsyncBackend("fast", fast)], "q", time.monotonic() + 3)
+        await asyncio.sleep(0)
+        return res
+
+    res = asyncio.run(main())
+    assert res.backend == "fast" and res.hedged
+    assert cancelled == [True]
+
+
+def test_async_server_ask_shares_flask_auth(premium_client):
+    from aiohttp.test_utils import TestClient, TestServer
+    import async_server
+    import server_improved as si
+
+    _, headers = premium_client
+
+    async def main():
+        async with TestClient(TestServer(async_server.create_app())) as client:
+            denied = await client.post("/api/ask", json={"question": "hi"})
+            with patch.object(si.ask_dj, "ai_ask", return_value={"text": "async answer"}):
+                r = await client.post("/api/ask", json={"question": "hi"}, headers=headers)
+                return denied.status, r.status, await r.json(), r.headers["X-Ask-Backend"]
+
+    denied, status, body, backend = asyncio.run(main())
+    assert denied == 401
+    assert status == 200 and backend == "ask_dj"
+    assert body["choices"][0]["message"]["content"] == "async answer"
+
+
+def test_sessions_of_finished_loops_are_dropped():
+    import aio_client
+
+    async def grab():
+        return aio_client.session()
+
+    first = asyncio.run(grab())
+    # Closed on its own loop while asyncio.run shut it down, not left pooled
+    assert first.closed and not aio_client._sessions
+    second = asyncio.run(grab())
+    assert second.closed and first is not second
+    assert not aio_client._sessions and not aio_client._closers
+
+
+def test_async_server_shares_admission_and_single_flight(monkeypatch, premium_client):
+    from aiohttp.test_utils import TestClient, TestServer
+    from admission import AdmissionController
+    import async_server
+    import server_improved as si
+
+    monkeypatch.setenv("ASK_CACHE", "on")
+    monkeypatch.setenv("ASK_ADMISSION", "on")
+    monkeypatch.setattr(si, "_admission", AdmissionController(rate=1 / 60, burst=3))
+    _, headers = premium_client
+    calls = []
+
+    def slow_answer(prompt):
+        calls.append(prompt)
+        time.sleep(0.2)
+        return {"text": "shared"}
+
+    async def main():
+        async with TestClient(TestServer(async_server.create_app())) as client:
+            with patch.object(si.ask_dj, "ai_ask", side_effect=slow_answer):
+                asks = [client.post("/api/ask", json={"question": "same"}, headers=headers) for _ in range(2)]
+                first, second = await asyncio.gather(*asks)
+                statuses = sorted([first.headers["X-Cache"], second.headers["X-Cache"]])
+                await client.post("/api/ask", json={"question": "third"}, headers=headers)
+                limited = await client.post("/api/ask", json={"question": "fourth"}, headers=headers)
+                return statuses, limited.status, limited.headers.get("Retry-After")
+
+    statuses, limited, retry_after = asyncio.run(main())
+    assert len(calls) == 2  # "same" was asked upstream once; "third" once
+    assert statuses == ["MISS", "SHARED"]
+    assert limited == 429 and int(retry_after) >= 1
+    assert si._admission.stats()["active"] == 0
@@ -0,0 +1,103 @@
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher, QueueFull  # noqa: E402
+
+
+def test_concurrent_items_are_processed_as_one_batch():
+    seen = []
+
+    def process(items):
+        seen.append(list(items))
+        return [f"out:{i}" if i != "bad" else ValueError("bad item") for i in items]
+
+    batcher = MicroBatcher("t", process, max_batch=4, max_wait_ms=200)
+    results = {}
+
+    def call(item):
+        try:
+            results[item] = batcher.submit(item, timeout=2)
+        except ValueError as e:
+            results[item] = str(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in ("a", "b", "bad")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {"a": "out:a", "b": "out:b", "bad": "bad item"}
+    assert len(seen) == 1 and sorted(seen[0]) == ["a", "b", "bad"]
+    assert batcher.stats()["max_batch_seen"] == 3
+    batcher.close()
+
+
+def test_full_queue_applies_backpressure():
+    gate = threading.Event()
+    batcher = MicroBatcher("t", lambda items: gate.wait(2) and items, max_batch=1, max_wait_ms=0, max_queue=1)
+    first = batcher.submit_async("running")
+    time.sleep(0.05)  # worker picked up the first item and is blocked in process()
+    batcher.submit_async("queued")
+    with pytest.raises(QueueFull):
+        batcher.submit_async("rejected")
+    gate.set()
+    assert first.result(timeout=2) == "running"
+    assert batcher.stats()["rejected"] == 1
+    batcher.close()
+
+
+def test_huggingface_batches_through_one_pipeline_call(monkeypatch):
+    import huggingface_logic
+
+    calls = []
+
+    def fake_pipeline(task, model=None):
+        def run(prompts, **kw):
+            calls.append((list(prompts), kw))
+            return [[{"generated_text": f"gen:{p}"}] for p in prompts]
+        return run
+
+    monkeypatch.setattr(huggingface_logic, "pipeline", fake_pipeline)
+    monkeypatch.setattr(huggingface_logic, "HF_BATCH_SIZE", 2)
+    monkeypatch.setattr(huggingface_logic, "HF_BATCH_WAIT_MS", 500)
+    monkeypatch.setattr(huggingface_logic, "_batchers", {})
+    out = {}
+    threads = [
+        threading.Thread(target=lambda q=q: out.update({q: huggingface_logic.ask(q, model="m", timeout=2)["text"]}))
+        for q in ("one", "two")
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == {"one": "gen:one", "two": "gen:two"}
+    assert len(calls) == 1 and calls[0][1]["batch_size"] == 2
+    # The batch carries the callers' deadline as generate()'s max_time
+    assert 0 < calls[0][1]["max_time"] <= 2
+
+
+def test_huggingface_batching_pads_left_with_eos_when_tokenizer_has_no_pad_token(monkeypatch):
+    import huggingface_logic
+
+    class Tokenizer:
+        pad_token = None
+        eos_token = "<|endoftext|>"
+        padding_side = "right"
+
+    class Pipeline:
+        tokenizer = Tokenizer()
+
+        def __call__(self, prompts, **kw):
+            # transformers refuses to batch without a pad token
+            assert self.tokenizer.pad_token is not None and self.tokenizer.padding_side == "left"
+            return [[{"generated_text": f"gen:{p}"}] for p in prompts]
+
+    monkeypatch.setattr(huggingface_logic, "pipeline", lambda task, model=None: Pipeline())
+    assert huggingface_logic.ask_batch(["a", "b"], model="gpt2") == ["gen:a", "gen:b"]
+    assert Pipeline.tokenizer.pad_token == "<|endoftext|>"
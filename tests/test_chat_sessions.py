@@ -0,0 +1,52 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_sessions import SessionStore  # noqa: E402
+
+
+def test_store_is_bounded_expires_and_checks_owner(clock):
+    store = SessionStore(max_sessions=2, ttl=60, clock=clock)
+    a, b = store.create("alice"), store.create("alice")
+    assert store.get(a.id, "bob") is None
+    assert store.get(a.id, "alice") is a  # a is now most recent
+    store.create("alice")
+    assert store.get(b.id, "alice") is None and store.stats()["evicted"] == 1
+    clock.now = 61
+    assert store.get(a.id, "alice") is None and store.stats()["expired"] == 1
+    assert store.get_or_create(a.id, "alice").id != a.id
+
+
+def test_history_is_compact_and_context_is_capped():
+    store = SessionStore(max_turns=2, max_answer_chars=5, max_context_tokens=3)
+    s = store.create("alice")
+    assert store.history_prompt(s, "q1") == "q1"
+    store.record(s, "q1", "first answer", context=[1, 2, 3], context_model="m")
+    assert s.context == [1, 2, 3] and s.context_model == "m"
+    store.record(s, "q2", "a2", context=[1, 2, 3, 4], context_model="m")
+    assert s.context is None and store.stats()["context_dropped"] == 1
+    store.record(s, "q3", "a3", context=[1], context_model="m")
+    store.record(s, "q4", "a4")  # answered remotely: local context no longer covers the conversation
+    assert s.context is None
+    prompt = store.history_prompt(s, "q5")
+    assert prompt.startswith("Conversation so far:") and prompt.endswith("New question:\nq5")
+    assert "q3" in prompt and "q2" not in prompt
+
+
+def test_ask_route_continues_a_session_with_history(premium_client):
+    from unittest.mock import patch
+    import server_improved as si
+
+    c, headers = premium_client
+    with patch.object(si.ask_dj, "ai_ask", return_value={"text": "Friday works."}) as dj:
+        first = c.post("/api/ask", json={"question": "Are you free Friday?", "session": True}, headers=headers)
+        session_id = first.headers["X-Session-Id"]
+        second = c.post("/api/ask", json={"question": "And Saturday?", "session_id": session_id}, headers=headers)
+        plain = c.post("/api/ask", json={"question": "And Saturday?"}, headers=headers)
+    assert second.headers["X-Session-Id"] == session_id
+    assert "X-Session-Id" not in plain.headers
+    follow_up = dj.call_args_list[1][0][0]
+    assert "Conversation so far:" in follow_up and "Friday works." in follow_up
+    assert "Conversation so far:" not in dj.call_args_list[2][0][0]
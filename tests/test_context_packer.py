@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context_packer as cp  # noqa: E402
+from context_packer import Passage  # noqa: E402
+
+
+def _words(start, stop):
+    return " ".join(f"w{i}" for i in range(start, stop))
+
+
+def test_overlapping_neighbours_are_stitched_and_duplicates_dropped():
+    passages = [
+        Passage(_words(0, 100), "site/bookings.html", 0.8, 4),
+        Passage(_words(80, 180), "site/bookings.html", 0.9, 5),
+        Passage(_words(80, 180), "crawled/bookings.txt", 0.7, 12),
+        Passage(_words(10, 20), "site/bookings.html", 0.5, 4),
+    ]
+    merged = cp.merge_passages(passages)
+    assert len(merged) == 1
+    assert merged[0].text == _words(0, 180) and merged[0].score == 0.9
+
+
+def test_pack_respects_token_budget_and_keeps_best_sentences():
+    cp.set_tokenizer(lambda text: len(text.split()))
+    try:
+        filler = " ".join(f"Filler sentence number {i} about nothing." for i in range(40))
+        passages = [
+            Passage(filler + " Booking rates start at 500 euro.", "rates.html", 0.9, 1),
+            Passage(filler, "about.html", 0.5, 9),
+        ]
+        context = cp.pack(passages, query="What do booking rates cost?", budget=40)
+        assert cp.count_tokens(context) <= 40
+        assert "Booking rates start at 500 euro." in context
+        assert context.startswith("[Source: rates.html]")
+        stats = cp.pack_stats()
+        assert stats["tokens_out"] <= 40 < stats["tokens_in"]
+    finally:
+        cp.set_tokenizer(None)
+        cp.reset_stats()
+
+
+def test_token_counts_are_cached():
+    calls = []
+    cp.set_tokenizer(lambda text: calls.append(text) or len(text.split()))
+    try:
+        assert cp.count_tokens("one two three") == 3
+        assert cp.count_tokens("one two three") == 3
+        assert len(calls) == 1
+    finally:
+        cp.set_tokenizer(None)
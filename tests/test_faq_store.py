@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faq_store  # noqa: E402
+from faq_store import FaqStore, make_entry, write_entries  # noqa: E402
+
+
+def test_lookup_normalizes_and_skips_answers_from_an_old_index(tmp_path):
+    path = str(tmp_path / "faq.json")
+    version = {"current": "v1"}
+    write_entries(path, {
+        faq_store.faq_key("How much does a booking cost?"): make_entry("How much does a booking cost?", "From 500 euro.", "worker_logic"),
+        faq_store.faq_key("Which genres?"): make_entry("Which genres?", "Techno and house.", "self_hosted", "v1"),
+    })
+    store = FaqStore(path, version=lambda: version["current"], check_interval=0)
+    assert store.lookup("how much does a booking cost") == ("From 500 euro.", "worker_logic")
+    assert store.lookup("Which  genres ?") == ("Techno and house.", "self_hosted")
+    version["current"] = "v2"
+    assert store.lookup("Which genres?") is None
+    assert store.lookup("Something else") is None
+    assert store.stats() == {"hits": 2, "misses": 2, "stale": 1, "reloads": 1, "entries": 2, "enabled": True}
+
+
+def test_precompute_job_is_incremental(tmp_path, monkeypatch):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+    import huggingface_logic
+    import precompute_faq
+
+    source = tmp_path / "questions.txt"
+    source.write_text("Book a DJ?\nbook a dj\nWhat genres?\nRare one\n", encoding="utf-8")
+    out = str(tmp_path / "faq.json")
+    batches = []
+    monkeypatch.setenv("PROMPT_OPTIMIZER", "off")
+    monkeypatch.setattr(huggingface_logic, "ask_batch", lambda prompts: batches.append(prompts) or [f"A:{p}" for p in prompts])
+    argv = ["precompute_faq.py", str(source), "--backend", "hf", "--min-count", "1", "--out", out]
+    monkeypatch.setattr(sys, "argv", argv)
+    assert precompute_faq.main() == 0
+    assert batches == [["Book a DJ?", "What genres?", "Rare one"]]
+    assert FaqStore(out).lookup("BOOK A DJ") == ("A:Book a DJ?", "huggingface")
+
+    source.write_text("Book a DJ?\nNew question\n", encoding="utf-8")
+    assert precompute_faq.main() == 0
+    assert batches[-1] == ["New question"]
+
+
+def test_ask_route_serves_precomputed_answer_without_backends(tmp_path, monkeypatch, premium_client):
+    from unittest.mock import patch
+    import server_improved as si
+
+    path = str(tmp_path / "faq.json")
+    write_entries(path, {faq_store.faq_key("Do you play techno?"): make_entry("Do you play techno?", "Yes!", "worker_logic")})
+    monkeypatch.setenv("FAQ_ANSWERS", "on")
+    monkeypatch.setattr(si, "_faq_store", FaqStore(path))
+    c, headers = premium_client
+    with patch.object(si.ask_dj, "ai_ask", return_value={"text": "live"}) as dj:
+        resp = c.post("/api/ask", json={"question": "do you play techno"}, headers=headers)
+    assert resp.get_json()["choices"][0]["message"]["content"] == "Yes!"
+    assert resp.headers["X-Cache"] == "FAQ" and resp.headers["X-Ask-Backend"] == "worker_logic"
+    assert dj.call_count == 0
@@ -0,0 +1,86 @@
+import sys
+import os
+import threading
+import time
+from unittest.mock import MagicMock, call, patch
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gemini_logic  # noqa: E402
+
+
+def test_configured_model_is_reused_across_calls(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "k1")
+    gemini_logic.reset()
+    with patch("gemini_logic.genai") as genai:
+        genai.GenerativeModel.return_value.generate_content.return_value = MagicMock(text="hi")
+        assert gemini_logic.ask("q1") == {"text": "hi"}
+        assert gemini_logic.ask("q2") == {"text": "hi"}
+        genai.configure.assert_called_once_with(api_key="k1")
+        genai.GenerativeModel.assert_called_once_with("gemini-pro", system_instruction=gemini_logic.SYSTEM_PROMPT)
+        assert genai.GenerativeModel.return_value.generate_content.call_count == 2
+        # A different key reconfigures the process-wide client; the model is shared
+        gemini_logic.ask("q3", api_key="k2")
+        assert genai.configure.call_args_list[-1] == call(api_key="k2")
+        assert genai.GenerativeModel.call_count == 1
+    stats = gemini_logic.timing_stats()
+    assert stats["calls"] == 3 and stats["model_builds"] == 1 and stats["p50_ms"] is not None
+
+
+def test_key_switch_waits_for_calls_with_the_previous_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "k1")
+    gemini_logic.reset()
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    with patch("gemini_logic.genai") as genai:
+        configured = {}
+        genai.configure.side_effect = lambda api_key: configured.update(key=api_key)
+
+        def generate(question, **_):
+            seen.append((question, configured["key"]))
+            if question == "slow":
+                started.set()
+                release.wait(2)
+            return MagicMock(text=question)
+
+        genai.GenerativeModel.return_value.generate_content.side_effect = generate
+        slow = threading.Thread(target=gemini_logic.ask, args=("slow",))
+        slow.start()
+        started.wait(2)
+        other = threading.Thread(target=gemini_logic.ask, args=("other",), kwargs={"api_key": "k2"})
+        other.start()
+        time.sleep(0.05)
+        # The k2 call may not reconfigure under the k1 call still in flight
+        assert configured["key"] == "k1" and len(seen) == 1
+        release.set()
+        slow.join()
+        other.join()
+    assert seen == [("slow", "k1"), ("other", "k2")]
+    gemini_logic.reset()
+
+
+def test_stream_yields_chunks_and_records_ttft(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "k1")
+    gemini_logic.reset()
+    with patch("gemini_logic.genai") as genai:
+        generate = genai.GenerativeModel.return_value.generate_content
+        generate.return_value = iter([MagicMock(text="Hel"), MagicMock(text=""), MagicMock(text="lo")])
+        assert list(gemini_logic.ask_stream("q", timeout=5)) == ["Hel", "lo"]
+        generate.assert_called_once_with("q", stream=True, request_options={"timeout": 5})
+    assert gemini_logic.timing_stats()["stream_ttft_p50_ms"] is not None
+    gemini_logic.reset()
+
+
+def test_timeout_bounds_the_request_only_when_given(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "k1")
+    gemini_logic.reset()
+    with patch("gemini_logic.genai") as genai:
+        generate = genai.GenerativeModel.return_value.generate_content
+        generate.return_value = MagicMock(text="hi")
+        gemini_logic.ask("q")
+        generate.assert_called_with("q")
+        gemini_logic.ask("q", timeout=2.5)
+        generate.assert_called_with("q", request_options={"timeout": 2.5})
+    gemini_logic.reset()
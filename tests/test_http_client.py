@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests_mock  # noqa: E402
+
+import http_client  # noqa: E402
+
+
+def test_get_retries_on_503_and_records_stats(monkeypatch):
+    http_client.close_all()
+    monkeypatch.setattr(http_client.time, "sleep", lambda _s: None)
+    with requests_mock.Mocker() as m:
+        m.get(
+            "https://upstream.test/data",
+            [{"status_code": 503}, {"status_code": 200, "json": {"ok": True}}],
+        )
+        resp = http_client.get("https://upstream.test/data", timeout=1)
+        assert resp.json() == {"ok": True}
+        assert m.call_count == 2
+    stats = http_client.stats()["https://upstream.test"]
+    assert stats["requests"] == 2
+    assert stats["errors"] == 1
+    assert stats["retries"] == 1
+    assert stats["p95_ms"] is not None
+
+
+def test_post_is_not_retried(monkeypatch):
+    http_client.close_all()
+    monkeypatch.setattr(http_client.time, "sleep", lambda _s: None)
+    with requests_mock.Mocker() as m:
+        m.post("https://upstream.test/gen", status_code=503)
+        resp = http_client.post("https://upstream.test/gen", json={})
+        assert resp.status_code == 503
+        assert m.call_count == 1
+
+
+def test_session_is_reused_per_host():
+    http_client.close_all()
+    with requests_mock.Mocker() as m:
+        m.get("https://a.test/x", json={})
+        m.get("https://b.test/x", json={})
+        http_client.get("https://a.test/x")
+        http_client.get("https://a.test/x")
+        http_client.get("https://b.test/x")
+    assert set(http_client._sessions) == {"https://a.test", "https://b.test"}
+
+
+def test_worker_logic_uses_pooled_client(monkeypatch):
+    import worker_logic
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    with requests_mock.Mocker() as m:
+        m.post("https://api.openai.com/v1/chat/completions", json={"id": "cmpl-1"})
+        assert worker_logic.ask("hi")["id"] == "cmpl-1"
+        assert m.last_request.headers["Authorization"] == "Bearer sk-test"
+    assert "https://api.openai.com" in http_client.stats()
+
+
+def test_retries_stop_at_callers_timeout(monkeypatch):
+    http_client.close_all()
+    clock = [0.0]
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(http_client.time, "sleep", lambda s: clock.__setitem__(0, clock[0] + s))
+    monkeypatch.setattr(http_client, "backoff_delay", lambda *a, **kw: 0.6)
+    with requests_mock.Mocker() as m:
+        m.get("https://upstream.test/slow", status_code=503)
+        resp = http_client.get("https://upstream.test/slow", timeout=1, retries=5)
+        assert resp.status_code == 503
+        assert m.call_count == 2
+
+
+def test_expired_budget_still_sends_a_positive_timeout():
+    http_client.close_all()
+    with requests_mock.Mocker() as m:
+        m.post("https://upstream.test/gen", json={})
+        http_client.post("https://upstream.test/gen", timeout=0.0)
+        assert all(t > 0 for t in m.last_request.timeout)
@@ -0,0 +1,79 @@
+import sys
+import os
+import threading
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huggingface_logic  # noqa: E402
+
+
+def _fake_factory(loads):
+    def fake_pipeline(task, model=None):
+        loads.append(model)
+        time.sleep(0.05)
+
+        def run(prompt, **_kw):
+            return [{"generated_text": f"{model}:{prompt}"}]
+        return run
+    return fake_pipeline
+
+
+def test_pipeline_is_built_once_per_model_even_under_concurrency(monkeypatch):
+    loads = []
+    monkeypatch.setattr(huggingface_logic, "pipeline", _fake_factory(loads))
+    huggingface_logic.clear_pipelines()
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(huggingface_logic.ask("hi", model="m")["text"])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == ["m:hi"] * 4 and loads == ["m"]
+    (entry,) = huggingface_logic.pipeline_stats()
+    assert entry["model"] == "m" and entry["hits"] == 3 and entry["load_ms"] >= 50
+
+
+def test_least_recently_used_pipeline_is_evicted(monkeypatch):
+    loads = []
+    monkeypatch.setattr(huggingface_logic, "pipeline", _fake_factory(loads))
+    monkeypatch.setattr(huggingface_logic, "HF_MAX_PIPELINES", 2)
+    huggingface_logic.clear_pipelines()
+    huggingface_logic.preload(["a", "b"])
+    huggingface_logic.ask("q", model="a")
+    huggingface_logic.ask("q", model="c")
+    assert [e["model"] for e in huggingface_logic.pipeline_stats()] == ["a", "c"]
+    huggingface_logic.ask("q", model="b")
+    assert loads == ["a", "b", "c", "b"]
+    huggingface_logic.clear_pipelines()
+
+
+def test_timeout_becomes_max_time_for_pipelines_that_take_kwargs(monkeypatch):
+    seen = []
+
+    def fake_pipeline(task, model=None):
+        def run(prompt, **kw):
+            seen.append(kw)
+            return [{"generated_text": "ok"}]
+        return run
+
+    monkeypatch.setattr(huggingface_logic, "pipeline", fake_pipeline)
+    huggingface_logic.clear_pipelines()
+    assert huggingface_logic.ask("hi", timeout=3.0) == {"text": "ok"}
+    assert huggingface_logic.ask("hi") == {"text": "ok"}
+    assert seen == [{"max_time": 3.0}, {}]
+    huggingface_logic.clear_pipelines()
+
+
+def test_start_background_preloads_hf_preload_models(monkeypatch):
+    import server_improved as si
+
+    loaded = threading.Event()
+    monkeypatch.setenv("HF_PRELOAD", "tiny-model")
+    monkeypatch.setattr(si, "SELF_HOSTED_CHAT_AVAILABLE", False)
+    monkeypatch.setattr(si, "start_youtube_prefetch", lambda: False)
+    monkeypatch.setattr(si, "start_websub", lambda: False)
+    monkeypatch.setattr(huggingface_logic, "get_pipeline", lambda task, model: loaded.set() if model == "tiny-model" else None)
+    assert si.start_background()["hf_preload"] is True
+    assert loaded.wait(2)
@@ -0,0 +1,72 @@
+import sys
+import os
+import io
+import json
+
+import pytest
+
+# Ensure project root and scripts/ are on path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from flask import Flask, request  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import image_variants  # noqa: E402
+from static_files import StaticIndex  # noqa: E402
+
+pytestmark = pytest.mark.skipif("webp" not in image_variants.available_formats(), reason="Pillow without WebP")
+
+
+def _site(tmp_path):
+    images = tmp_path / "assets" / "images"
+    images.mkdir(parents=True)
+    Image.new("RGB", (800, 400), (200, 30, 30)).save(images / "hero.png")
+    (tmp_path / "index.html").write_text("<img src='/assets/images/hero.png'>")
+    return images
+
+
+def test_variants_and_manifest_are_incremental(tmp_path):
+    images = _site(tmp_path)
+    first = image_variants.build_variants(images, widths=(320, 640, 1280), workers=1, site_root=tmp_path)
+    manifest = json.loads((images / image_variants.MANIFEST_NAME).read_text())
+    webp = manifest["assets/images/hero.png"]["variants"]["webp"]
+    assert [v["w"] for v in webp] == [320, 640, 800]  # never upscaled
+    with Image.open(tmp_path / webp[0]["src"]) as im:
+        assert im.size == (320, 160) and im.format == "WEBP"
+    assert first["written"] == 3 * len(first["formats"])
+    assert image_variants.build_variants(images, widths=(320, 640, 1280), workers=1, site_root=tmp_path)["written"] == 0
+
+
+def test_sources_outside_the_root_are_skipped(tmp_path):
+    images = _site(tmp_path)
+    outside = tmp_path.parent / (tmp_path.name + "-elsewhere.png")
+    Image.new("RGB", (10, 10)).save(outside)
+    (images / "linked.png").symlink_to(outside)
+    summary = image_variants.build_variants(images, widths=(320,), workers=1, site_root=tmp_path)
+    assert summary["sources"] == 1
+    with pytest.raises(ValueError):
+        image_variants.build_variants(images, site_root=tmp_path / "assets" / "css")
+
+
+def test_server_negotiates_format_and_width(tmp_path):
+    images = _site(tmp_path)
+    image_variants.build_variants(images, widths=(320, 640), workers=1, site_root=tmp_path)
+    index = StaticIndex(str(tmp_path)).build()
+    app = Flask(__name__)
+
+    @app.route("/<path:filename>")
+    def files(filename):
+        return index.serve(filename, request) or ("missing", 404)
+
+    client = app.test_client()
+    plain = client.get("/assets/images/hero.png")
+    assert plain.mimetype == "image/png"
+    small = client.get("/assets/images/hero.png", headers={"Accept": "image/webp,*/*", "Sec-CH-Width": "300"})
+    assert small.mimetype == "image/webp"
+    with Image.open(io.BytesIO(small.data)) as im:
+        assert im.width == 320
+    assert {v.strip() for v in small.headers["Vary"].split(",")} == {"Accept", "Sec-CH-Width"}
+    assert small.headers["Accept-CH"] == "Sec-CH-Width"
+    assert client.get("/index.html").headers["Accept-CH"] == "Sec-CH-Width"
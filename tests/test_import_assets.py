@@ -0,0 +1,76 @@
+import sys
+import os
+import json
+
+# Ensure scripts/ is on path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from import_assets import MANIFEST_NAME, copy_assets  # noqa: E402
+
+
+def _source(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "logo.png").write_bytes(b"\x89PNG same bytes")
+    (src / "sub" / "logo-copy.png").write_bytes(b"\x89PNG same bytes")
+    (src / "site.css").write_text("body { color: red; }\n" * 50)
+    return src
+
+
+def test_default_keeps_names_and_rebuild_is_incremental(tmp_path):
+    src, dest = _source(tmp_path), tmp_path / "assets"
+    first = copy_assets(src, dest)
+    assert (dest / "images" / "logo.png").exists()
+    assert (dest / "images" / "sub" / "logo-copy.png").exists()
+    assert (dest / "css" / "site.css.gz").exists()
+    assert not (dest / MANIFEST_NAME).exists()
+    assert first["copied"] == 3
+    again = copy_assets(src, dest)
+    assert again["copied"] == 0 and again["skipped"] == 3
+
+
+def test_fingerprint_manifest_dedupes_identical_blobs(tmp_path):
+    src, dest = _source(tmp_path), tmp_path / "assets"
+    summary = copy_assets(src, dest, fingerprint=True)
+    manifest = json.loads((dest / MANIFEST_NAME).read_text())
+    assert summary["deduped"] == 1
+    assert manifest["images/logo.png"] == manifest["images/sub/logo-copy.png"]
+    assert manifest["images/logo.png"].startswith("images/logo.") and (dest / manifest["images/logo.png"]).exists()
+
+
+def test_prune_removes_outputs_of_changed_sources(tmp_path):
+    src, dest = _source(tmp_path), tmp_path / "assets"
+    copy_assets(src, dest, fingerprint=True)
+    old = json.loads((dest / MANIFEST_NAME).read_text())
+    (src / "site.css").write_text("body { color: blue; }\n" * 50)
+    copy_assets(src, dest, fingerprint=True, prune=True)
+    new = json.loads((dest / MANIFEST_NAME).read_text())
+    assert new["css/site.css"] != old["css/site.css"]
+    assert not (dest / old["css/site.css"]).exists()
+    assert not (dest / (old["css/site.css"] + ".gz")).exists()
+    assert (dest / new["css/site.css"]).exists()
+
+
+def test_prune_keeps_files_the_build_did_not_write(tmp_path):
+    src, dest = _source(tmp_path), tmp_path / "assets"
+    copy_assets(src, dest)
+    variant = dest / "images" / "variants" / "logo.320.0123456789.webp"
+    variant.parent.mkdir(parents=True)
+    variant.write_bytes(b"webp")
+    (dest / "images" / "image-manifest.json").write_text("{}")
+    (src / "sub" / "logo-copy.png").unlink()
+    copy_assets(src, dest, prune=True)
+    assert not (dest / "images" / "sub" / "logo-copy.png").exists()
+    assert variant.exists() and (dest / "images" / "image-manifest.json").exists()
+
+
+def test_replaced_source_with_older_mtime_refreshes_precompressed_copies(tmp_path):
+    import gzip
+
+    src, dest = _source(tmp_path), tmp_path / "assets"
+    copy_assets(src, dest)
+    css = src / "site.css"
+    css.write_text("body { color: blue; }\n" * 50)
+    os.utime(css, ns=(1_000_000_000, 1_000_000_000))  # e.g. restored from an archive
+    copy_assets(src, dest)
+    assert gzip.decompress((dest / "css" / "site.css.gz").read_bytes()) == css.read_bytes()
@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests_mock  # noqa: E402
+
+import local_llm  # noqa: E402
+
+OLLAMA = "http://ollama.test:11434"
+
+
+def test_requests_carry_keep_alive_and_status_reads_api_ps(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", f"{OLLAMA}/api/generate")
+    monkeypatch.setenv("LLM_MODEL", "llama3:8b-instruct")
+    monkeypatch.setattr(local_llm, "LLM_KEEP_ALIVE", "45m")
+    with requests_mock.Mocker() as m:
+        m.post(f"{OLLAMA}/api/generate", json={"response": " hi "})
+        m.get(f"{OLLAMA}/api/ps", json={"models": [{"name": "llama3:8b-instruct", "expires_at": "2030-01-01T00:00:00Z"}]})
+        assert local_llm.call_local_llm("sys", "user", timeout=5) == "hi"
+        assert m.last_request.json()["keep_alive"] == "45m"
+        status = local_llm.model_status()
+    assert status["reachable"] and status["resident"]
+    assert status["expires_at"] == "2030-01-01T00:00:00Z"
+
+
+def test_warm_up_loads_model_without_prompt(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", f"{OLLAMA}/api/generate")
+    monkeypatch.setenv("LLM_MODEL", "mistral")
+    with requests_mock.Mocker() as m:
+        gen = m.post(f"{OLLAMA}/api/generate", json={"done": True})
+        m.get(f"{OLLAMA}/api/ps", json={"models": [{"name": "mistral:latest"}]})
+        assert local_llm.warm_up(timeout=5)
+        assert "prompt" not in gen.last_request.json()
+        assert local_llm.is_warm()
+
+
+def test_cold_model_is_reported_and_probe_runs_in_background(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", f"{OLLAMA}/api/generate")
+    monkeypatch.setattr(local_llm, "_status", {})
+    with requests_mock.Mocker() as m:
+        m.get(f"{OLLAMA}/api/ps", json={"models": []})
+        assert local_llm.is_warm() is False  # unknown yet: treated as cold, probe started
+        for _ in range(50):
+            if local_llm._status:
+                break
+            time.sleep(0.01)
+    assert local_llm._status["reachable"] and not local_llm._status["resident"]
+
+
+def test_batches_share_one_thread_pool(monkeypatch):
+    def fake(system, user, timeout=120):
+        if user == "bad":
+            raise RuntimeError("down")
+        return user.upper()
+
+    monkeypatch.setattr(local_llm, "call_local_llm", fake)
+    out = local_llm._run_batch([("s", "a", 1), ("s", "bad", 1)])
+    assert out[0] == "A" and isinstance(out[1], RuntimeError)
+    pool = local_llm._batch_pool
+    assert local_llm._run_batch([("s", "b", 1), ("s", "c", 1)]) == ["B", "C"]
+    assert pool is not None and local_llm._batch_pool is pool
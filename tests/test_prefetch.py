@@ -0,0 +1,70 @@
+import sys
+import os
+import threading
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefetch import RetrievalPrefetcher  # noqa: E402
+
+
+def _wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_typing_is_debounced_to_one_retrieval_and_reused_for_near_match():
+    seen = []
+    pf = RetrievalPrefetcher(lambda text: seen.append(text) or f"ctx:{text}", debounce=0.05)
+    for partial in ("What does a", "What does a booking", "What does a booking cost"):
+        pf.submit("alice", partial)
+    assert _wait_for(lambda: pf.stats()["retrieved"] == 1)
+    time.sleep(0.1)
+    assert seen == ["What does a booking cost"]
+    assert pf.lookup("alice", "What does a booking cost?") == "ctx:What does a booking cost"
+    assert pf.lookup("alice", "Which genres do you play?") is None
+    assert pf.lookup("bob", "What does a booking cost?") is None
+    stats = pf.stats()
+    assert stats["superseded"] == 2 and stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_one_retrieval_in_flight_per_user():
+    release = threading.Event()
+    running = []
+
+    def slow(text):
+        running.append(text)
+        release.wait(2)
+        return text
+
+    pf = RetrievalPrefetcher(slow, debounce=0.0, workers=4)
+    pf.submit("alice", "first question text")
+    assert _wait_for(lambda: len(running) == 1)
+    pf.submit("alice", "second question text")
+    pf.submit("alice", "third question text")
+    time.sleep(0.1)
+    assert running == ["first question text"]
+    release.set()
+    assert _wait_for(lambda: pf.stats()["retrieved"] == 2)
+    assert running == ["first question text", "third question text"]
+
+
+def test_prefetch_route_accepts_only_when_self_hosted_is_available(monkeypatch, premium_client, premium_user):
+    import server_improved as si
+
+    c, headers = premium_client
+    monkeypatch.setattr(si, "SELF_HOSTED_CHAT_AVAILABLE", False)
+    off = c.post("/api/ask/prefetch", json={"question": "How much is a boo"}, headers=headers)
+    monkeypatch.setattr(si, "SELF_HOSTED_CHAT_AVAILABLE", True)
+    monkeypatch.setattr(si, "_prefetcher", RetrievalPrefetcher(lambda text: "ctx", debounce=0.0))
+    on = c.post("/api/ask/prefetch", json={"question": "How much is a boo"}, headers=headers)
+    anon = c.post("/api/ask/prefetch", json={"question": "How much is a boo"})
+    assert off.status_code == 202 and off.get_json() == {"accepted": False}
+    assert on.status_code == 202 and on.get_json() == {"accepted": True}
+    assert anon.status_code == 401
+    assert _wait_for(lambda: si._prefetcher.lookup(premium_user, "How much is a boo") == "ctx")
@@ -57,3 +57,55 @@ def test_empty_input_yields_prefix_only_or_nonempty_prompt():
     # Should still be non-empty and include the guidance prefix
     assert isinstance(prompt, str) and len(prompt) > 0
     assert "Answer concisely" in prompt
+
+
+def test_dutch_keywords_and_substring_matching():
+    assert po.optimize("Geef een lijst met de beste house mixes")["meta"]["strategy"].endswith(":bullets")
+    assert po.optimize("Wat zijn de voor- en nadelen van vinyl?")["meta"]["strategy"].endswith(":bullets")
+    # Keywords match inside words, as the original `in` scan did
+    assert po._detect_intent_style("desktop speakers") == "bullets"
+    assert po._detect_intent_style("wanneer speel je weer?") == "brief"
+
+
+def test_token_budget_mode_truncates_by_tokens():
+    long_q = "track " * 1000
+    res = po.optimize(long_q, max_len=100000, max_tokens=50)
+    assert res["meta"]["truncated"] is True
+    assert res["meta"]["tokens"] <= 50 and po.count_tokens(res["prompt"]) == res["meta"]["tokens"]
+    assert res["prompt"].startswith("Answer concisely")
+    short = po.optimize("What is techno?", max_tokens=50)
+    assert short["meta"]["truncated"] is False and short["prompt"] == po.optimize("What is techno?")["prompt"]
+
+
+def test_pluggable_tokenizer_and_cached_encodings():
+    calls = []
+
+    class CharTokenizer:
+        def encode(self, text):
+            calls.append(text)
+            return tuple(range(1, len(text) + 1))
+
+        def decode_prefix(self, text, encoding, n):
+            return text[:n]
+
+    po.set_tokenizer(CharTokenizer())
+    try:
+        res = po.optimize("x" * 500, max_len=100000, max_tokens=120)
+        assert len(res["prompt"]) <= 120 and res["meta"]["tokens"] == len(res["prompt"])
+        before = len(calls)
+        po._optimize.cache_clear()
+        po.optimize("x" * 500, max_len=100000, max_tokens=120)
+        # Prefix and question encodings come from the cache on the second run
+        assert len(calls) - before <= 1
+    finally:
+        po.set_tokenizer(None)
+
+
+def test_memo_returns_independent_copies():
+    po.clear_memo()
+    first = po.optimize("Best DJ sets?")
+    first["meta"]["strategy"] = "mutated"
+    first["prompt"] = "mutated"
+    second = po.optimize("Best DJ sets?")
+    assert second["prompt"] != "mutated" and second["meta"]["strategy"].endswith(":bullets")
+    assert po.memo_stats()["optimize"]["hits"] >= 1
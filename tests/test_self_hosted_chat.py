@@ -0,0 +1,70 @@
+import sys
+import os
+import time
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import self_hosted_chat as shc  # noqa: E402
+
+
+def _fail(*_args):
+    raise ImportError("not installed")
+
+
+def test_slow_retrieval_degrades_to_no_context(monkeypatch):
+    shc.reset_stats()
+    monkeypatch.setattr(shc, "_detect", lambda text: "nl")
+    monkeypatch.setattr(shc, "_embed", lambda text: time.sleep(0.5) or [[0.0]])
+    monkeypatch.setitem(shc.STAGE_BUDGETS, "embed", 0.05)
+    start = time.monotonic()
+    system, user, meta = shc.prepare("Answer concisely.\n\nwat kost een boeking", time.monotonic() + 10)
+    assert time.monotonic() - start < 0.3
+    assert meta == {
+        "detect": "ok", "language": "nl", "embed": "timeout", "search": "skipped", "context": False, "retrieved": ""
+    }
+    assert system == shc.SYSTEM_PROMPTS["nl"]
+    assert shc.stage_stats()["embed"]["timeout"] == 1
+
+
+def test_missing_stack_falls_back_to_heuristics_and_context_is_added(monkeypatch):
+    monkeypatch.setattr(shc, "_detect", _fail)
+    monkeypatch.setattr(shc, "_embed", lambda text: [[1.0]])
+    monkeypatch.setattr(shc, "_search", lambda vec, query: "[Source: bookings.html]\nRates vary by event.")
+    system, _, meta = shc.prepare("hoeveel kost een boeking voor een feest", time.monotonic() + 10)
+    assert meta["language"] == "nl" and meta["detect"] == "error" and meta["context"]
+    assert system.endswith("Rates vary by event.")
+    assert shc.guess_language("How much does a booking cost?") == "en"
+
+
+def test_stages_are_skipped_when_only_generation_time_is_left(monkeypatch):
+    calls = []
+    monkeypatch.setattr(shc, "_detect", lambda text: calls.append("detect") or "en")
+    _, _, meta = shc.prepare("hello", time.monotonic() + shc.GENERATE_RESERVE - 0.1)
+    assert meta["detect"] == meta["embed"] == "skipped" and not calls
+
+
+def test_prefetched_context_skips_embed_and_search(monkeypatch):
+    monkeypatch.setattr(shc, "_detect", lambda text: "en")
+    monkeypatch.setattr(shc, "_embed", lambda text: (_ for _ in ()).throw(AssertionError("embedded")))
+    system, _user, meta = shc.prepare("How much is a booking?", time.monotonic() + 10, retrieved="Rates vary.")
+    assert meta["embed"] == meta["search"] == "prefetched"
+    assert system.endswith("Rates vary.")
+
+
+def test_start_background_warms_retrieval_and_model(monkeypatch):
+    import threading
+    import local_llm
+    import server_improved as si
+
+    warmed = threading.Event()
+    monkeypatch.setattr(si, "SELF_HOSTED_CHAT_AVAILABLE", True)
+    monkeypatch.setattr(si, "start_youtube_prefetch", lambda: False)
+    monkeypatch.setattr(si, "start_websub", lambda: False)
+    monkeypatch.setattr(shc, "warm_up", warmed.set)
+    monkeypatch.setattr(local_llm, "start_keepalive", lambda: True)
+    started = si.start_background()
+    assert warmed.wait(2)
+    assert started == {
+        "youtube_prefetch": False, "websub": False, "hf_preload": False, "rag_warmup": True, "llm_keepalive": True
+    }
@@ -0,0 +1,75 @@
+import sys
+import os
+
+import numpy as np
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache  # noqa: E402
+
+# Toy embedder: bag of known words, L2-normalized
+_VOCAB = ["booking", "cost", "price", "dj", "mix", "genre", "techno"]
+_SYNONYMS = {"price": "cost", "fee": "cost"}
+
+
+def _embed(texts):
+    rows = []
+    for text in texts:
+        v = np.zeros(len(_VOCAB), dtype="float32")
+        for w in text.lower().replace("?", "").split():
+            w = _SYNONYMS.get(w, w)
+            if w in _VOCAB:
+                v[_VOCAB.index(w)] += 1
+        rows.append(v / (np.linalg.norm(v) or 1))
+    return np.stack(rows)
+
+
+def _cache(**kw):
+    version = kw.pop("version", lambda: "v1")
+    return SemanticCache(threshold=0.9, embed=_embed, version=version, **kw)
+
+
+def test_paraphrase_hits_and_unrelated_misses():
+    cache = _cache()
+    cache.store("What does a booking cost?", "chain", "About 500 EUR", "gemini")
+    assert cache.lookup("booking price?", "chain")[:2] == ("About 500 EUR", "gemini")
+    assert cache.lookup("which techno genre?", "chain") is None
+    assert cache.lookup("booking cost", "other-chain") is None
+
+
+def test_ttl_and_lru_keep_index_in_step():
+    now = [0.0]
+    cache = _cache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.store("booking cost", "c", "a1", "x")
+    cache.store("dj mix", "c", "a2", "x")
+    cache.store("techno genre", "c", "a3", "x")
+    stats = cache.stats()
+    assert stats["entries"] == stats["vectors"] == 2
+    assert cache.lookup("booking cost", "c") is None
+    now[0] = 11
+    assert cache.lookup("dj mix", "c") is None
+    assert cache.stats()["vectors"] == 0
+
+
+def test_rag_rebuild_invalidates():
+    version = ["v1"]
+    cache = _cache(version=lambda: version[0])
+    cache.store("booking cost", "c", "old answer", "x")
+    version[0] = "v2"
+    assert cache.lookup("booking cost", "c") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_missing_rag_store_is_not_reimported_per_lookup():
+    calls = []
+
+    def version():
+        calls.append(1)
+        raise ImportError("No module named 'faiss'")
+
+    cache = _cache(version=version)
+    cache.store("booking cost", "c", "answer", "x")
+    for _ in range(3):
+        assert cache.lookup("booking cost", "c")[0] == "answer"
+    assert len(calls) == 1
@@ -0,0 +1,69 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gzip  # noqa: E402
+
+from flask import Flask, request  # noqa: E402
+
+from static_files import IMMUTABLE_CACHE, StaticIndex  # noqa: E402
+
+
+def _app(root, **kwargs):
+    index = StaticIndex(str(root), **kwargs).build()
+    app = Flask(__name__)
+
+    @app.route("/<path:filename>")
+    def files(filename):
+        return index.serve(filename, request) or ("missing", 404)
+
+    return app.test_client(), index
+
+
+def test_precompressed_sibling_and_etag(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('hi');" * 50)
+    (tmp_path / "app.js.gz").write_bytes(gzip.compress((tmp_path / "app.js").read_bytes()))
+    client, _ = _app(tmp_path)
+
+    plain = client.get("/app.js")
+    assert plain.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+    etag = plain.headers["ETag"]
+
+    gz = client.get("/app.js", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gz.headers["Content-Type"].startswith("text/javascript")
+    assert "Accept-Encoding" in gz.headers["Vary"]
+    assert gz.headers["ETag"] != etag
+
+    assert client.get("/app.js", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_fingerprinted_assets_are_immutable(tmp_path):
+    (tmp_path / "style.0123abcd.css").write_text("body{}")
+    (tmp_path / "page.html").write_text("<p>x</p>")
+    client, _ = _app(tmp_path)
+    assert client.get("/style.0123abcd.css").headers["Cache-Control"] == IMMUTABLE_CACHE
+    assert client.get("/page.html").headers["Cache-Control"] == "no-cache"
+
+
+def test_large_files_stream_and_support_ranges(tmp_path):
+    (tmp_path / "big.png").write_bytes(b"\x89PNG" + b"0" * 5000)
+    client, index = _app(tmp_path, max_cached_file=1024)
+    r = client.get("/big.png", headers={"Range": "bytes=0-9"})
+    assert r.status_code == 206
+    assert r.data == b"\x89PNG000000"
+    assert index._cached_bytes == 0
+
+
+def test_private_files_are_not_served(tmp_path):
+    (tmp_path / "server.py").write_text("secret")
+    (tmp_path / ".env").write_text("KEY=1")
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "scripts" / "x.js").write_text("x")
+    client, index = _app(tmp_path)
+    assert len(index) == 0
+    for path in ("/server.py", "/.env", "/scripts/x.js"):
+        assert client.get(path).status_code == 404
@@ -0,0 +1,57 @@
+import sys
+import os
+import wave
+
+import numpy as np
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import waveform  # noqa: E402
+
+
+def test_compute_peaks_levels_and_blockwise_match():
+    x = np.sin(np.linspace(0, 40 * np.pi, 100_003)).astype(np.float32) * np.linspace(0, 1, 100_003, dtype=np.float32)
+    whole = waveform.compute_peaks(x, levels=(16, 64))
+    assert whole[16].shape == (16, 2) and whole[64].dtype == np.int8
+    assert whole[16][0, 0] <= 0 <= whole[16][0, 1] and whole[16][-1, 1] > 120
+    blocks = (x[i : i + 777] for i in range(0, x.size, 777))
+    streamed = waveform.compute_peaks_blocks(blocks, x.size, levels=(16, 64))
+    for n in (16, 64):
+        assert np.array_equal(whole[n], streamed[n])
+
+
+def test_blob_round_trip_and_level_selection():
+    peaks = waveform.compute_peaks(np.linspace(-1, 1, 5000), levels=(8, 32))
+    blob = waveform.encode_blob(peaks)
+    assert waveform.decode_levels(blob)[0][0] == 8
+    bins, body = waveform.select_level(blob, 10)
+    assert bins == 32 and body == peaks[32].tobytes()
+    assert waveform.select_level(blob, 4) == (8, peaks[8].tobytes())
+    assert waveform.select_level(blob, 1000)[0] == 32  # largest when none is big enough
+
+
+def test_build_and_serve_peaks_route(tmp_path, monkeypatch):
+    import server_improved as si
+
+    monkeypatch.setattr(waveform, "PEAKS_DIR", str(tmp_path / "peaks"))
+    monkeypatch.setattr(waveform, "BLOCK_FRAMES", 1000)
+    audio = tmp_path / "mix.wav"
+    samples = (np.sin(np.linspace(0, 200 * np.pi, 44100)) * 20000).astype("<i2")
+    with wave.open(str(audio), "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(44100)
+        wf.writeframes(np.repeat(samples, 2).tobytes())
+    os.makedirs(waveform.PEAKS_DIR)
+    assert waveform.build_one(("mix", str(audio), False)) == ("mix", "written")
+    assert waveform.build_one(("mix", str(audio), False)) == ("mix", "skipped")
+
+    si.app.config["TESTING"] = True
+    with si.app.test_client() as c:
+        r = c.get("/api/tracks/mix/peaks?res=300")
+        assert r.status_code == 200
+        assert r.headers["X-Peaks-Bins"] == "1024" and len(r.data) == 2048
+        assert c.get("/api/tracks/mix/peaks", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+        assert c.get("/api/tracks/other/peaks").status_code == 404
+        assert c.get("/api/tracks/mix/peaks?res=x").status_code == 400
@@ -0,0 +1,104 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server_improved as si  # noqa: E402
+from websub import LocalHub, parse_notification, topic_for  # noqa: E402
+
+
+def _setup(monkeypatch, secret="s3cret"):
+    si.app.config["TESTING"] = True
+    si.init_db()
+    monkeypatch.setattr(si._websub, "callback_url", "http://localhost" + si.WEBSUB_CALLBACK_PATH)
+    monkeypatch.setattr(si._websub, "secret", secret)
+    monkeypatch.setenv("WEBSUB_REFRESH", "sync")
+    client = si.app.test_client()
+    hub = LocalHub(client, si.WEBSUB_CALLBACK_PATH)
+    return client, hub
+
+
+def test_verification_only_for_requested_topics(monkeypatch):
+    client, hub = _setup(monkeypatch)
+    si._websub.request("UCabc", post=hub.post)
+    assert hub.verify_all()
+    assert si._websub.is_subscribed("UCabc")
+
+    r = client.get(
+        si.WEBSUB_CALLBACK_PATH,
+        query_string={"hub.mode": "subscribe", "hub.topic": topic_for("UCother"), "hub.challenge": "x"},
+    )
+    assert r.status_code == 404
+
+
+def test_notification_refreshes_only_affected_channel(monkeypatch):
+    client, hub = _setup(monkeypatch)
+    version = {"n": 1}
+    monkeypatch.setattr(si, "get_latest_videos", lambda cid: {"videos": [{"id": f"{cid}-{version['n']}"}]})
+    si._websub.request("UCabc", post=hub.post)
+    assert hub.verify_all()
+
+    assert client.get("/api/youtube?channel_id=UCabc").get_json()["videos"][0]["id"] == "UCabc-1"
+    assert client.get("/api/youtube?channel_id=UCzzz").get_json()["videos"][0]["id"] == "UCzzz-1"
+
+    version["n"] = 2
+    assert hub.publish("UCabc", video_id="v2").status_code == 204
+    assert client.get("/api/youtube?channel_id=UCabc").get_json()["videos"][0]["id"] == "UCabc-2"
+    # Other channels keep their cached entry
+    assert client.get("/api/youtube?channel_id=UCzzz").get_json()["videos"][0]["id"] == "UCzzz-1"
+
+
+def test_bad_signature_is_ignored(monkeypatch):
+    client, hub = _setup(monkeypatch)
+    si.app.extensions["cache"].set("yt:UCabc", {"videos": []})
+    r = client.post(
+        si.WEBSUB_CALLBACK_PATH,
+        data=b"<feed xmlns='http://www.w3.org/2005/Atom'/>",
+        headers={"X-Hub-Signature": "sha1=deadbeef"},
+    )
+    assert r.status_code == 202
+    assert si.app.extensions["cache"].get("yt:UCabc") == {"videos": []}
+
+
+def test_disabled_without_secret(monkeypatch):
+    client, hub = _setup(monkeypatch, secret="")
+    assert not si._websub.enabled
+    assert client.post(si.WEBSUB_CALLBACK_PATH, data=b"<feed/>").status_code == 404
+    r = client.get(si.WEBSUB_CALLBACK_PATH, query_string={"hub.mode": "subscribe", "hub.topic": topic_for("UCabc")})
+    assert r.status_code == 404
+
+
+def test_notification_for_unsubscribed_channel_is_ignored(monkeypatch):
+    client, hub = _setup(monkeypatch)
+    si._websub.request("UCabc", post=hub.post)
+    assert hub.verify_all()
+    si.app.extensions["cache"].set("yt:UCother", {"videos": []})
+    hub.subscriptions[topic_for("UCother")] = dict(hub.subscriptions[topic_for("UCabc")])
+    assert hub.publish("UCother").status_code == 204
+    assert si.app.extensions["cache"].get("yt:UCother") == {"videos": []}
+
+
+def test_async_refreshes_are_deduplicated(monkeypatch):
+    import threading
+
+    client, hub = _setup(monkeypatch)
+    monkeypatch.setenv("WEBSUB_REFRESH", "async")
+    gate, calls = threading.Event(), []
+    monkeypatch.setattr(si._yt_prefetcher, "_refresh", lambda cid: calls.append(cid) or gate.wait(2))
+    si._websub.request("UCabc", post=hub.post)
+    assert hub.verify_all()
+    for _ in range(3):
+        assert hub.publish("UCabc").status_code == 204
+    gate.set()
+    si._websub_refresh_pool.submit(lambda: None).result(timeout=2)
+    assert calls == ["UCabc"]
+
+
+def test_parse_deleted_entry():
+    body = (
+        b'<feed xmlns="http://www.w3.org/2005/Atom" xmlns:at="http://purl.org/atompub/tombstones/1.0">'
+        b'<at:deleted-entry ref="yt:video:x"><at:by><name>n</name>'
+        b"<uri>https://www.youtube.com/channel/UCdel</uri></at:by></at:deleted-entry></feed>"
+    )
+    assert parse_notification(body) == {"UCdel"}
@@ -0,0 +1,136 @@
+import sys
+import os
+
+# Ensure project root is on path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from resilience import CircuitBreaker, NegativeCache  # noqa: E402
+from youtube_service import QuotaCounter, SEARCH_LIST_COST, YouTubeGuard, YouTubeUnavailable  # noqa: E402
+
+
+def _failing(_channel_id):
+    raise RuntimeError("boom")
+
+
+def test_breaker_opens_and_half_opens(clock):
+    br = CircuitBreaker("t", failure_threshold=2, reset_timeout=10, clock=clock)
+    br.record_failure()
+    assert br.state == "closed"
+    br.record_failure()
+    assert br.state == "open"
+    assert not br.allow()
+    clock.now += 10
+    assert br.allow()  # single half-open trial
+    assert not br.allow()
+    br.record_failure()
+    # failed trial doubles the reset timeout
+    assert br.retry_after() == pytest.approx(20)
+    clock.now += 20
+    assert br.allow()
+    br.record_success()
+    assert br.state == "closed"
+
+
+def test_negative_cache_embargoes_channel(clock):
+    guard = YouTubeGuard(
+        breaker=CircuitBreaker("yt", failure_threshold=10, clock=clock),
+        negative=NegativeCache(base=5, clock=clock),
+    )
+    calls = []
+
+    def fetch(cid):
+        calls.append(cid)
+        raise RuntimeError("timeout")
+
+    with pytest.raises(RuntimeError):
+        guard.fetch("abc", fetch)
+    with pytest.raises(YouTubeUnavailable):
+        guard.fetch("abc", fetch)
+    assert calls == ["abc"]
+    clock.now += 10
+    with pytest.raises(RuntimeError):
+        guard.fetch("abc", fetch)
+    assert len(calls) == 2
+
+
+def test_quota_counter_blocks_when_spent():
+    quota = QuotaCounter(daily_limit=SEARCH_LIST_COST)
+    guard = YouTubeGuard(quota=quota)
+    assert guard.fetch("a", lambda cid: {"videos": []}) == {"videos": []}
+    with pytest.raises(YouTubeUnavailable):
+        guard.fetch("b", lambda cid: {"videos": []})
+    assert quota.remaining() == 0
+
+
+def test_route_serves_last_known_good(monkeypatch):
+    import server_improved as si
+
+    si.app.config["TESTING"] = True
+    si.init_db()
+    monkeypatch.setattr(si, "get_latest_videos", lambda cid: {"videos": [{"id": "v1", "title": "Mix"}]})
+    with si.app.test_client() as c:
+        assert c.get("/api/youtube?channel_id=chan").status_code == 200
+        si.app.extensions["cache"].clear()  # simulate TTL expiry
+        monkeypatch.setattr(si, "get_latest_videos", _failing)
+        r = c.get("/api/youtube?channel_id=chan")
+        assert r.status_code == 200
+        assert r.get_json()["videos"][0]["id"] == "v1"
+        assert "Warning" in r.headers
+
+
+def test_route_returns_503_with_retry_after_when_embargoed(monkeypatch):
+    import server_improved as si
+
+    si.app.config["TESTING"] = True
+    si.init_db()
+    monkeypatch.setattr(si, "get_latest_videos", _failing)
+    with si.app.test_client() as c:
+        assert c.get("/api/youtube?channel_id=x").status_code == 500
+        r = c.get("/api/youtube?channel_id=x")
+        assert r.status_code == 503
+        assert int(r.headers["Retry-After"]) >= 1
+
+
+def test_prefetch_schedule_spreads_channels_and_respects_budget():
+    from youtube_service import YouTubePrefetcher
+
+    # 10 channels * 100 units every 60s would be 1.44M units/day; budget stretches it
+    pf = YouTubePrefetcher([f"c{i}" for i in range(10)], refresh=lambda c: None, interval=60, quota_budget=10_000)
+    assert pf.interval == pytest.approx(10 * 100 * 86400 / 10_000)
+    times = [t for t, _ in pf.schedule(0.0)]
+    slot = pf.interval / 10
+    for i, t in enumerate(times):
+        assert abs(t - i * slot) <= 0.1 * slot + 1e-9
+
+
+def test_prefetch_warm_up_fills_cache(monkeypatch):
+    import server_improved as si
+
+    si.app.config["TESTING"] = True
+    si.init_db()
+    calls = []
+
+    def fetch(cid):
+        calls.append(cid)
+        return {"videos": [{"id": cid, "title": "t"}]}
+
+    monkeypatch.setattr(si, "get_latest_videos", fetch)
+    monkeypatch.setattr(si._yt_prefetcher, "channels", ["warm1", "warm2"])
+    assert si._yt_prefetcher.warm_up() == 2
+    with si.app.test_client() as c:
+        assert c.get("/api/youtube?channel_id=warm1").status_code == 200
+    assert sorted(calls) == ["warm1", "warm2"]
+
+
+def test_youtube_search_is_not_retried_at_http_level():
+    import requests
+    import requests_mock
+    import server
+
+    with requests_mock.Mocker() as m:
+        m.get("https://www.googleapis.com/youtube/v3/search", status_code=503)
+        with pytest.raises(requests.HTTPError):
+            server._yt_get_latest_videos("chan")
+        assert m.call_count == 1
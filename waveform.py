@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Precomputed waveform peaks for mixes and tracks.
+
+Batch job: decodes local audio block by block (WAV via the stdlib `wave`
+module, FLAC/OGG/... via soundfile when installed), folds each block into
+multi-resolution min/max peaks with vectorized NumPy and stores them as compact int8 blobs under data/peaks/.
+server_improved serves them at GET /api/tracks/<id>/peaks?res=<bins>.
+
+Usage:
+  python waveform.py [--audio-dir assets/audio] [--db data/app.db] [--force]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PEAKS_DIR = os.getenv("PEAKS_DIR", os.path.join(BASE_DIR, "data", "peaks"))
+# Bin counts per resolution level; each level must divide the finest one.
+LEVELS: Tuple[int, ...] = (256, 1024, 4096)
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".aiff", ".aif")
+
+_MAGIC = b"PEAK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBB")  # magic, version, level count
+_LEVEL = struct.Struct("<I")  # bins per level
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_id(peaks_id: str) -> bool:
+    return bool(_ID_RE.match(peaks_id or ""))
+
+
+def track_id(track: Dict[str, Any]) -> str:
+    """Stable id for a catalog track (older tracks have no stored id: derive one from the URL)."""
+    tid = track.get("id")
+    if isinstance(tid, str) and is_valid_id(tid):
+        return tid
+    return hashlib.sha1(str(track.get("url", "")).encode("utf-8")).hexdigest()[:12]
+
+
+def file_id(path: str) -> str:
+    """Id for a loose audio file under assets/audio: its slugified file name."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"[^a-z0-9]+", "-", stem.lower()).strip("-")[:64] or "audio"
+
+
+def peaks_path(peaks_id: str) -> str:
+    return os.path.join(PEAKS_DIR, f"{peaks_id}.peaks")
+
+
+# -------------------------
+# Decoding and peak math
+# -------------------------
+
+BLOCK_FRAMES = 1 << 16  # frames decoded per block; memory use is independent of track length
+
+
+def _pcm_to_float(raw: bytes, width: int, channels: int) -> Any:
+    """Mono float32 samples in [-1, 1] from interleaved little-endian PCM."""
+    import numpy as np
+
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8  # sign-extend 24-bit
+        data = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported WAV sample width: {width}")
+    if channels > 1:
+        data = data[: len(data) - len(data) % channels].reshape(-1, channels).mean(axis=1)
+    return data
+
+
+def read_audio_blocks(path: str, block_frames: int = BLOCK_FRAMES) -> Tuple[Iterator[Any], int, int]:
+    """Return (iterator of mono float32 blocks, total frames, sample_rate) without loading the whole file."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wf:
+            total, rate = wf.getnframes(), wf.getframerate()
+
+        def wav_blocks() -> Iterator[Any]:
+            with wave.open(path, "rb") as wf:
+                channels, width = wf.getnchannels(), wf.getsampwidth()
+                while True:
+                    raw = wf.readframes(block_frames)
+                    if not raw:
+                        return
+                    yield _pcm_to_float(raw, width, channels)
+
+        return wav_blocks(), total, rate
+
+    try:
+        import soundfile  # optional: FLAC/OGG/AIFF support
+    except ImportError:
+        raise RuntimeError(f"soundfile is required to decode {os.path.basename(path)}")
+    info = soundfile.info(path)
+    blocks = (
+        b.mean(axis=1)
+        for b in soundfile.blocks(path, blocksize=block_frames, dtype="float32", always_2d=True)
+    )
+    return blocks, int(info.frames), int(info.samplerate)
+
+
+def read_audio(path: str) -> Tuple[Any, int]:
+    """Return (mono float32 samples in [-1, 1], sample_rate) for the whole file."""
+    import numpy as np
+
+    blocks, _, rate = read_audio_blocks(path)
+    parts = list(blocks)
+    return (np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)), rate
+
+
+def _check_levels(levels: Sequence[int]) -> List[int]:
+    levels = sorted(set(int(n) for n in levels))
+    if any(levels[-1] % n for n in levels):
+        raise ValueError("every level must divide the finest level")
+    return levels
+
+
+def _reduce_levels(fine: Any, levels: List[int]) -> Dict[int, Any]:
+    """Coarser levels from the finest (bins, 2) float min/max array, quantized to int8."""
+    import numpy as np
+
+    finest = levels[-1]
+    out: Dict[int, Any] = {}
+    for n in levels:
+        group = fine.reshape(n, finest // n, 2)
+        lvl = np.stack([group[:, :, 0].min(axis=1), group[:, :, 1].max(axis=1)], axis=1)
+        out[n] = np.clip(np.round(lvl * 127.0), -128, 127).astype(np.int8)
+    return out
+
+
+def compute_peaks(samples: Any, levels: Sequence[int] = LEVELS) -> Dict[int, Any]:
+    """
+    Min/max peaks per level as int8 arrays of shape (bins, 2).
+    The finest level is computed from the samples; coarser ones are reduced from it.
+    """
+    import numpy as np
+
+    levels = _check_levels(levels)
+    finest = levels[-1]
+    x = np.asarray(samples, dtype=np.float32)
+    if x.size == 0:
+        x = np.zeros(1, dtype=np.float32)
+    # Evenly spaced bin starts; reduceat handles uneven bin sizes without padding
+    # (for clips shorter than `finest` samples a bin degenerates to a single sample).
+    starts = (np.arange(finest, dtype=np.int64) * x.size) // finest
+    fine = np.stack([np.minimum.reduceat(x, starts), np.maximum.reduceat(x, starts)], axis=1)
+    return _reduce_levels(fine, levels)
+
+
+def compute_peaks_blocks(blocks: Iterable[Any], total: int, levels: Sequence[int] = LEVELS) -> Dict[int, Any]:
+    """
+    compute_peaks() over a stream of sample blocks whose lengths sum to `total`:
+    each block is folded into running per-bin min/max, so only one block is in
+    memory at a time. Gives the same bins as compute_peaks() on the whole array.
+    """
+    import numpy as np
+
+    levels = _check_levels(levels)
+    finest = levels[-1]
+    if total < finest:
+        # Degenerate single-sample bins: the clip is tiny, reduce it in one go
+        parts = [np.asarray(b, dtype=np.float32) for b in blocks]
+        return compute_peaks(np.concatenate(parts) if parts else [], levels)
+
+    starts = (np.arange(finest, dtype=np.int64) * total) // finest  # strictly increasing here
+    lo = np.full(finest, np.inf, dtype=np.float32)
+    hi = np.full(finest, -np.inf, dtype=np.float32)
+    offset = 0
+    for block in blocks:
+        x = np.asarray(block, dtype=np.float32)[: max(0, total - offset)]
+        if x.size == 0:
+            continue
+        first = int(np.searchsorted(starts, offset, side="right")) - 1
+        last = int(np.searchsorted(starts, offset + x.size - 1, side="right")) - 1
+        local = starts[first : last + 1] - offset
+        local[0] = 0  # the first bin may have started in an earlier block
+        lo[first : last + 1] = np.minimum(lo[first : last + 1], np.minimum.reduceat(x, local))
+        hi[first : last + 1] = np.maximum(hi[first : last + 1], np.maximum.reduceat(x, local))
+        offset += x.size
+    # Bins never reached (file shorter than its header claimed) read as silence
+    lo[np.isinf(lo)] = 0.0
+    hi[np.isinf(hi)] = 0.0
+    return _reduce_levels(np.stack([lo, hi], axis=1), levels)
+
+
+def encode_blob(peaks: Dict[int, Any]) -> bytes:
+    levels = sorted(peaks)
+    parts = [_HEADER.pack(_MAGIC, _VERSION, len(levels))]
+    parts.extend(_LEVEL.pack(n) for n in levels)
+    parts.extend(peaks[n].tobytes() for n in levels)
+    return b"".join(parts)
+
+
+def decode_levels(blob: bytes) -> List[Tuple[int, int]]:
+    """[(bins, byte offset)] for every level stored in blob."""
+    magic, version, count = _HEADER.unpack_from(blob, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not a peaks blob")
+    offset = _HEADER.size + count * _LEVEL.size
+    levels = []
+    for i in range(count):
+        (bins,) = _LEVEL.unpack_from(blob, _HEADER.size + i * _LEVEL.size)
+        levels.append((bins, offset))
+        offset += bins * 2
+    return levels
+
+
+def select_level(blob: bytes, res: Optional[int]) -> Tuple[int, bytes]:
+    """Smallest stored level with at least `res` bins (largest if none); returns (bins, int8 min/max pairs)."""
+    levels = decode_levels(blob)
+    if res:
+        bins, offset = next(((b, o) for b, o in levels if b >= res), levels[-1])
+    else:
+        bins, offset = levels[-1]
+    return bins, blob[offset : offset + bins * 2]
+
+
+# -------------------------
+# Batch job
+# -------------------------
+
+def _local_audio_path(url: str, root: str) -> Optional[str]:
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    elif "://" in url:
+        return None  # remote URL: nothing to decode locally
+    path = url if os.path.isabs(url) else os.path.join(root, url.lstrip("/"))
+    return path if path.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(path) else None
+
+
+def discover(audio_dir: str, db_path: Optional[str], root: str = BASE_DIR) -> Dict[str, str]:
+    """Map peaks id -> local audio path for assets/audio files, playlists and catalog tracks."""
+    found: Dict[str, str] = {}
+    if os.path.isdir(audio_dir):
+        for name in sorted(os.listdir(audio_dir)):
+            path = os.path.join(audio_dir, name)
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                found[file_id(path)] = path
+            elif name.lower().endswith((".m3u", ".m3u8")):
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line and not line.startswith("#"):
+                            local = _local_audio_path(line, audio_dir)
+                            if local:
+                                found[file_id(local)] = local
+    if db_path and os.path.exists(db_path):
+        with open(db_path, "r", encoding="utf-8") as f:
+            tracks = (json.load(f) or {}).get("tracks", [])
+        for track in tracks:
+            local = _local_audio_path(str(track.get("url", "")), root)
+            if local:
+                found[track_id(track)] = local
+    return found
+
+
+def build_one(item: Tuple[str, str, bool]) -> Tuple[str, str]:
+    peaks_id, path, force = item
+    target = peaks_path(peaks_id)
+    if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return peaks_id, "skipped"
+    blocks, total, _ = read_audio_blocks(path)
+    blob = encode_blob(compute_peaks_blocks(blocks, total))
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, target)
+    return peaks_id, "written"
+
+
+def build_all(items: Iterable[Tuple[str, str]], force: bool = False, workers: Optional[int] = None) -> Dict[str, str]:
+    os.makedirs(PEAKS_DIR, exist_ok=True)
+    jobs = [(pid, path, force) for pid, path in items]
+    results: Dict[str, str] = {}
+    if not jobs:
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_one, job): job[0] for job in jobs}
+        for fut, pid in futures.items():
+            try:
+                results[pid] = fut.result()[1]
+            except Exception as e:
+                results[pid] = f"error: {e}"
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute waveform peaks for local audio")
+    parser.add_argument("--audio-dir", default=os.path.join(BASE_DIR, "assets", "audio"))
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="JSON DB with the tracks catalog")
+    parser.add_argument("--force", action="store_true", help="Recompute even when blobs are up to date")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    sources = discover(args.audio_dir, args.db)
+    results = build_all(sources.items(), force=args.force, workers=args.workers)
+    for pid, status in sorted(results.items()):
+        print(f"{pid}: {status}")
+    print(f"Peaks for {len(results)} item(s) in {PEAKS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
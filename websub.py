@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+import http_client
+
+# WebSub (PubSubHubbub) subscriber for YouTube upload notifications.
+# YouTube publishes channel feeds through Google's public hub; on each new or
+# deleted upload the hub POSTs the channel's Atom entry to our callback.
+
+DEFAULT_HUB_URL = "https://pubsubhubbub.appspot.com/subscribe"
+TOPIC_TEMPLATE = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+MAX_NOTIFICATION_BYTES = 256 * 1024
+
+_NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+    "at": "http://purl.org/atompub/tombstones/1.0",
+}
+
+
+def topic_for(channel_id: str) -> str:
+    return TOPIC_TEMPLATE.format(channel_id=channel_id)
+
+
+def channel_from_topic(topic: str) -> Optional[str]:
+    parsed = urlparse(topic or "")
+    if parsed.netloc != "www.youtube.com" or parsed.path != "/xml/feeds/videos.xml":
+        return None
+    values = parse_qs(parsed.query).get("channel_id") or []
+    return values[0] if values else None
+
+
+def sign(body: bytes, secret: str) -> str:
+    """X-Hub-Signature value for body (YouTube's hub signs with HMAC-SHA1)."""
+    return "sha1=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha1).hexdigest()
+
+
+def verify_signature(body: bytes, header: Optional[str], secret: str) -> bool:
+    if not header or "=" not in header:
+        return False
+    algo, _, digest = header.partition("=")
+    if algo not in ("sha1", "sha256"):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, getattr(hashlib, algo)).hexdigest()
+    return hmac.compare_digest(expected, digest.strip())
+
+
+def parse_notification(body: bytes) -> Set[str]:
+    """Return the channel ids mentioned by an Atom notification (new and deleted entries)."""
+    if len(body) > MAX_NOTIFICATION_BYTES:
+        raise ValueError("notification too large")
+    if b"<!DOCTYPE" in body or b"<!ENTITY" in body:
+        raise ValueError("DTDs are not accepted")
+    root = ET.fromstring(body)
+    channels: Set[str] = set()
+    for el in root.iter(f"{{{_NS['yt']}}}channelId"):
+        if el.text and el.text.strip():
+            channels.add(el.text.strip())
+    for link in root.findall("atom:link", _NS):
+        if link.get("rel") == "self":
+            cid = channel_from_topic(link.get("href", ""))
+            if cid:
+                channels.add(cid)
+    for deleted in root.findall("at:deleted-entry", _NS):
+        uri = deleted.find("at:by/atom:uri", _NS)
+        if uri is not None and uri.text and "/channel/" in uri.text:
+            channels.add(uri.text.rstrip("/").rsplit("/channel/", 1)[1])
+    return channels
+
+
+class WebSubSubscriber:
+    """
+    Tracks hub subscriptions and validates hub callbacks.
+
+    Only topics we asked for are confirmed during verification; leases are
+    recorded so `renew_due()` can re-subscribe before they lapse.
+    """
+
+    def __init__(
+        self,
+        callback_url: str = "",
+        hub_url: str = DEFAULT_HUB_URL,
+        secret: str = "",
+        lease_seconds: int = 432000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.callback_url = callback_url
+        self.hub_url = hub_url
+        self.secret = secret
+        self.lease_seconds = int(lease_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}  # channel_id -> mode awaiting verification
+        self._leases: Dict[str, float] = {}  # channel_id -> lease expiry (epoch seconds)
+
+    @classmethod
+    def from_env(cls) -> "WebSubSubscriber":
+        sub = cls(
+            callback_url=os.getenv("WEBSUB_CALLBACK_URL", ""),
+            hub_url=os.getenv("WEBSUB_HUB_URL", DEFAULT_HUB_URL),
+            secret=os.getenv("WEBSUB_SECRET", ""),
+            lease_seconds=int(os.getenv("WEBSUB_LEASE_SECONDS", "432000")),
+        )
+        if sub.callback_url and not sub.secret:
+            print("WebSub disabled: WEBSUB_SECRET is required when WEBSUB_CALLBACK_URL is set")
+        return sub
+
+    @property
+    def enabled(self) -> bool:
+        # Unsigned notifications could be forged by anyone, so a secret is mandatory
+        return bool(self.callback_url and self.secret)
+
+    def request(self, channel_id: str, mode: str = "subscribe", post: Callable[..., Any] = http_client.post) -> None:
+        """Ask the hub to (un)subscribe; the hub then verifies via our callback."""
+        with self._lock:
+            self._pending[channel_id] = mode
+        data = {
+            "hub.callback": self.callback_url,
+            "hub.topic": topic_for(channel_id),
+            "hub.mode": mode,
+            "hub.verify": "async",
+            "hub.lease_seconds": str(self.lease_seconds),
+            "hub.secret": self.secret,
+        }
+        resp = post(self.hub_url, data=data, timeout=10)
+        resp.raise_for_status()
+
+    def verify(self, mode: str, topic: str, challenge: str, lease_seconds: Optional[str]) -> Optional[str]:
+        """Handle a hub verification GET; returns the challenge to echo, or None to refuse."""
+        channel_id = channel_from_topic(topic)
+        if not channel_id or not challenge:
+            return None
+        with self._lock:
+            if self._pending.get(channel_id) != mode:
+                return None
+            self._pending.pop(channel_id, None)
+            if mode == "subscribe":
+                try:
+                    lease = int(lease_seconds) if lease_seconds else self.lease_seconds
+                except ValueError:
+                    lease = self.lease_seconds
+                self._leases[channel_id] = self._clock() + lease
+            else:
+                self._leases.pop(channel_id, None)
+        return challenge
+
+    def is_subscribed(self, channel_id: str) -> bool:
+        with self._lock:
+            return self._leases.get(channel_id, 0.0) > self._clock()
+
+    def renew_due(self, margin: float = 3600.0) -> List[str]:
+        """Channels whose lease expires within `margin` seconds."""
+        with self._lock:
+            now = self._clock()
+            return [cid for cid, exp in self._leases.items() if exp - now <= margin]
+
+    def accept(self, body: bytes, signature: Optional[str]) -> Set[str]:
+        """Validate a notification POST and return the affected channels we are subscribed to."""
+        if not self.enabled or not verify_signature(body, signature, self.secret):
+            raise PermissionError("bad signature")
+        return {cid for cid in parse_notification(body) if self.is_subscribed(cid)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._leases.clear()
+
+
+class LocalHub:
+    """
+    In-process hub stand-in for tests and local development.
+
+    It receives subscription requests like the real hub (pass `hub.post` as the
+    subscriber's `post` callable), verifies them against a Flask test client and
+    publishes signed Atom notifications to the callback path.
+    """
+
+    def __init__(self, client: Any, callback_path: str):
+        self.client = client
+        self.callback_path = callback_path
+        self.subscriptions: Dict[str, Dict[str, str]] = {}  # topic -> request form
+
+    def post(self, _url: str, data: Dict[str, str], timeout: float = 0) -> Any:
+        self.subscriptions[data["hub.topic"]] = dict(data)
+        return _Accepted()
+
+    def verify_all(self) -> bool:
+        ok = True
+        for topic, form in self.subscriptions.items():
+            challenge = uuid.uuid4().hex
+            resp = self.client.get(
+                self.callback_path,
+                query_string={
+                    "hub.mode": form["hub.mode"],
+                    "hub.topic": topic,
+                    "hub.challenge": challenge,
+                    "hub.lease_seconds": form.get("hub.lease_seconds", "3600"),
+                },
+            )
+            ok = ok and resp.status_code == 200 and resp.get_data(as_text=True) == challenge
+        return ok
+
+    def publish(self, channel_id: str, video_id: str = "new", deleted: bool = False) -> Any:
+        topic = topic_for(channel_id)
+        if deleted:
+            entry = (
+                f'<at:deleted-entry ref="yt:video:{video_id}" when="2024-01-01T00:00:00+00:00">'
+                f'<link href="https://www.youtube.com/watch?v={video_id}"/>'
+                f"<at:by><name>channel</name><uri>https://www.youtube.com/channel/{channel_id}</uri></at:by>"
+                "</at:deleted-entry>"
+            )
+        else:
+            entry = (
+                f"<entry><id>yt:video:{video_id}</id><yt:videoId>{video_id}</yt:videoId>"
+                f"<yt:channelId>{channel_id}</yt:channelId><title>New upload</title></entry>"
+            )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" '
+            'xmlns:at="http://purl.org/atompub/tombstones/1.0" xmlns="http://www.w3.org/2005/Atom">'
+            f'<link rel="self" href="{topic}"/>{entry}</feed>'
+        ).encode("utf-8")
+        headers = {"Content-Type": "application/atom+xml"}
+        secret = self.subscriptions.get(topic, {}).get("hub.secret")
+        if secret:
+            headers["X-Hub-Signature"] = sign(body, secret)
+        return self.client.post(self.callback_path, data=body, headers=headers)
+
+
+class _Accepted:
+    status_code = 202
+
+    def raise_for_status(self) -> None:
+        return None
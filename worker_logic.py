@@ -1,6 +1,8 @@
+import json
 import os
-import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+import http_client
 
 SYSTEM_PROMPT = (
     "You are BaddBeatz' assistant. Answer briefly and helpfully about music, "
@@ -15,28 +17,70 @@ def _resolve_api_key(explicit_api_key: Optional[str], env_var: str) -> str:
     return key
 
 
-def ask(question: str, api_key: Optional[str] = None, timeout: float = 10.0) -> Dict[str, Any]:
-    """
-    Calls OpenAI Chat Completions API with a simple payload.
-    Tests use requests-mock to intercept this call, so no real network is expected.
-    Returns the raw JSON from the API (tests assert on id and headers).
-    """
-    key = _resolve_api_key(api_key, "OPENAI_API_KEY")
-    url = "https://api.openai.com/v1/chat/completions"
+CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
 
-    payload = {
+def _chat_request(question: str, api_key: Optional[str], stream: bool = False) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    """(url, payload, headers) shared by ask(), ask_stream() and ask_async()."""
+    key = _resolve_api_key(api_key, "OPENAI_API_KEY")
+    payload: Dict[str, Any] = {
         "model": "gpt-3.5-turbo",
         "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": question},
         ],
     }
-
+    if stream:
+        payload["stream"] = True
     headers = {
         "Authorization": f"Bearer {key}",
         "Content-Type": "application/json",
     }
+    return CHAT_URL, payload, headers
+
 
-    resp = requests.post(url, json=payload, headers=headers, timeout=timeout)
+def ask(question: str, api_key: Optional[str] = None, timeout: float = 10.0) -> Dict[str, Any]:
+    """
+    Calls OpenAI Chat Completions API with a simple payload.
+    Tests use requests-mock to intercept this call, so no real network is expected.
+    Returns the raw JSON from the API (tests assert on id and headers).
+    """
+    url, payload, headers = _chat_request(question, api_key)
+    resp = http_client.post(url, json=payload, headers=headers, timeout=timeout)
     resp.raise_for_status()
     return resp.json()
+
+
+def ask_stream(question: str, api_key: Optional[str] = None, timeout: float = 10.0) -> Iterator[str]:
+    """
+    Same request as ask() with "stream": true; yields content deltas as the
+    OpenAI server-sent events arrive. `timeout` bounds the wait for each chunk.
+    """
+    url, payload, headers = _chat_request(question, api_key, stream=True)
+    resp = http_client.post(url, json=payload, headers=headers, timeout=timeout, stream=True)
+    try:
+        resp.raise_for_status()
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+    finally:
+        resp.close()
+
+
+async def ask_async(question: str, api_key: Optional[str] = None, timeout: float = 10.0) -> Dict[str, Any]:
+    """asyncio version of ask() on the shared aiohttp pool (same payload and return value)."""
+    import aio_client
+
+    url, payload, headers = _chat_request(question, api_key)
+    async with aio_client.session().post(
+        url, json=payload, headers=headers, timeout=aio_client.timeout(timeout)
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
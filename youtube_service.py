@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import heapq
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from resilience import CircuitBreaker, NegativeCache
+
+# YouTube Data API v3 quota: 10k units/day by default; search.list costs 100 units.
+SEARCH_LIST_COST = 100
+DEFAULT_DAILY_QUOTA = 10_000
+
+try:
+    from zoneinfo import ZoneInfo
+
+    # Quota resets at midnight Pacific Time.
+    _QUOTA_TZ: Any = ZoneInfo("America/Los_Angeles")
+except Exception:  # pragma: no cover - tzdata missing on some minimal images
+    _QUOTA_TZ = timezone.utc
+
+
+class YouTubeUnavailable(RuntimeError):
+    """Upstream is not being called right now (breaker open, quota spent or recent failure)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1.0, float(retry_after))
+
+
+class QuotaCounter:
+    """Thread-safe daily quota counter that resets at midnight in the quota timezone."""
+
+    def __init__(self, daily_limit: int = DEFAULT_DAILY_QUOTA, clock: Callable[[], float] = time.time):
+        self.daily_limit = int(daily_limit)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._used = 0
+        self._day = self._today()
+
+    def _today(self) -> str:
+        return datetime.fromtimestamp(self._clock(), _QUOTA_TZ).strftime("%Y-%m-%d")
+
+    def _roll_locked(self) -> None:
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used = 0
+
+    def try_consume(self, units: int) -> bool:
+        with self._lock:
+            self._roll_locked()
+            if self._used + units > self.daily_limit:
+                return False
+            self._used += units
+            return True
+
+    def exhaust(self) -> None:
+        """Mark today's quota as spent (e.g. after the API reported quotaExceeded)."""
+        with self._lock:
+            self._roll_locked()
+            self._used = self.daily_limit
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._roll_locked()
+            return max(0, self.daily_limit - self._used)
+
+    def seconds_until_reset(self) -> float:
+        now = datetime.fromtimestamp(self._clock(), _QUOTA_TZ)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return max(1.0, (tomorrow - now).total_seconds())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._used = 0
+            self._day = self._today()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._roll_locked()
+            return {"day": self._day, "used": self._used, "limit": self.daily_limit}
+
+
+def _is_quota_error(exc: Exception) -> bool:
+    resp = getattr(exc, "response", None)
+    if resp is None or getattr(resp, "status_code", None) != 403:
+        return False
+    try:
+        body = resp.text or ""
+    except Exception:
+        body = ""
+    return "quota" in body.lower() or "dailylimitexceeded" in body.lower()
+
+
+class YouTubeGuard:
+    """
+    Wraps the raw "latest videos" fetcher with:
+      - a daily quota counter (each search.list call is charged up front),
+      - per-channel negative caching with exponential backoff,
+      - a circuit breaker shared by all channels,
+      - a last-known-good store that callers can serve while upstream is unhealthy.
+    """
+
+    def __init__(
+        self,
+        breaker: Optional[CircuitBreaker] = None,
+        quota: Optional[QuotaCounter] = None,
+        negative: Optional[NegativeCache] = None,
+    ):
+        self.breaker = breaker or CircuitBreaker(
+            "youtube",
+            failure_threshold=int(os.getenv("YOUTUBE_BREAKER_THRESHOLD", "3")),
+            reset_timeout=float(os.getenv("YOUTUBE_BREAKER_RESET", "30")),
+        )
+        self.quota = quota or QuotaCounter(int(os.getenv("YOUTUBE_DAILY_QUOTA", str(DEFAULT_DAILY_QUOTA))))
+        self.negative = negative or NegativeCache(
+            base=float(os.getenv("YOUTUBE_NEGATIVE_TTL", "5")), cap=300.0
+        )
+        self._lkg_lock = threading.Lock()
+        self._last_known_good: Dict[str, Any] = {}
+
+    def fetch(self, channel_id: str, fetcher: Callable[[str], Any]) -> Any:
+        """
+        Fetch fresh data for channel_id through the guard.
+        Raises YouTubeUnavailable when the call is short-circuited, or re-raises the
+        upstream exception for a failure that actually reached YouTube.
+        """
+        embargo = self.negative.get(channel_id)
+        if embargo is not None:
+            error, retry_after = embargo
+            raise YouTubeUnavailable(f"recent upstream failure: {error}", retry_after)
+
+        if not self.breaker.allow():
+            raise YouTubeUnavailable("YouTube circuit open", self.breaker.retry_after())
+
+        if not self.quota.try_consume(SEARCH_LIST_COST):
+            self.breaker.cancel()
+            raise YouTubeUnavailable("daily YouTube quota exhausted", self.quota.seconds_until_reset())
+
+        try:
+            data = fetcher(channel_id)
+        except Exception as e:
+            if _is_quota_error(e):
+                self.quota.exhaust()
+            self.breaker.record_failure()
+            self.negative.record(channel_id, str(e))
+            raise
+
+        self.breaker.record_success()
+        self.negative.clear(channel_id)
+        with self._lkg_lock:
+            self._last_known_good[channel_id] = data
+        return data
+
+    def last_known_good(self, channel_id: str) -> Optional[Any]:
+        with self._lkg_lock:
+            return self._last_known_good.get(channel_id)
+
+    def reset(self) -> None:
+        self.breaker.reset()
+        self.quota.reset()
+        self.negative.clear()
+        with self._lkg_lock:
+            self._last_known_good.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lkg_lock:
+            channels = len(self._last_known_good)
+        return {
+            "breaker": self.breaker.snapshot(),
+            "quota": self.quota.snapshot(),
+            "last_known_good_channels": channels,
+        }
+
+
+def _parse_channels(raw: str) -> List[str]:
+    return [c.strip() for c in raw.split(",") if c.strip()]
+
+
+class YouTubePrefetcher:
+    """
+    Background refresher for a known set of channels.
+
+    Each channel gets its own slot inside the refresh interval (channel i runs at
+    offset i * interval / n), plus +/- `jitter` of a slot so several processes
+    don't line up. The interval is stretched automatically when the channel set
+    would otherwise spend more than `quota_budget` units per day.
+    """
+
+    def __init__(
+        self,
+        channels: List[str],
+        refresh: Callable[[str], Any],
+        interval: float = 600.0,
+        quota_budget: int = 5_000,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.channels = list(dict.fromkeys(channels))
+        self._refresh = refresh
+        self.jitter = max(0.0, min(0.5, float(jitter)))
+        self.quota_budget = int(quota_budget)
+        self.interval = self.effective_interval(len(self.channels), float(interval), self.quota_budget)
+        self._clock = clock
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {"refreshes": 0, "failures": 0, "last_error": None}
+
+    @classmethod
+    def from_env(cls, refresh: Callable[[str], Any]) -> "YouTubePrefetcher":
+        return cls(
+            channels=_parse_channels(os.getenv("YOUTUBE_PREFETCH_CHANNELS", "")),
+            refresh=refresh,
+            interval=float(os.getenv("YOUTUBE_PREFETCH_INTERVAL", "600")),
+            quota_budget=int(os.getenv("YOUTUBE_PREFETCH_QUOTA", "5000")),
+            jitter=float(os.getenv("YOUTUBE_PREFETCH_JITTER", "0.1")),
+        )
+
+    @staticmethod
+    def effective_interval(n_channels: int, interval: float, quota_budget: int) -> float:
+        """Smallest interval >= `interval` that keeps daily spend within the budget."""
+        if n_channels <= 0 or quota_budget <= 0:
+            return interval
+        min_interval = n_channels * SEARCH_LIST_COST * 86400.0 / quota_budget
+        return max(interval, min_interval)
+
+    def schedule(self, start: float) -> List[Tuple[float, str]]:
+        """First run time for each channel, spread evenly across one interval."""
+        n = len(self.channels)
+        if n == 0:
+            return []
+        slot = self.interval / n
+        out = []
+        for i, channel_id in enumerate(self.channels):
+            offset = i * slot + random.uniform(-self.jitter, self.jitter) * slot
+            out.append((start + max(0.0, offset), channel_id))
+        return out
+
+    def refresh_one(self, channel_id: str) -> bool:
+        try:
+            self._refresh(channel_id)
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+                self.stats["last_error"] = f"{channel_id}: {e}"
+            return False
+        with self._lock:
+            self.stats["refreshes"] += 1
+        return True
+
+    def warm_up(self, timeout: float = 10.0, max_workers: int = 4) -> int:
+        """
+        Synchronously fill the cache for every channel (bounded by `timeout`) so the
+        first user request after a deploy is already a cache hit. Returns the number
+        of channels refreshed successfully.
+        """
+        if not self.channels:
+            return 0
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.channels))))
+        futures = [pool.submit(self.refresh_one, c) for c in self.channels]
+        ok = 0
+        try:
+            for fut in as_completed(futures, timeout=timeout):
+                ok += int(bool(fut.result()))
+        except FuturesTimeout:
+            print(f"YouTube warm-up timed out after {timeout}s ({ok}/{len(self.channels)} done)")
+        finally:
+            pool.shutdown(wait=False)
+        return ok
+
+    def _run(self) -> None:
+        # Warm-up already covered the first pass, so the staggered schedule starts
+        # one full interval from now.
+        heap = self.schedule(self._clock() + self.interval)
+        heapq.heapify(heap)
+        slot = self.interval / max(1, len(self.channels))
+        while heap and not self._stop.is_set():
+            due, channel_id = heap[0]
+            wait = due - self._clock()
+            if wait > 0:
+                if self._stop.wait(wait):
+                    break
+                continue
+            heapq.heappop(heap)
+            self.refresh_one(channel_id)
+            nxt = due + self.interval + random.uniform(-self.jitter, self.jitter) * slot
+            # Never schedule in the past after a slow refresh; that would burst.
+            heapq.heappush(heap, (max(nxt, self._clock() + 1.0), channel_id))
+
+    def start(self, warm: bool = True) -> bool:
+        if not self.channels or (self._thread and self._thread.is_alive()):
+            return False
+        if warm:
+            self.warm_up()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="youtube-prefetch", daemon=True)
+        self._thread.start()
+        print(f"YouTube prefetch: {len(self.channels)} channel(s) every {self.interval:.0f}s")
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(
+            {
+                "channels": len(self.channels),
+                "interval": self.interval,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+        )
+        return stats